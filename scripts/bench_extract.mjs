@@ -0,0 +1,141 @@
+// Extraction benchmark: fast-path extractor vs JSDOM + Readability.
+//
+// Usage (from the repo root, after `npm install`):
+//   node scripts/bench_extract.mjs <dir-with-saved-pages> [--runs N] [--min-confidence 0.6]
+//
+// Every *.html / *.htm file under the directory is extracted by both engines.
+// Per page it prints time per engine, output size, fast-path confidence and how
+// much of Readability's text the fast path recovered (token recall/precision);
+// the summary shows p50/p95 times and how many pages would fall back to
+// Readability at the given min_confidence. Save pages with e.g.
+//   curl -sL -o pages/example.html https://example.com/
+//
+// No corpus ships with this script. The default min_confidence (0.6) has not been
+// measured with it, which is why service.fetch.fast_extract stays opt-in.
+
+import fs from "node:fs";
+import path from "node:path";
+import { fastExtract } from "../src/searcher/fast_extract.mjs";
+import { extractReadable } from "../src/searcher/readable.mjs";
+import { tokenize } from "../src/searcher/passages.mjs";
+
+function _argValue(args, key, dflt) {
+	const i = args.indexOf(key);
+	return (i >= 0 && i + 1 < args.length) ? args[i + 1] : dflt;
+}
+
+function _listPages(dir) {
+	const out = [];
+	for (const e of fs.readdirSync(dir, { withFileTypes: true })) {
+		const p = path.join(dir, e.name);
+		if (e.isDirectory()) out.push(..._listPages(p));
+		else if (/\.html?$/i.test(e.name)) out.push(p);
+	}
+	return out.sort();
+}
+
+function _time(fn, runs) {
+	let best = Infinity;
+	let out = null;
+	for (let i = 0; i < runs; i++) {
+		const t0 = performance.now();
+		out = fn();
+		best = Math.min(best, performance.now() - t0);
+	}
+	return { out, ms: best };
+}
+
+function _overlap(candidate, reference) {
+	// Token-multiset recall/precision of candidate against reference.
+	const ref = new Map();
+	for (const t of tokenize(reference)) ref.set(t, (ref.get(t) || 0) + 1);
+	const refN = Array.from(ref.values()).reduce((a, b) => a + b, 0);
+	const cand = tokenize(candidate);
+	let hit = 0;
+	for (const t of cand) {
+		const n = ref.get(t) || 0;
+		if (n > 0) {
+			hit += 1;
+			ref.set(t, n - 1);
+		}
+	}
+	return { recall: refN ? hit / refN : 0, precision: cand.length ? hit / cand.length : 0 };
+}
+
+function _pct(xs, p) {
+	if (xs.length === 0) return 0;
+	const s = [...xs].sort((a, b) => a - b);
+	return s[Math.min(s.length - 1, Math.floor(p * s.length))];
+}
+
+const args = process.argv.slice(2);
+const dir = args.find((a, i) => !a.startsWith("--") && !(i > 0 && args[i - 1].startsWith("--")));
+if (!dir) {
+	console.error("usage: node scripts/bench_extract.mjs <dir> [--runs N] [--min-confidence 0.6]");
+	process.exit(2);
+}
+const runs = Math.max(1, parseInt(_argValue(args, "--runs", "3"), 10) || 3);
+const minConfidence = parseFloat(_argValue(args, "--min-confidence", "0.6")) || 0.6;
+
+const pages = _listPages(dir);
+if (pages.length === 0) {
+	console.error(`no *.html files in ${dir}`);
+	process.exit(2);
+}
+
+const fastMs = [];
+const readMs = [];
+const pipelineMs = [];
+let fallbacks = 0;
+let recallSum = 0;
+let precisionSum = 0;
+let compared = 0;
+
+console.log(["page", "kb", "fast_ms", "read_ms", "conf", "fast_chars", "read_chars", "recall", "precision"].join("\t"));
+for (const p of pages) {
+	const html = fs.readFileSync(p, "utf8");
+	const url = "https://" + path.basename(p).replace(/\.html?$/i, "") + "/";
+
+	const f = _time(() => fastExtract(html), runs);
+	const r = _time(() => extractReadable(html, url), runs);
+	const fast = f.out;
+	const read = r.out || "";
+
+	fastMs.push(f.ms);
+	readMs.push(r.ms);
+	const fallback = !(fast.text && fast.confidence >= minConfidence);
+	if (fallback) fallbacks += 1;
+	// What the service would spend: the fast path always, Readability only on fallback.
+	pipelineMs.push(f.ms + (fallback ? r.ms : 0));
+
+	let ov = { recall: 0, precision: 0 };
+	if (read) {
+		ov = _overlap(fast.text, read);
+		recallSum += ov.recall;
+		precisionSum += ov.precision;
+		compared += 1;
+	}
+	console.log([
+		path.relative(dir, p),
+		(Buffer.byteLength(html) / 1024).toFixed(0),
+		f.ms.toFixed(1),
+		r.ms.toFixed(1),
+		fast.confidence.toFixed(2) + (fallback ? "*" : ""),
+		fast.text.length,
+		read.length,
+		ov.recall.toFixed(2),
+		ov.precision.toFixed(2)
+	].join("\t"));
+}
+
+const sum = (xs) => xs.reduce((a, b) => a + b, 0);
+console.log("");
+console.log(`pages: ${pages.length}, runs: ${runs} (best of), min_confidence: ${minConfidence} (* = falls back to Readability)`);
+console.log(`fast:        total ${sum(fastMs).toFixed(0)} ms, p50 ${_pct(fastMs, 0.5).toFixed(1)} ms, p95 ${_pct(fastMs, 0.95).toFixed(1)} ms`);
+console.log(`readability: total ${sum(readMs).toFixed(0)} ms, p50 ${_pct(readMs, 0.5).toFixed(1)} ms, p95 ${_pct(readMs, 0.95).toFixed(1)} ms`);
+console.log(`pipeline:    total ${sum(pipelineMs).toFixed(0)} ms, fallbacks ${fallbacks}/${pages.length}`);
+if (compared > 0) {
+	console.log(`fast vs readability text: mean recall ${(recallSum / compared).toFixed(2)}, mean precision ${(precisionSum / compared).toFixed(2)}`);
+}
+
+//<EOF bench_extract.mjs lines: 136>
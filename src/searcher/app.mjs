@@ -3,10 +3,21 @@ import path from "path";
 import { loadConfig } from "./config.mjs";
 import { buildUcpResponse } from "./ucp.mjs";
 import { searxngSearchSimple } from "./backends/searxng.mjs";
-import { renderContextPack } from "./render.mjs";
+import { renderContextPack, renderItemContent } from "./render.mjs";
 import { duckduckgoSearchSimple } from "./backends/duckduckgo.mjs";
 import { fetchAndExtract } from "./fetch.mjs";
-import { createWebCache } from "./cache.mjs";
+import { createWebCache, normalizeUrl } from "./cache.mjs";
+import { createSingleFlight } from "./singleflight.mjs";
+import { createSerpCache } from "./serp_cache.mjs";
+import { buildRankCandidates, llmSnippetRank } from "./rank.mjs";
+import { scheduleFetches } from "./scheduler.mjs";
+import { buildRetrieveResponse, createRetrievalIndex } from "./retrieval.mjs";
+import { createMetrics, BYTES_BUCKETS } from "./metrics.mjs";
+import { createExtractPool } from "./extract_pool.mjs";
+import { createNegativeCache } from "./negative_cache.mjs";
+import { createFetchBreaker } from "./fetch_breaker.mjs";
+import { rrfMerge } from "./fusion.mjs";
+import { createDispatcherRegistry } from "./dispatchers.mjs";
 
 const fastify = Fastify({ logger: true });
 
@@ -45,7 +56,53 @@ catch (err) {
 	process.exit(1);
 }
 
-const cache = createWebCache(config?.service?.cache || {});
+// Readability runs in worker threads so page extraction does not block the event loop.
+const extractPool = createExtractPool(config?.service?.fetch?.extract_pool || {});
+fastify.addHook("onClose", async () => {
+	await extractPool.close();
+});
+
+// fetch_engine=auto: hosts where the local engine hit a challenge/block go straight to Jina.
+const engineFailures = createNegativeCache(config?.service?.fetch?.auto || {});
+// Failed pages are remembered and failing domains are skipped (circuit breaker) across requests.
+const fetchBreaker = createFetchBreaker(config?.service?.fetch?.breaker || {});
+
+const metrics = createMetrics(config?.service?.metrics || {});
+const mRequest = metrics.histogram("searcher_request_seconds", "Request latency by route and mode.", ["route", "mode"]);
+const mBackend = metrics.histogram("searcher_backend_search_seconds", "Backend search latency.", ["backend", "outcome"]);
+const mSerp = metrics.counter("searcher_serp_cache_lookups_total", "Search results cache lookups.", ["result"]);
+const mRank = metrics.histogram("searcher_rank_seconds", "Server-side snippet rank latency.", ["outcome"]);
+const mFetch = metrics.histogram("searcher_fetch_seconds", "Network fetch+extract latency per page.", ["engine", "host", "status"]);
+const mExtract = metrics.histogram("searcher_extract_seconds", "Text extraction time per page.", ["method"]);
+const mBytes = metrics.histogram("searcher_download_bytes", "Bytes downloaded per fetched page.", ["engine"], BYTES_BUCKETS);
+const mBreaker = metrics.counter("searcher_fetch_breaker_skips_total", "Fetches skipped by the failure memory / circuit breaker.", ["reason"]);
+const mHttpRequests = metrics.counter("searcher_http_requests_total", "Outbound HTTP requests per shared dispatcher.", ["dispatcher"]);
+const mHttpConnects = metrics.counter("searcher_http_connections_total", "New outbound connections per shared dispatcher (requests - connections = reused).", ["dispatcher"]);
+const mDns = metrics.counter("searcher_dns_lookups_total", "DNS cache lookups for direct connections.", ["result"]);
+const mCache = metrics.counter("searcher_cache_lookups_total", "Extracted-text cache lookups by tier.", ["tier", "result"]);
+
+// Long-lived outbound dispatchers (one per proxy config) with keep-alive pools and a DNS cache.
+const dispatchers = createDispatcherRegistry(config?.service?.fetch || {}, {
+	onRequest: (label) => mHttpRequests.inc({ dispatcher: label }),
+	onConnect: (label) => mHttpConnects.inc({ dispatcher: label }),
+	onLookup: (result) => mDns.inc({ result })
+});
+fastify.addHook("onClose", async () => {
+	await dispatchers.close();
+});
+
+// The retrieval index follows the extracted-text cache through its put/remove hooks.
+const retrieval = createRetrievalIndex(config?.service?.retrieval || {}, {
+	ttlS: config?.service?.cache?.ttl_s ?? 86400
+});
+const cache = createWebCache(config?.service?.cache || {}, {
+	onPut: (key, entry) => retrieval.add(key, entry),
+	onRemove: (key) => retrieval.remove(key),
+	onClear: () => retrieval.clear()
+});
+const serpCache = createSerpCache(config?.service?.serp_cache || {});
+const searchFlight = createSingleFlight();
+const fetchFlight = createSingleFlight();
 
 function _asInt(v, dflt) {
 	try {
@@ -56,6 +113,11 @@ function _asInt(v, dflt) {
 	return dflt;
 }
 
+function _asFloat(v, dflt) {
+	const n = parseFloat(v);
+	return Number.isFinite(n) ? n : dflt;
+}
+
 // eslint-disable-next-line no-unused-vars
 function _asBool(v, dflt) {
 	if (v === true) return true;
@@ -122,6 +184,24 @@ function _getSeedItems(body) {
 	return out;
 }
 
+function _getRankSpec(body) {
+	// Server-side ranking (constraints.rank): rank, pick and fetch in one request.
+	const r = body?.constraints?.rank;
+	if (!r || typeof r !== "object") return null;
+	if (r.enabled === false) return null;
+
+	const rc = config?.service?.rank || {};
+	return {
+		apiBase: (r.api_base || rc.api_base || "").toString().trim(),
+		model: (r.model || rc.model || "").toString().trim(),
+		question: (r.question || "").toString().trim(),
+		topK: _asInt(r.top_k, _asInt(rc.top_k, 10)),
+		wantN: Math.max(1, _asInt(r.want_n, 3)),
+		timeoutMs: _asInt(r.timeout_ms, _asInt(rc.timeout_ms, 30000)),
+		maxTokens: _asInt(r.max_tokens, _asInt(rc.max_tokens, 512))
+	};
+}
+
 function _applyPick(items, pickIds) {
 	if (!Array.isArray(pickIds) || pickIds.length === 0) {
 		return { items, pickApplied: false };
@@ -158,6 +238,187 @@ function _getFetchHeaders(cfg) {
 	return out;
 }
 
+function _fetchHostKey(engine, url, jinaBaseUrl) {
+	// Per-host concurrency applies to the origin actually contacted.
+	try {
+		if (engine === "jina") return "jina:" + (new URL(jinaBaseUrl)).hostname;
+		return (new URL(url)).hostname.toLowerCase();
+	}
+	catch {/**/}
+	return "";
+}
+
+function _backendEnabled(b) {
+	if (b === "searxng") return !!config?.backends?.searxng?.enabled;
+	if (b === "duckduckgo") return !!config?.backends?.duckduckgo?.enabled;
+	return false;
+}
+
+async function _searchOne(b, { query, timeoutSearchMs, maxResults, signal }) {
+	// Backends are contacted directly (not through the fetch proxy), over the shared direct pool.
+	const dispatcher = await dispatchers.get("");
+	if (b === "searxng") {
+		return await searxngSearchSimple({
+			baseUrl: config.backends.searxng.base_url,
+			query,
+			timeoutMs: timeoutSearchMs,
+			limit: maxResults,
+			signal,
+			dispatcher
+		});
+	}
+	return await duckduckgoSearchSimple({
+		query,
+		timeoutMs: timeoutSearchMs,
+		limit: maxResults,
+		signal,
+		dispatcher
+	});
+}
+
+async function _searchBackendsSequential({ order, query, timeoutSearchMs, maxResults }) {
+	// Try backends strictly in order; the first one that answers wins.
+	let items = [];
+	let backendUsed = null;
+	let fallbackUsed = false;
+	let note = null;
+
+	for (const b of order) {
+		if (!_backendEnabled(b)) continue;
+		const tb = Date.now();
+		try {
+			items = await _searchOne(b, { query, timeoutSearchMs, maxResults });
+			backendUsed = b;
+			mBackend.observe({ backend: b, outcome: items.length ? "ok" : "empty" }, (Date.now() - tb) / 1000);
+			break;
+		}
+		catch (e) {
+			mBackend.observe({ backend: b, outcome: "error" }, (Date.now() - tb) / 1000);
+			note = e?.message || String(e);
+			fallbackUsed = true;
+		}
+	}
+
+	return { items, backendUsed, fallbackUsed, note };
+}
+
+async function _searchBackendsRace({ order, query, timeoutSearchMs, maxResults, strategy }) {
+	// hedged: start the next backend after hedge_delay_ms (or as soon as the current one fails);
+	// the first adequate result set (>= min_results items) wins.
+	// fanout: query all backends at once; once one is adequate, wait up to fanout_grace_ms
+	// for the rest, then merge what arrived with reciprocal-rank fusion.
+	// Backends still running when the search is decided are aborted.
+	const enabled = order.filter(_backendEnabled);
+	const hedgeDelayMs = Math.max(0, _asInt(config?.backends?.hedge_delay_ms ?? 800, 800));
+	const graceMs = Math.max(0, _asInt(config?.backends?.fanout_grace_ms ?? 300, 300));
+	const minResults = Math.max(0, _asInt(config?.backends?.min_results ?? 1, 1));
+
+	return await new Promise((resolve) => {
+		const runs = new Map();
+		const errors = [];
+		let next = 0;
+		let settled = false;
+		let hedgeTimer = null;
+		let graceTimer = null;
+
+		const adequate = (r) => !!r?.items && r.items.length >= minResults;
+
+		function _finish(winners) {
+			if (settled) return;
+			settled = true;
+			if (hedgeTimer) clearTimeout(hedgeTimer);
+			if (graceTimer) clearTimeout(graceTimer);
+			for (const r of runs.values()) {
+				if (!r.done) r.ac.abort();
+			}
+
+			let items = [];
+			if (winners.length === 1) items = runs.get(winners[0]).items;
+			else if (winners.length > 1) items = rrfMerge(winners.map((b) => runs.get(b).items), { limit: maxResults });
+			resolve({
+				items,
+				backendUsed: winners.length ? winners.join("+") : null,
+				fallbackUsed: winners.length > 0 && !winners.includes(enabled[0]),
+				note: errors.length ? errors.join("; ") : null
+			});
+		}
+
+		function _fallbackWinners() {
+			// Nothing adequate: prefer a backend with some results, then one that answered at all.
+			const answered = enabled.filter((b) => runs.get(b)?.items);
+			const some = answered.filter((b) => runs.get(b).items.length > 0);
+			if (strategy === "fanout" && some.length > 0) return some;
+			return some.length ? [some[0]] : answered.slice(0, 1);
+		}
+
+		function _onResult(b) {
+			if (settled) return;
+			const allDone = next >= enabled.length && Array.from(runs.values()).every((r) => r.done);
+			if (strategy === "hedged") {
+				if (adequate(runs.get(b))) return _finish([b]);
+				if (next < enabled.length) {
+					// No reason to keep waiting for the hedge delay.
+					if (hedgeTimer) clearTimeout(hedgeTimer);
+					_start();
+					return;
+				}
+				if (allDone) _finish(_fallbackWinners());
+				return;
+			}
+
+			const good = enabled.filter((x) => adequate(runs.get(x)));
+			if (allDone) return _finish(good.length ? good : _fallbackWinners());
+			if (good.length > 0 && !graceTimer) {
+				graceTimer = setTimeout(() => _finish(enabled.filter((x) => adequate(runs.get(x)))), graceMs);
+			}
+		}
+
+		function _start() {
+			if (next >= enabled.length) return;
+			const b = enabled[next++];
+			const r = { ac: new AbortController(), items: null, done: false };
+			runs.set(b, r);
+			const tb = Date.now();
+			_searchOne(b, { query, timeoutSearchMs, maxResults, signal: r.ac.signal }).then(
+				(items) => {
+					r.done = true;
+					r.items = Array.isArray(items) ? items : [];
+					mBackend.observe({ backend: b, outcome: r.items.length ? "ok" : "empty" }, (Date.now() - tb) / 1000);
+					_onResult(b);
+				},
+				(e) => {
+					r.done = true;
+					if (settled && r.ac.signal.aborted) {
+						mBackend.observe({ backend: b, outcome: "cancelled" }, (Date.now() - tb) / 1000);
+						return;
+					}
+					mBackend.observe({ backend: b, outcome: "error" }, (Date.now() - tb) / 1000);
+					errors.push(e?.message || String(e));
+					_onResult(b);
+				}
+			);
+			if (strategy === "hedged" && next < enabled.length) {
+				hedgeTimer = setTimeout(_start, hedgeDelayMs);
+			}
+		}
+
+		if (enabled.length === 0) return _finish([]);
+		_start();
+		if (strategy === "fanout") {
+			while (next < enabled.length) _start();
+		}
+	});
+}
+
+async function _searchBackends({ order, query, timeoutSearchMs, maxResults }) {
+	// backends.strategy: sequential (default) | hedged | fanout.
+	const strategy = (config?.backends?.strategy || "sequential").toString().trim().toLowerCase();
+	if ((strategy === "hedged" || strategy === "fanout") && order.filter(_backendEnabled).length > 1) {
+		return await _searchBackendsRace({ order, query, timeoutSearchMs, maxResults, strategy });
+	}
+	return await _searchBackendsSequential({ order, query, timeoutSearchMs, maxResults });
+}
+
 const DEFAULT_FETCH_HEADERS = {
 	"User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
 	"Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -167,16 +428,71 @@ fastify.get("/healthz", async () => {
 	return { ok: true };
 });
 
+fastify.get("/metrics", async (request, reply) => {
+	if (!metrics.enabled) {
+		reply.code(404);
+		return { ok: false, error: "metrics disabled" };
+	}
+	reply.type("text/plain; version=0.0.4; charset=utf-8");
+	return metrics.render();
+});
+
 fastify.post("/v1/cache/clear", async () => {
+	serpCache.clear();
+	engineFailures.clear();
+	fetchBreaker.clear();
+	dispatchers.clearDns();
 	const cleared = await cache.clearAll();
 	return { ok: true, cleared };
 });
 
-fastify.post("/v1/search", async (request) => {
+fastify.post("/v1/retrieve", async (request) => {
+	// Answer from cached pages only (no backend search, no network fetch).
+	const t0 = Date.now();
+	const body = request.body ?? {};
+	const query = _getQueryText(body);
+
+	const wantItems = body?.want?.items !== false;
+	const wantRendered = body?.want?.rendered_text !== false;
+
+	const rcfg = config?.service?.retrieval || {};
+	const topK = Math.max(1, _asInt(_budgetOrCfg(body, "max_results", rcfg.top_k ?? 5), 5));
+	const maxPerDoc = Math.max(1, _asInt(rcfg.max_chunks_per_page, 3));
+
+	const maxContextChars = _asInt(
+		_budgetOrCfg(body, "max_context_chars", config?.service?.limits?.max_context_chars || 0),
+		0
+	) || null;
+	const maxContentCharsPerItem = _asInt(
+		_budgetOrCfg(body, "max_render_content_chars_per_item", config?.service?.limits?.max_render_content_chars_per_item || 2000),
+		2000
+	);
+	const maxContextTokens = _asInt(
+		_budgetOrCfg(body, "max_context_tokens", config?.service?.limits?.max_context_tokens || 0),
+		0
+	);
+
+	const response = buildRetrieveResponse(retrieval, body, {
+		query: cache.enabled ? query : "",
+		topK,
+		maxPerDoc,
+		wantItems,
+		wantRendered,
+		maxContextChars,
+		maxContentCharsPerItem,
+		maxContextTokens,
+		note: cache.enabled ? null : "cache disabled"
+	});
+	mRequest.observe({ route: "retrieve", mode: "cache" }, (Date.now() - t0) / 1000);
+	return response;
+});
+
+// emit (streaming only): called with each NDJSON record as results become available.
+// signal (streaming only): aborted when the client disconnects; outstanding fetches are cancelled.
+async function _runSearch(body, emit, signal = null) {
 	const t0 = Date.now();
 	const ts = Date.now();
 
-	const body = request.body ?? {};
 	const query = _getQueryText(body);
 	const seedItems = _getSeedItems(body);
 
@@ -208,10 +524,26 @@ fastify.post("/v1/search", async (request) => {
 		2000
 	);
 
+	const maxContextTokens = _asInt(
+		_budgetOrCfg(body, "max_context_tokens", config?.service?.limits?.max_context_tokens || 0),
+		0
+	);
+
+	const passages = {
+		enabled: _asBool(_budgetOrCfg(body, "passage_select", config?.service?.passages?.enabled), true),
+		chunkChars: _asInt(config?.service?.passages?.chunk_chars, 600)
+	};
+
 	const searchMode = _getSearchMode(body);
-	const pickIds = _getPickIds(body);
+	let pickIds = _getPickIds(body);
+	const rankSpec = _getRankSpec(body);
 	const fetchEngine = _getFetchEngine(body);
 	const fetchCfg = _getFetchConfig();
+	const fastExtract = {
+		// Opt-in until min_confidence is calibrated on a page corpus (scripts/bench_extract.mjs).
+		enabled: _asBool(fetchCfg?.fast_extract?.enabled, false),
+		minConfidence: _asFloat(fetchCfg?.fast_extract?.min_confidence, 0.6)
+	};
 
 	const maxFetchPages = _asInt(
 		_budgetOrCfg(body, "max_fetch_pages", config?.service?.limits?.max_fetch_pages || 0),
@@ -244,10 +576,33 @@ fastify.post("/v1/search", async (request) => {
 
 	const fetchHeaders = Object.assign({}, DEFAULT_FETCH_HEADERS, _getFetchHeaders(config));
 
+	const fetchConcurrency = _asInt(
+		_budgetOrCfg(body, "fetch_concurrency", config?.service?.fetch?.concurrency?.global || 4),
+		4
+	);
+
+	const fetchPerHostConcurrency = _asInt(
+		_budgetOrCfg(body, "fetch_per_host_concurrency", config?.service?.fetch?.concurrency?.per_host || 2),
+		2
+	);
+
+	const fetchSpeculativeExtra = _asInt(config?.service?.fetch?.concurrency?.speculative_extra || 0, 0);
+
+	// Whole-request deadline (budget.max_total_time_ms, e.g. the plugin's per-trigger deadline):
+	// every stage gets at most the time left; fetches still running at the deadline are aborted.
+	const maxTotalTimeMs = _asInt(_budgetOrCfg(body, "max_total_time_ms", 0), 0);
+	const deadlineAt = maxTotalTimeMs > 0 ? t0 + maxTotalTimeMs : 0;
+	const _leftMs = () => (deadlineAt ? Math.max(0, deadlineAt - Date.now()) : Infinity);
+
 	let items = [];
 	let backendUsed = null;
 	let note = null;
 	let fallbackUsed = false;
+	let serpHits = 0;
+	let serpStale = 0;
+	let serpMisses = 0;
+	let coalescedSearches = 0;
+	let coalescedFetches = 0;
 
 	if (!query && (!seedItems || seedItems.length === 0)) {
 		note = "Empty query";
@@ -265,21 +620,15 @@ fastify.post("/v1/search", async (request) => {
 
 			const forced = _getBackendPolicy(body);
 			if (forced) {
-				const isEnabled = (b) => {
-					if (b === "searxng") return !!config?.backends?.searxng?.enabled;
-					if (b === "duckduckgo") return !!config?.backends?.duckduckgo?.enabled;
-					return false;
-				};
-
 				if (forced === "duckduckgo") {
-					if (isEnabled("duckduckgo")) {
+					if (_backendEnabled("duckduckgo")) {
 						order = ["duckduckgo"];
 					} else {
 						note = "Requested backend 'duckduckgo' is disabled";
 						order = [];
 					}
 				} else if (forced === "searxng") {
-					if (isEnabled("searxng")) {
+					if (_backendEnabled("searxng")) {
 						order = ["searxng", ...order.filter(v => v !== "searxng")];
 					} else {
 						note = "Requested backend 'searxng' is disabled";
@@ -291,49 +640,50 @@ fastify.post("/v1/search", async (request) => {
 				}
 			}
 
-			for (let i = 0; i < order.length; i++) {
-				const b = order[i];
-
-				if (b === "searxng") {
-					if (!config?.backends?.searxng?.enabled) continue;
-					try {
-						items = await searxngSearchSimple({
-							baseUrl: config.backends.searxng.base_url,
-							query,
-							timeoutMs: timeoutSearchMs,
-							limit: maxResults
-						});
-
-						backendUsed = "searxng";
-						break;
-					}
-					catch (e) {
-						note = e?.message || String(e);
-						fallbackUsed = true;
-						continue;
-					}
+			const serpKey = serpCache.keyFor({ query, order, maxResults });
+			const runSearch = () => _searchBackends({
+				order,
+				query,
+				timeoutSearchMs: Math.max(1, Math.min(timeoutSearchMs, _leftMs())),
+				maxResults
+			});
+
+			let sr = null;
+			const cached = serpCache.get(serpKey);
+			if (cached) {
+				sr = cached.value;
+				if (cached.state === "stale") {
+					serpStale += 1;
+					mSerp.inc({ result: "stale" });
+					serpCache.revalidate(serpKey, async () => {
+						const { value: fresh } = await searchFlight.run(serpKey, runSearch);
+						return (fresh.items.length > 0) ? fresh : null;
+					});
 				}
-
-				if (b === "duckduckgo") {
-					if (!config?.backends?.duckduckgo?.enabled) continue;
-
-					try {
-						items = await duckduckgoSearchSimple({
-							query,
-							timeoutMs: timeoutSearchMs,
-							limit: maxResults
-						});
-
-						backendUsed = "duckduckgo";
-						break;
-					}
-					catch (e) {
-						note = e?.message || String(e);
-						fallbackUsed = true;
-						continue;
-					}
+				else {
+					serpHits += 1;
+					mSerp.inc({ result: "fresh" });
 				}
 			}
+			else {
+				serpMisses += 1;
+				mSerp.inc({ result: "miss" });
+				// Single-flight: identical concurrent searches share one backend call.
+				// The leader caches; every caller gets its own copy because items are mutated below.
+				const { value, joined } = await searchFlight.run(serpKey, async () => {
+					const r = await runSearch();
+					// Only non-empty result sets are cached; failures are retried next time.
+					if (r.items.length > 0) serpCache.put(serpKey, r);
+					return r;
+				});
+				if (joined) coalescedSearches += 1;
+				sr = structuredClone(value);
+			}
+
+			items = sr.items;
+			backendUsed = sr.backendUsed;
+			fallbackUsed = sr.fallbackUsed;
+			if (sr.note) note = sr.note;
 		}
 
 		const searchMs = Date.now() - ts;
@@ -358,30 +708,80 @@ fastify.post("/v1/search", async (request) => {
 			}
 		}
 
+		// Server-side rank: only when the client did not pick explicitly.
+		let rankMs = 0;
+		let rankMeta = null;
+		if (rankSpec && pickIds.length === 0 && items.length > 0) {
+			const tr = Date.now();
+			let picked = [];
+			let rankError = null;
+			// Leave the fetch stage at least one page timeout (or half of what is left).
+			const rankTimeoutMs = Math.min(rankSpec.timeoutMs, _leftMs() - Math.min(timeoutFetchMs, _leftMs() / 2));
+			if (rankTimeoutMs < 1000) {
+				rankError = "deadline";
+			}
+			else {
+				try {
+					picked = await llmSnippetRank({
+						apiBase: rankSpec.apiBase,
+						model: rankSpec.model,
+						question: rankSpec.question || query,
+						candidates: buildRankCandidates(items, rankSpec.topK),
+						wantN: rankSpec.wantN,
+						timeoutMs: rankTimeoutMs,
+						maxTokens: rankSpec.maxTokens
+					});
+				}
+				catch (e) {
+					rankError = e?.message || String(e);
+				}
+			}
+
+			// Deterministic fallback: engine order (first want_n).
+			const fallback = picked.length === 0;
+			if (fallback) {
+				for (let i = 0; i < items.length && i < rankSpec.wantN; i++) picked.push(i);
+			}
+			pickIds = picked;
+			rankMs = Date.now() - tr;
+			mRank.observe({ outcome: rankError === "deadline" ? "skipped" : (fallback ? "fallback" : "ok") }, rankMs / 1000);
+			rankMeta = { fallback };
+			if (rankError) rankMeta.error = rankError;
+		}
+
 		// Apply pick_ids after obtaining the full list.
 		const picked = _applyPick(items, pickIds);
 		items = picked.items;
 		const pickApplied = picked.pickApplied;
 
+		if (emit) {
+			// Always sent, whatever want.items says: a client cut off by its deadline renders from this list.
+			emit({ type: "items", items: items.map((it) => ({ ...it })), mode_used: searchMode, backend_used: backendUsed });
+		}
+
 		let fetchMs = 0;
-		let fetchPagesUsed = 0;
 		let cacheHits = 0;
 		let cacheMisses = 0;
 		let cacheWrites = 0;
+		let cacheMemoryHits = 0;
+		const fetchTimingMs = [];
+		const breakerSkips = {};
 
 		if (searchMode === "full" && maxFetchPages > 0 && items.length > 0) {
 			const tf = Date.now();
 
-			for (let i = 0; i < items.length; i++) {
-				if (fetchPagesUsed >= maxFetchPages) {
-					items[i].fetch = { status: "skipped", skip_reason: "budget" };
-					continue;
-				}
+			const jinaBaseUrl = (fetchCfg?.jina?.base_url || "").toString().trim() || "https://r.jina.ai/";
 
+			// One fetch task per item: cache lookup, then network fetch + cache store.
+			// Resolves to { ok, fetch } where ok means the item consumed a budget slot.
+			const fetchItem = async (i, signal) => {
 				const url = (items[i].url || "").toString();
 				if (!url) {
-					items[i].fetch = { status: "failed", skip_reason: "error" };
-					continue;
+					return { ok: false, fetch: { status: "failed", skip_reason: "error" } };
+				}
+				const pageTimeoutMs = Math.min(timeoutFetchMs, _leftMs());
+				if (pageTimeoutMs <= 0) {
+					return { ok: false, fetch: { status: "skipped", skip_reason: "deadline" } };
 				}
 
 				// Cache lookup (V1): key is based on the original URL (normalized) and extractor engine.
@@ -392,43 +792,113 @@ fastify.post("/v1/search", async (request) => {
 					});
 					if (hit && typeof hit.text === "string" && hit.text) {
 						cacheHits += 1;
-						items[i].fetch = {
-							status: "fetched",
-							skip_reason: "",
-							content_type: "cache",
-							downloaded_bytes: 0,
-							truncated: false,
-							extracted_chars: hit.text.length,
-							final_url: url,
-							redirects: 0,
-							text: hit.text
-						};
-						fetchPagesUsed += 1;
+						if (hit.tier === "memory") cacheMemoryHits += 1;
+						mCache.inc({ tier: "memory", result: hit.tier === "memory" ? "hit" : "miss" });
+						if (hit.tier === "disk") mCache.inc({ tier: "disk", result: "hit" });
 						try {
 							fastify.log.info({ url, engine: fetchEngine }, "cache hit");
 						}
 						catch {/**/}
-						continue;
+						return {
+							ok: true,
+							fetch: {
+								status: "fetched",
+								skip_reason: "",
+								content_type: "cache",
+								downloaded_bytes: 0,
+								truncated: false,
+								extracted_chars: hit.text.length,
+								final_url: url,
+								redirects: 0,
+								text: hit.text
+							}
+						};
 					}
 					cacheMisses += 1;
+					if (cache.enabled) {
+						mCache.inc({ tier: "memory", result: "miss" });
+						mCache.inc({ tier: "disk", result: "miss" });
+					}
 				}
 				catch {/**/}
 
-				const fx = await fetchAndExtract({
-					url,
-					proxySocksUrl: (fetchCfg?.proxy?.socks_url || "").toString().trim() || "",
-					engine: fetchEngine,
-					jinaBaseUrl: (fetchCfg?.jina?.base_url || "").toString().trim() || "https://r.jina.ai/",
-					jinaApiKey: (fetchCfg?.jina?.api_key || "").toString().trim() || "",
-					headers: fetchHeaders,
-					allowedContentTypes,
-					maxBytes: maxDownloadBytesPerPage,
-					maxExtractChars: maxExtractCharsPerPage,
-					timeoutMs: timeoutFetchMs,
-					maxRedirects
-				});
+				// Pages that failed recently and domains with an open circuit are skipped without a
+				// network call; the scheduler moves the budget slot on to the next candidate.
+				const blocked = fetchBreaker.check(fetchEngine, url);
+				if (blocked) {
+					const reason = blocked.skip_reason;
+					breakerSkips[reason] = (breakerSkips[reason] || 0) + 1;
+					mBreaker.inc({ reason });
+					const fetch = { status: blocked.status, skip_reason: reason, final_url: url };
+					if (blocked.previous_skip_reason) fetch.previous_skip_reason = blocked.previous_skip_reason;
+					return {
+						ok: false,
+						source: blocked.remembered ? "negative_cache" : "circuit_open",
+						fetch
+					};
+				}
+
+				// Single-flight: concurrent requests for the same engine+URL share one fetch (and one cache write).
+				// Size limits change the result, so they are part of the key. The timeout is not (it follows
+				// each request's deadline): joiners get the leader's timeout, and leave early on their own signal.
+				const flightKey = [fetchEngine, maxDownloadBytesPerPage, maxExtractCharsPerPage, normalizeUrl(url) || url].join(":");
+				const { value: fx, joined } = await fetchFlight.run(flightKey, async (sharedSignal) => {
+					const tn = Date.now();
+					const r = await fetchAndExtract({
+						url,
+						proxySocksUrl: (fetchCfg?.proxy?.socks_url || "").toString().trim() || "",
+						engine: fetchEngine,
+						jinaBaseUrl,
+						jinaApiKey: (fetchCfg?.jina?.api_key || "").toString().trim() || "",
+						headers: fetchHeaders,
+						allowedContentTypes,
+						maxBytes: maxDownloadBytesPerPage,
+						maxExtractChars: maxExtractCharsPerPage,
+						timeoutMs: pageTimeoutMs,
+						maxRedirects,
+						extractPool,
+						fastExtract,
+						challengeSniffBytes: _asInt(fetchCfg?.challenge?.sniff_bytes ?? 32768, 32768),
+						engineFailures,
+						dispatchers,
+						signal: sharedSignal
+					});
+
+					// Cancelled fetches (budget met, deadline) say nothing about the site.
+					fetchBreaker.record(fetchEngine, url, sharedSignal.aborted ? { status: "failed", skip_reason: "budget" } : r);
+
+					// Metrics are recorded once per network fetch (by the single-flight leader).
+					let host = "";
+					try { host = new URL(url).hostname; } catch {/**/}
+					mFetch.observe({ engine: r.engine_used || fetchEngine, host: metrics.boundedLabel(host), status: r.status }, (Date.now() - tn) / 1000);
+					if (r.extract_method) mExtract.observe({ method: r.extract_method }, (r.extract_ms || 0) / 1000);
+					if (r.downloaded_bytes) mBytes.observe({ engine: fetchEngine }, r.downloaded_bytes);
 
-				items[i].fetch = {
+					if (r.status === "fetched") {
+						// Cache store (V1): only successful non-empty extractions are cached.
+						try {
+							if ((r.text || "").toString().trim()) {
+								await cache.put({
+									engine: fetchEngine,
+									url,
+									finalUrl: r.final_url || url,
+									title: (items[i].title || "").toString(),
+									text: (r.text || "").toString()
+								});
+								cacheWrites += 1;
+								try {
+									fastify.log.info({ url, engine: fetchEngine }, "cache write");
+								}
+								catch {/**/}
+							}
+						}
+						catch {/**/}
+					}
+					return r;
+				}, signal);
+				if (joined) coalescedFetches += 1;
+
+				const fetchOut = {
 					status: fx.status,
 					skip_reason: fx.skip_reason || "",
 					content_type: fx.content_type || "",
@@ -440,28 +910,59 @@ fastify.post("/v1/search", async (request) => {
 					text: fx.text || ""
 				};
 
-				if (fx.status === "fetched") {
-					fetchPagesUsed += 1;
-					// Cache store (V1): only successful non-empty extractions are cached.
-					try {
-						if ((fx.text || "").toString().trim()) {
-							await cache.put({
-								engine: fetchEngine,
-								url,
-								finalUrl: fx.final_url || url,
-								title: (items[i].title || "").toString(),
-								text: (fx.text || "").toString()
-							});
-							cacheWrites += 1;
-							try {
-								fastify.log.info({ url, engine: fetchEngine }, "cache write");
-							}
-							catch {/**/}
+				return { ok: fx.status === "fetched", fetch: fetchOut };
+			};
+
+			const hostKeys = items.map((it) => _fetchHostKey(fetchEngine, (it?.url || "").toString(), jinaBaseUrl));
+			const results = await scheduleFetches({
+				hostKeys,
+				budget: maxFetchPages,
+				concurrency: fetchConcurrency,
+				perHostConcurrency: fetchPerHostConcurrency,
+				speculativeExtra: fetchSpeculativeExtra,
+				deadlineAt,
+				signal,
+				run: fetchItem,
+				// Stream each page that counts; cancelled ones are reported as budget skips at the end.
+				onResult: !emit ? null : (i, r) => {
+					if (!r?.fetch) return;
+					emit({
+						type: "fetch",
+						index: i,
+						fetch: {
+							...r.fetch,
+							text: r.fetch.status === "fetched"
+								? renderItemContent({ text: r.fetch.text, maxChars: maxContentCharsPerItem, query, passages })
+								: ""
 						}
-					}
-					catch {/**/}
+					});
 				}
+			});
 
+			// Write results back in item order; unstarted or cancelled items were over budget
+			// (the scheduler never lets more than maxFetchPages succeed). Tasks that threw failed.
+			// Pages left out because time ran out (not because enough pages were fetched) say so.
+			const okCount = results.filter((r) => r && !r.cancelled && r.ok).length;
+			const skipReason = (deadlineAt && Date.now() >= deadlineAt && okCount < maxFetchPages) ? "deadline" : "budget";
+			for (let i = 0; i < items.length; i++) {
+				const r = results[i];
+				if (r && !r.cancelled && r.value?.fetch) {
+					items[i].fetch = r.value.fetch;
+				}
+				else if (r && !r.cancelled && r.error) {
+					items[i].fetch = { status: "failed", skip_reason: "error" };
+				}
+				else {
+					items[i].fetch = { status: "skipped", skip_reason: skipReason };
+				}
+				if (r) {
+					fetchTimingMs.push({
+						url: (items[i].url || "").toString(),
+						status: items[i].fetch.status,
+						source: items[i].fetch.content_type === "cache" ? "cache" : (r.cancelled ? "cancelled" : (r.value?.source || "network")),
+						ms: r.ms
+					});
+				}
 			}
 
 			fetchMs = Date.now() - tf;
@@ -477,7 +978,10 @@ fastify.post("/v1/search", async (request) => {
 				items,
 				maxContextChars,
 				maxSnippetChars,
-				maxContentCharsPerItem
+				maxContentCharsPerItem,
+				query,
+				passages,
+				maxContextTokens
 			})
 			: (wantRendered ? renderContextPack({ items: [], maxContextChars, maxSnippetChars, maxContentCharsPerItem }) : null);
 
@@ -494,12 +998,17 @@ fastify.post("/v1/search", async (request) => {
 			renderedText: wantRendered ? renderedText : null,
 			timingMs: {
 				search: searchMs,
+				rank: rankMs,
 				fetch: fetchMs,
 				total: totalMs
 			},
+			rank: rankMeta,
 			note
 		});
 
+		response.usage.serp_cache = { hits: serpHits, stale: serpStale, misses: serpMisses };
+		response.usage.coalesced = { searches: coalescedSearches, fetches: coalescedFetches };
+
 		if (searchMode === "full") {
 			let n = 0;
 			for (const it of items) {
@@ -509,6 +1018,13 @@ fastify.post("/v1/search", async (request) => {
 			response.usage.cache_hits = cacheHits;
 			response.usage.cache_misses = cacheMisses;
 			response.usage.cache_writes = cacheWrites;
+			response.usage.cache_tiers = {
+				memory: { hits: cacheMemoryHits, misses: cacheHits + cacheMisses - cacheMemoryHits },
+				disk: { hits: cacheHits - cacheMemoryHits, misses: cacheMisses }
+			};
+			response.usage.fetch_timing_ms = fetchTimingMs;
+			response.usage.fetch_skipped = breakerSkips;
+			response.usage.fetch_sum_ms = fetchTimingMs.reduce((acc, t) => acc + (t.ms || 0), 0);
 		}
 
 		return response;
@@ -529,10 +1045,61 @@ fastify.post("/v1/search", async (request) => {
 	});
 
 	return response;
+}
+
+fastify.post("/v1/search", async (request, reply) => {
+	const body = request.body ?? {};
+	const tq = Date.now();
+	const labels = { route: "search", mode: _getSearchMode(body) };
+	if (body?.want?.stream !== true) {
+		try {
+			return await _runSearch(body, null);
+		}
+		finally {
+			mRequest.observe(labels, (Date.now() - tq) / 1000);
+		}
+	}
+	labels.route = "search_stream";
+
+	// NDJSON stream: {"type":"items"}, then {"type":"fetch"} per finished page (full mode),
+	// then {"type":"done"} with meta/usage/rendered_text (or {"type":"error"}).
+	reply.hijack();
+	const out = reply.raw;
+	out.writeHead(200, {
+		"Content-Type": "application/x-ndjson; charset=utf-8",
+		"Cache-Control": "no-cache"
+	});
+	const emit = (rec) => {
+		if (out.destroyed || out.writableEnded) return;
+		try { out.write(JSON.stringify(rec) + "\n"); } catch {/**/}
+	};
+	// A client that stops reading (its deadline) closes the socket: stop fetching for it.
+	const ac = new AbortController();
+	out.on("close", () => {
+		if (!out.writableEnded) ac.abort();
+	});
+
+	try {
+		const response = await _runSearch(body, emit, ac.signal);
+		// Items were already streamed.
+		const done = { type: "done", ...response };
+		delete done.items;
+		emit(done);
+	}
+	catch (e) {
+		emit({ type: "error", error: e?.message || String(e) });
+	}
+	try { out.end(); } catch {/**/}
+	mRequest.observe(labels, (Date.now() - tq) / 1000);
 });
 
 const { host, port } = config.service.listen.tcp;
 
+if (retrieval.enabled && cache.enabled && _asBool(config?.service?.retrieval?.warm_on_start, true)) {
+	// Index pages cached by earlier runs; new puts are indexed as they happen.
+	cache.forEachEntry((key, entry) => retrieval.add(key, entry)).catch(() => {});
+}
+
 try {
 	await fastify.listen({ host, port });
 	console.log(`Search service listening on ${host}:${port}`);
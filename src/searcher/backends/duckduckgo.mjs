@@ -11,7 +11,7 @@ function safeHostname(u) {
 	}
 }
 
-export async function duckduckgoSearchSimple({ query, timeoutMs, limit }) {
+export async function duckduckgoSearchSimple({ query, timeoutMs, limit, signal, dispatcher }) {
 	const u = new URL("https://api.duckduckgo.com/");
 	u.searchParams.set("q", query);
 	u.searchParams.set("format", "json");
@@ -20,6 +20,11 @@ export async function duckduckgoSearchSimple({ query, timeoutMs, limit }) {
 
 	const ac = new AbortController();
 	const t = setTimeout(() => ac.abort(), Math.max(1, timeoutMs || 6000));
+	// Caller cancellation (hedged/fan-out search: the losing backend is aborted).
+	if (signal) {
+		if (signal.aborted) ac.abort();
+		else signal.addEventListener("abort", () => ac.abort(), { once: true });
+	}
 	console.log("duckduckgo req: %o", u.toString());
 
 	let json;
@@ -27,6 +32,8 @@ export async function duckduckgoSearchSimple({ query, timeoutMs, limit }) {
 		const res = await fetch(u.toString(), {
 			method: "GET",
 			signal: ac.signal,
+			// Shared keep-alive pool (dispatchers.mjs); undefined = Node's global dispatcher.
+			dispatcher: dispatcher || undefined,
 			headers: {
 				"accept": "application/json"
 			}
@@ -5,7 +5,7 @@ function normalizeBaseUrl(baseUrl) {
 	return baseUrl.replace(/\/+$/, "");
 }
 
-export async function searxngSearchSimple({ baseUrl, query, timeoutMs, limit }) {
+export async function searxngSearchSimple({ baseUrl, query, timeoutMs, limit, signal, dispatcher }) {
 	const b = normalizeBaseUrl(baseUrl);
 
 	const u = new URL(b + "/search");
@@ -14,12 +14,19 @@ export async function searxngSearchSimple({ baseUrl, query, timeoutMs, limit })
 
 	const ac = new AbortController();
 	const t = setTimeout(() => ac.abort(), Math.max(1, timeoutMs || 6000));
+	// Caller cancellation (hedged/fan-out search: the losing backend is aborted).
+	if (signal) {
+		if (signal.aborted) ac.abort();
+		else signal.addEventListener("abort", () => ac.abort(), { once: true });
+	}
 
 	let json;
 	try {
 		const res = await fetch(u.toString(), {
 			method: "GET",
 			signal: ac.signal,
+			// Shared keep-alive pool (dispatchers.mjs); undefined = Node's global dispatcher.
+			dispatcher: dispatcher || undefined,
 			headers: {
 				"accept": "application/json"
 			}
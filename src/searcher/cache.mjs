@@ -1,6 +1,8 @@
-import fs from "fs";
+import fsp from "fs/promises";
 import path from "path";
 import crypto from "crypto";
+import zlib from "zlib";
+import { promisify } from "util";
 import { URL } from "url";
 
 function _asBool(v, dflt) {
@@ -77,9 +79,9 @@ function _hashKey(s) {
 	return crypto.createHash("sha1").update((s || "").toString()).digest("hex");
 }
 
-function _ensureDir(dirPath) {
+async function _ensureDir(dirPath) {
 	try {
-		fs.mkdirSync(dirPath, { recursive: true });
+		await fsp.mkdir(dirPath, { recursive: true });
 		return true;
 	}
 	catch {/**/}
@@ -91,20 +93,189 @@ function _nowMs() {
 	return 0;
 }
 
-export function createWebCache(cfg) {
+const _gzip = promisify(zlib.gzip);
+const _gunzip = promisify(zlib.gunzip);
+
+// On-disk layouts:
+// - v1: <dir>/<sha1>.json          (flat, plain JSON; read-only, migrated on access)
+// - v2: <dir>/<sha1[0:2]>/<sha1>.json.gz  (sharded, gzip-compressed JSON)
+const V1_EXT = ".json";
+const V2_EXT = ".json.gz";
+
+function _isShardName(name) {
+	return /^[0-9a-f]{2}$/.test(name || "");
+}
+
+function _yieldToEventLoop() {
+	return new Promise((resolve) => setImmediate(resolve));
+}
+
+// Binary min-heap of { at, key } used as the expiry index.
+// Stale entries (file rewritten or removed) are skipped lazily on pop.
+function _createExpiryHeap() {
+	const a = [];
+
+	function _swap(i, j) {
+		const t = a[i];
+		a[i] = a[j];
+		a[j] = t;
+	}
+
+	function push(at, key) {
+		a.push({ at, key });
+		let i = a.length - 1;
+		while (i > 0) {
+			const p = (i - 1) >> 1;
+			if (a[p].at <= a[i].at) break;
+			_swap(i, p);
+			i = p;
+		}
+	}
+
+	function pop() {
+		if (a.length === 0) return null;
+		const top = a[0];
+		const last = a.pop();
+		if (a.length > 0) {
+			a[0] = last;
+			let i = 0;
+			// eslint-disable-next-line no-constant-condition
+			while (true) {
+				const l = i * 2 + 1;
+				const r = l + 1;
+				let m = i;
+				if (l < a.length && a[l].at < a[m].at) m = l;
+				if (r < a.length && a[r].at < a[m].at) m = r;
+				if (m === i) break;
+				_swap(i, m);
+				i = m;
+			}
+		}
+		return top;
+	}
+
+	function peek() {
+		return a.length > 0 ? a[0] : null;
+	}
+
+	function clear() {
+		a.length = 0;
+	}
+
+	return { push, pop, peek, clear, size: () => a.length };
+}
+
+export function createWebCache(cfg, hooks = {}) {
 	const enabled = _asBool(cfg?.enabled, false);
 	const ttlS = _asInt(cfg?.ttl_s, 86400);
 	const sweepIntervalS = _asInt(cfg?.sweep_interval_s, 1800);
+	// Max files removed (or stat'ed during the startup index scan) per event-loop turn.
+	const sweepSliceSize = Math.max(1, _asInt(cfg?.sweep_slice_size, 256));
+	// Cap on total on-disk bytes (compressed files); least recently used entries are evicted. 0 = unlimited.
+	const maxBytes = Math.max(0, _asInt(cfg?.max_bytes, 0));
+	const gzipLevel = Math.min(9, Math.max(1, _asInt(cfg?.gzip_level, 6)));
 
 	const baseDirRaw = (cfg?.dir || ".cache/websearch").toString();
 	const baseDir = path.resolve(process.cwd(), baseDirRaw);
 
-	let lastSweepMs = 0;
+	// In-memory LRU tier above the disk files, bounded by bytes of extracted text.
+	// Map iteration order is the LRU order (oldest first).
+	const memMaxBytes = Math.max(0, _asInt(cfg?.memory_max_bytes, 64 * 1024 * 1024));
+	const mem = new Map();
+	let memBytes = 0;
+
+	const stats = {
+		memory: { hits: 0, misses: 0 },
+		disk: { hits: 0, misses: 0, evictions: 0, migrated: 0 }
+	};
+
+	// Disk index: key -> { at: created ms, bytes, v }, in LRU order (oldest first),
+	// plus a heap ordered by created ms for TTL sweeps.
+	// A sweep pops only entries that are due, so it costs O(expired), not O(all files).
+	const disk = new Map();
+	let diskBytes = 0;
+	const expiry = _createExpiryHeap();
+	let indexReady = false;
+	let sweeping = null;
+	let sweepTimer = null;
+	let dirReady = false;
+
+	// Optional observers (retrieval index): onPut(key, entry), onRemove(key), onClear().
+	function _notify(name, ...args) {
+		try { hooks?.[name]?.(...args); } catch {/**/}
+	}
 
-	function _filePathFor(engine, normalizedUrl) {
+	function _keyFor(engine, normalizedUrl) {
 		const k = (engine || "local").toString().toLowerCase() + ":" + normalizedUrl;
-		const h = _hashKey(k);
-		return path.join(baseDir, h + ".json");
+		return _hashKey(k);
+	}
+
+	function _v1PathForKey(key) {
+		return path.join(baseDir, key + V1_EXT);
+	}
+
+	function _v2PathForKey(key) {
+		return path.join(baseDir, key.slice(0, 2), key + V2_EXT);
+	}
+
+	async function _dir() {
+		if (dirReady) return true;
+		dirReady = await _ensureDir(baseDir);
+		return dirReady;
+	}
+
+	function _indexSet(key, createdMs, bytes, v) {
+		_indexDelete(key);
+		disk.set(key, { at: createdMs, bytes: bytes || 0, v });
+		diskBytes += bytes || 0;
+		if (ttlS && ttlS > 0) expiry.push(createdMs, key);
+	}
+
+	function _indexDelete(key) {
+		const e = disk.get(key);
+		if (!e) return;
+		disk.delete(key);
+		diskBytes -= e.bytes;
+	}
+
+	function _indexTouch(key) {
+		const e = disk.get(key);
+		if (!e) return;
+		disk.delete(key);
+		disk.set(key, e);
+	}
+
+	function _memDelete(key) {
+		const e = mem.get(key);
+		if (!e) return;
+		mem.delete(key);
+		memBytes -= e.bytes;
+	}
+
+	function _memGet(key) {
+		const e = mem.get(key);
+		if (!e) return null;
+		if (_isExpiredMtimeMs(e.createdMs)) {
+			_memDelete(key);
+			return null;
+		}
+		// Refresh recency.
+		mem.delete(key);
+		mem.set(key, e);
+		return e;
+	}
+
+	function _memPut(key, text, createdMs) {
+		if (memMaxBytes <= 0) return;
+		const bytes = Buffer.byteLength(text, "utf8");
+		_memDelete(key);
+		if (bytes > memMaxBytes) return;
+		mem.set(key, { text, bytes, createdMs });
+		memBytes += bytes;
+		for (const k of mem.keys()) {
+			if (memBytes <= memMaxBytes) break;
+			_memDelete(k);
+		}
 	}
 
 	function _isExpiredMtimeMs(mtimeMs) {
@@ -113,161 +284,412 @@ export function createWebCache(cfg) {
 		return ageMs > (ttlS * 1000);
 	}
 
-	async function maybeSweep() {
-		if (!sweepIntervalS || sweepIntervalS <= 0) return;
-		const now = _nowMs();
-		if (lastSweepMs && (now - lastSweepMs) < (sweepIntervalS * 1000)) return;
-		lastSweepMs = now;
-		await sweepExpired();
-	}
-
-	async function sweepExpired() {
-		// V1: fast TTL cleanup based on file mtime. No JSON parsing needed.
-		if (!_ensureDir(baseDir)) return 0;
-
-		let removed = 0;
-		let entries = [];
+	async function _scanDir(dirPath, ext, v, found) {
+		let dir;
 		try {
-			entries = fs.readdirSync(baseDir, { withFileTypes: true });
+			dir = await fsp.opendir(dirPath);
 		}
 		catch {/**/}
+		if (!dir) return;
 
-		for (const de of entries) {
-			if (!de || !de.isFile()) continue;
-			const name = (de.name || "").toString();
-			if (!name.endsWith(".json")) continue;
-
-			const fp = path.join(baseDir, name);
-			let st;
-			try {
-				st = fs.statSync(fp);
-			}
-			catch {/**/}
-			if (!st) continue;
+		const shards = [];
+		try {
+			for await (const de of dir) {
+				if (!de) continue;
+				const name = (de.name || "").toString();
+				if (de.isDirectory()) {
+					if (v === 1 && _isShardName(name)) shards.push(name);
+					continue;
+				}
+				if (!de.isFile() || !name.endsWith(ext)) continue;
 
-			if (_isExpiredMtimeMs(st.mtimeMs)) {
+				let st;
 				try {
-					fs.unlinkSync(fp);
-					removed += 1;
+					st = await fsp.stat(path.join(dirPath, name));
 				}
 				catch {/**/}
+				if (st) found.push({ key: name.slice(0, -ext.length), at: st.mtimeMs, bytes: st.size, v });
+
+				if ((found.length % sweepSliceSize) === 0) await _yieldToEventLoop();
 			}
 		}
+		catch {/**/}
+
+		for (const sh of shards) {
+			await _scanDir(path.join(dirPath, sh), V2_EXT, 2, found);
+		}
+	}
+
+	async function _buildIndex() {
+		// One-time startup scan (v1 flat files + v2 shards), in slices so it never holds the event loop.
+		if (!(await _dir())) return;
+
+		const found = [];
+		await _scanDir(baseDir, V1_EXT, 1, found);
+
+		// Oldest first approximates LRU order for files we have not seen accessed yet.
+		// Entries written while scanning are already indexed and stay most recent.
+		found.sort((a, b) => a.at - b.at);
+		const live = Array.from(disk.entries());
+		const liveKeys = new Set(disk.keys());
+		disk.clear();
+		diskBytes = 0;
+		for (const f of found) {
+			if (liveKeys.has(f.key)) continue;
+			const prev = disk.get(f.key);
+			// A key present as both v1 and v2: the v2 file wins.
+			if (prev && prev.v === 2 && f.v === 1) continue;
+			_indexSet(f.key, f.at, f.bytes, f.v);
+		}
+		for (const [k, e] of live) {
+			_indexSet(k, e.at, e.bytes, e.v);
+		}
+		indexReady = true;
+		await _evictOverCap();
+	}
+
+	async function _unlinkKey(key, v) {
+		try {
+			await fsp.unlink(v === 1 ? _v1PathForKey(key) : _v2PathForKey(key));
+			return true;
+		}
+		catch {/**/}
+		return false;
+	}
+
+	async function _removeKey(key) {
+		const e = disk.get(key);
+		_memDelete(key);
+		_notify("onRemove", key);
+		_indexDelete(key);
+		if (e) return await _unlinkKey(key, e.v);
+		// Not indexed (yet): try both layouts.
+		const a = await _unlinkKey(key, 2);
+		const b = await _unlinkKey(key, 1);
+		return a || b;
+	}
+
+	async function _evictOverCap() {
+		if (!maxBytes || diskBytes <= maxBytes) return 0;
+		let evicted = 0;
+		for (const [k, e] of disk) {
+			if (diskBytes <= maxBytes) break;
+			_indexDelete(k);
+			_memDelete(k);
+			_notify("onRemove", k);
+			if (await _unlinkKey(k, e.v)) evicted += 1;
+			if ((evicted % sweepSliceSize) === 0) await _yieldToEventLoop();
+		}
+		stats.disk.evictions += evicted;
+		return evicted;
+	}
+
+	async function _sweepDue() {
+		// TTL cleanup driven by the expiry index. No directory listing, no JSON parsing.
+		let removed = 0;
+		let n = 0;
+		// eslint-disable-next-line no-constant-condition
+		while (true) {
+			const top = expiry.peek();
+			if (!top || !_isExpiredMtimeMs(top.at)) break;
+			expiry.pop();
+
+			// Skip stale heap entries: the file was rewritten or already removed.
+			if (disk.get(top.key)?.at !== top.at) continue;
 
+			if (await _removeKey(top.key)) removed += 1;
+
+			n += 1;
+			if ((n % sweepSliceSize) === 0) await _yieldToEventLoop();
+		}
+
+		for (const [k, e] of mem) {
+			if (_isExpiredMtimeMs(e.createdMs)) _memDelete(k);
+		}
 		return removed;
 	}
 
+	function sweepExpired() {
+		// Serialize sweeps: concurrent callers share the running one.
+		if (sweeping) return sweeping;
+		sweeping = (async () => {
+			try {
+				if (!indexReady) await _buildIndex();
+				return await _sweepDue();
+			}
+			finally {
+				sweeping = null;
+			}
+		})();
+		return sweeping;
+	}
+
+	function _startSweeper() {
+		if (!enabled) return;
+		// Build the index in the background right away; sweep on a timer afterwards.
+		sweepExpired().catch(() => {});
+		if (!sweepIntervalS || sweepIntervalS <= 0) return;
+		sweepTimer = setInterval(() => {
+			sweepExpired().catch(() => {});
+		}, sweepIntervalS * 1000);
+		try { sweepTimer.unref(); } catch {/**/}
+	}
+
 	async function get({ engine, url }) {
-		await maybeSweep();
 		if (!enabled) return null;
 		if (!url) return null;
 
 		const normalized = normalizeUrl(url);
 		if (!normalized) return null;
-		if (!_ensureDir(baseDir)) return null;
-
-		const fp = _filePathFor(engine, normalized);
 
-		let st;
-		try {
-			st = fs.statSync(fp);
+		const key = _keyFor(engine, normalized);
+		const me = _memGet(key);
+		if (me) {
+			stats.memory.hits += 1;
+			_indexTouch(key);
+			return { text: me.text, tier: "memory" };
 		}
-		catch {/**/}
-		if (!st) return null;
+		stats.memory.misses += 1;
 
-		if (_isExpiredMtimeMs(st.mtimeMs)) {
-			try { fs.unlinkSync(fp); } catch {/**/}
+		const text = await _diskGet(key);
+		if (!text) {
+			stats.disk.misses += 1;
 			return null;
 		}
+		stats.disk.hits += 1;
+		return { text, tier: "disk" };
+	}
 
-		let raw;
-		try {
-			raw = fs.readFileSync(fp, "utf8");
-		}
-		catch {/**/}
-		if (!raw) return null;
+	async function _readEntry(key) {
+		// Returns { obj, st, v } from the v2 file, falling back to the legacy v1 file.
+		for (const v of [2, 1]) {
+			const fp = v === 2 ? _v2PathForKey(key) : _v1PathForKey(key);
 
-		let obj;
-		try {
-			obj = JSON.parse(raw);
+			let st;
+			try {
+				st = await fsp.stat(fp);
+			}
+			catch {/**/}
+			if (!st) continue;
+
+			if (_isExpiredMtimeMs(st.mtimeMs)) {
+				_indexDelete(key);
+				_notify("onRemove", key);
+				await _unlinkKey(key, v);
+				continue;
+			}
+
+			let raw;
+			try {
+				const buf = await fsp.readFile(fp);
+				raw = (v === 2 ? await _gunzip(buf) : buf).toString("utf8");
+			}
+			catch {/**/}
+			if (!raw) continue;
+
+			let obj;
+			try {
+				obj = JSON.parse(raw);
+			}
+			catch {/**/}
+			if (!obj || typeof obj !== "object") continue;
+
+			return { obj, st, v };
 		}
-		catch {/**/}
-		if (!obj || typeof obj !== "object") return null;
+		return null;
+	}
+
+	async function _diskGet(key) {
+		if (!(await _dir())) return null;
+
+		const r = await _readEntry(key);
+		if (!r) return null;
 
-		const text = (obj.extracted_text || "").toString();
+		const text = (r.obj.extracted_text || "").toString();
 		if (!text) return null;
 
-		return { text };
+		if (r.v === 1) {
+			// Migrate to v2, keeping the original creation time for TTL.
+			const ok = await _writeEntry(key, { ...r.obj, v: 2 }, r.st.mtimeMs);
+			if (ok) {
+				try { await fsp.unlink(_v1PathForKey(key)); } catch {/**/}
+				stats.disk.migrated += 1;
+			}
+		}
+		else if (!disk.has(key)) {
+			_indexSet(key, r.st.mtimeMs, r.st.size, 2);
+		}
+		_indexTouch(key);
+
+		// Promote with the file mtime so the memory copy expires with the file.
+		_memPut(key, text, r.st.mtimeMs);
+		return text;
+	}
+
+	async function _writeEntry(key, payload, createdMs) {
+		const fp = _v2PathForKey(key);
+		// Unique temp name: concurrent writers of the same key never share a .tmp file.
+		const tmp = fp + "." + process.pid + "." + crypto.randomBytes(4).toString("hex") + ".tmp";
+
+		try {
+			await fsp.mkdir(path.dirname(fp), { recursive: true });
+			const gz = await _gzip(Buffer.from(JSON.stringify(payload), "utf8"), { level: gzipLevel });
+			await fsp.writeFile(tmp, gz);
+			const t = new Date(createdMs);
+			await fsp.utimes(tmp, t, t);
+			await fsp.rename(tmp, fp);
+			_indexSet(key, createdMs, gz.length, 2);
+			await _evictOverCap();
+			return true;
+		}
+		catch {
+			// Re-create the directory on the next write if it was removed underneath us.
+			dirReady = false;
+		}
+		try { await fsp.unlink(tmp); } catch {/**/}
+		return false;
 	}
 
 	async function put({ engine, url, finalUrl, title, text }) {
-		await maybeSweep();
 		if (!enabled) return false;
 
 		const normalized = normalizeUrl(url);
 		if (!normalized) return false;
-		if (!_ensureDir(baseDir)) return false;
 
-		const fp = _filePathFor(engine, normalized);
-		const tmp = fp + ".tmp";
+		const key = _keyFor(engine, normalized);
+		const nowMs = _nowMs();
+
+		// Write-through: memory first, then disk.
+		_memPut(key, (text || "").toString(), nowMs);
+		_notify("onPut", key, { url: (finalUrl || url || "").toString(), title, text, createdMs: nowMs });
+
+		if (!(await _dir())) return false;
 
 		const payload = {
-			v: 1,
+			v: 2,
 			engine: (engine || "local").toString().toLowerCase(),
 			normalized_url: normalized,
 			source_url: (url || "").toString(),
 			final_url: (finalUrl || "").toString(),
 			title: (title || "").toString(),
 			extracted_text: (text || "").toString(),
-			created_utc: new Date().toISOString()
+			created_utc: new Date(nowMs).toISOString()
 		};
 
-		try {
-			fs.writeFileSync(tmp, JSON.stringify(payload), "utf8");
-			fs.renameSync(tmp, fp);
-			return true;
+		const ok = await _writeEntry(key, payload, nowMs);
+		// A stale v1 file would otherwise shadow nothing but still take space.
+		if (ok) {
+			try { await fsp.unlink(_v1PathForKey(key)); } catch {/**/}
 		}
-		catch {/**/}
-		try { fs.unlinkSync(tmp); } catch {/**/}
-		return false;
+		return ok;
 	}
 
 	async function clearAll() {
-		if (!_ensureDir(baseDir)) return 0;
+		_notify("onClear");
+		mem.clear();
+		memBytes = 0;
+		disk.clear();
+		diskBytes = 0;
+		expiry.clear();
+		if (!(await _dir())) return 0;
 
 		let removed = 0;
 		let entries = [];
 		try {
-			entries = fs.readdirSync(baseDir, { withFileTypes: true });
+			entries = await fsp.readdir(baseDir, { withFileTypes: true });
 		}
 		catch {/**/}
 
 		for (const de of entries) {
-			if (!de || !de.isFile()) continue;
+			if (!de) continue;
 			const name = (de.name || "").toString();
-			if (!name.endsWith(".json")) continue;
 
-			const fp = path.join(baseDir, name);
+			if (de.isDirectory() && _isShardName(name)) {
+				const sd = path.join(baseDir, name);
+				let files = [];
+				try {
+					files = await fsp.readdir(sd);
+				}
+				catch {/**/}
+				for (const f of files) {
+					if (!f.endsWith(V2_EXT)) continue;
+					try {
+						await fsp.unlink(path.join(sd, f));
+						removed += 1;
+					}
+					catch {/**/}
+					if ((removed % sweepSliceSize) === 0) await _yieldToEventLoop();
+				}
+				try { await fsp.rmdir(sd); } catch {/**/}
+				continue;
+			}
+
+			if (!de.isFile() || !name.endsWith(V1_EXT)) continue;
+
 			try {
-				fs.unlinkSync(fp);
+				await fsp.unlink(path.join(baseDir, name));
 				removed += 1;
 			}
 			catch {/**/}
+
+			if ((removed % sweepSliceSize) === 0) await _yieldToEventLoop();
 		}
 
 		return removed;
 	}
 
+	async function forEachEntry(fn) {
+		// Walk every live disk entry (oldest first) without promoting it; used to warm
+		// the retrieval index after a restart. Reads are sliced like sweeps.
+		if (!enabled) return 0;
+		if (!indexReady) await sweepExpired();
+		let n = 0;
+		for (const key of Array.from(disk.keys())) {
+			if (!disk.has(key)) continue;
+			const r = await _readEntry(key);
+			if (!r) continue;
+			const text = (r.obj.extracted_text || "").toString();
+			if (!text) continue;
+			try {
+				fn(key, {
+					url: (r.obj.final_url || r.obj.source_url || r.obj.normalized_url || "").toString(),
+					title: (r.obj.title || "").toString(),
+					text,
+					createdMs: r.st.mtimeMs
+				});
+			}
+			catch {/**/}
+			n += 1;
+			if ((n % sweepSliceSize) === 0) await _yieldToEventLoop();
+		}
+		return n;
+	}
+
+	function close() {
+		if (sweepTimer) clearInterval(sweepTimer);
+		sweepTimer = null;
+	}
+
+	_startSweeper();
+
 	return {
 		enabled,
 		dir: baseDir,
 		ttl_s: ttlS,
 		sweep_interval_s: sweepIntervalS,
+		memory_max_bytes: memMaxBytes,
+		max_bytes: maxBytes,
 		get,
 		put,
 		clearAll,
-		sweepExpired
+		forEachEntry,
+		sweepExpired,
+		close,
+		stats: () => ({
+			memory: { ...stats.memory, entries: mem.size, bytes: memBytes },
+			disk: { ...stats.disk, entries: disk.size, bytes: diskBytes }
+		})
 	};
 }
 
-//<EOF cache.mjs lines: 273>
+//<EOF cache.mjs lines: 696>
@@ -0,0 +1,248 @@
+// Shared HTTP dispatchers for outbound fetches (service.fetch.pool, service.fetch.dns_cache).
+//
+// One long-lived undici Agent per proxy configuration ("direct" or a SOCKS
+// URL), so keep-alive connections survive across pages and requests instead
+// of being thrown away with a per-page dispatcher. Direct connections resolve
+// hosts through an in-process DNS cache with a TTL (SOCKS5h resolves on the
+// proxy). Requests and new connections are reported per dispatcher through
+// hooks (Prometheus counters in app.mjs); the difference is connection reuse.
+
+import dns from "node:dns";
+import net from "node:net";
+
+let _undici = null;
+let _fetchSocks = null;
+
+async function _loadUndici() {
+	if (_undici !== null) return _undici;
+	try {
+		_undici = await import("undici");
+		return _undici;
+	}
+	catch {/**/}
+	_undici = false;
+	return _undici;
+}
+
+async function _loadFetchSocks() {
+	if (_fetchSocks !== null) return _fetchSocks;
+	try {
+		// Lazy-load optional dependency.
+		// npm i fetch-socks
+		_fetchSocks = await import("fetch-socks");
+		return _fetchSocks;
+	}
+	catch {/**/}
+	_fetchSocks = false;
+	return _fetchSocks;
+}
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+export function parseSocksProxyUrl(proxyUrl) {
+	try {
+		const u = new URL((proxyUrl || "").toString().trim());
+		const proto = (u.protocol || "").toLowerCase();
+		if (proto !== "socks5:" && proto !== "socks5h:" && proto !== "socks4:" && proto !== "socks4a:") return null;
+
+		let type = 5;
+		if (proto === "socks4:" || proto === "socks4a:") type = 4;
+
+		const host = (u.hostname || "").toString().trim();
+		const port = parseInt((u.port || "").toString(), 10);
+		if (!host || !Number.isFinite(port) || port <= 0) return null;
+
+		const userId = (u.username || "").toString();
+		const password = (u.password || "").toString();
+
+		const out = { type, host, port };
+		if (userId) out.userId = userId;
+		if (password) out.password = password;
+		return out;
+	}
+	catch {/**/}
+	return null;
+}
+
+export function createDnsCache(cfg, hooks = {}) {
+	// A net.connect-compatible lookup(hostname, options, callback) backed by dns.lookup.
+	const ttlMs = Math.max(1, _asInt(cfg?.ttl_s, 60)) * 1000;
+	const maxEntries = Math.max(1, _asInt(cfg?.max_entries, 1000));
+
+	// hostname -> { addrs: [{ address, family }], expiresMs }; insertion order is age order.
+	const entries = new Map();
+	const inflight = new Map();
+
+	function _resolve(hostname) {
+		let p = inflight.get(hostname);
+		if (p) return p;
+		p = new Promise((resolve, reject) => {
+			dns.lookup(hostname, { all: true }, (err, addrs) => (err ? reject(err) : resolve(addrs)));
+		});
+		inflight.set(hostname, p);
+		p.then(
+			(addrs) => {
+				entries.delete(hostname);
+				entries.set(hostname, { addrs, expiresMs: Date.now() + ttlMs });
+				for (const k of entries.keys()) {
+					if (entries.size <= maxEntries) break;
+					entries.delete(k);
+				}
+			},
+			() => {/**/}
+		).finally(() => inflight.delete(hostname));
+		return p;
+	}
+
+	function lookup(hostname, options, callback) {
+		if (typeof options === "function") {
+			callback = options;
+			options = {};
+		}
+		const opts = (typeof options === "number") ? { family: options } : (options || {});
+
+		const reply = (err, addrs) => {
+			if (err) return callback(err);
+			const fam = (opts.family === 4 || opts.family === 6) ? opts.family : 0;
+			const list = fam ? addrs.filter((a) => a.family === fam) : addrs;
+			if (list.length === 0) {
+				const e = new Error(`getaddrinfo ENOTFOUND ${hostname}`);
+				e.code = "ENOTFOUND";
+				e.hostname = hostname;
+				return callback(e);
+			}
+			if (opts.all) return callback(null, list);
+			return callback(null, list[0].address, list[0].family);
+		};
+
+		const ipFamily = net.isIP(hostname);
+		if (ipFamily) return reply(null, [{ address: hostname, family: ipFamily }]);
+
+		const key = (hostname || "").toLowerCase();
+		const e = entries.get(key);
+		if (e && Date.now() < e.expiresMs) {
+			if (hooks.onLookup) hooks.onLookup("hit");
+			return reply(null, e.addrs);
+		}
+		if (hooks.onLookup) hooks.onLookup("miss");
+		_resolve(key).then((addrs) => reply(null, addrs), (err) => reply(err));
+	}
+
+	return {
+		lookup,
+		clear: () => entries.clear(),
+		size: () => entries.size
+	};
+}
+
+function _proxyLabel(psu) {
+	// Never expose proxy credentials in stats/metrics.
+	try {
+		const u = new URL(psu);
+		return `${u.protocol}//${u.hostname}:${u.port}`;
+	}
+	catch {/**/}
+	return "proxy";
+}
+
+export function createDispatcherRegistry(cfg, hooks = {}) {
+	const poolCfg = cfg?.pool || {};
+	const connections = Math.max(0, _asInt(poolCfg.connections_per_origin, 16));
+	const agentOpts = {
+		keepAliveTimeout: Math.max(1, _asInt(poolCfg.keep_alive_timeout_ms, 10000)),
+		keepAliveMaxTimeout: Math.max(1, _asInt(poolCfg.keep_alive_max_timeout_ms, 60000)),
+		pipelining: Math.max(0, _asInt(poolCfg.pipelining, 1)),
+		// 0 = unlimited
+		connections: connections > 0 ? connections : null
+	};
+	const dnsCache = _asBool(cfg?.dns_cache?.enabled, true) ? createDnsCache(cfg?.dns_cache, hooks) : null;
+
+	// key ("direct" or proxy URL) -> Promise<{ dispatcher, agent, label } | { error }>
+	const entries = new Map();
+
+	function _instrument(label, agent) {
+		try {
+			agent.on("connect", () => {
+				if (hooks.onConnect) hooks.onConnect(label);
+			});
+		}
+		catch {/**/}
+
+		// Count requests with an interceptor; the base agent keeps the connection pools.
+		let dispatcher = agent;
+		if (typeof agent.compose === "function") {
+			dispatcher = agent.compose((dispatch) => (opts, handler) => {
+				if (hooks.onRequest) hooks.onRequest(label);
+				return dispatch(opts, handler);
+			});
+		}
+		return { dispatcher, agent, label };
+	}
+
+	async function _build(psu) {
+		if (!psu) {
+			const undici = await _loadUndici();
+			// Without the undici package, fetch() falls back to Node's global dispatcher.
+			if (!undici || !undici.Agent) return { dispatcher: null };
+			const agent = new undici.Agent({
+				...agentOpts,
+				connect: dnsCache ? { lookup: dnsCache.lookup } : undefined
+			});
+			return _instrument("direct", agent);
+		}
+
+		const sc = parseSocksProxyUrl(psu);
+		if (!sc) return { dispatcher: null };
+
+		const mod = await _loadFetchSocks();
+		if (!mod || mod === false) return { error: "missing_fetch_socks" };
+		try {
+			const agent = mod.socksDispatcher(sc, agentOpts);
+			if (!agent) return { dispatcher: null };
+			return _instrument(_proxyLabel(psu), agent);
+		}
+		catch {/**/}
+		return { error: "proxy_init_failed" };
+	}
+
+	async function get(proxySocksUrl) {
+		// Dispatcher for this proxy config (null = global dispatcher), or { error }.
+		const psu = (proxySocksUrl || "").toString().trim();
+		const key = psu || "direct";
+		let p = entries.get(key);
+		if (!p) {
+			p = _build(psu);
+			entries.set(key, p);
+		}
+		const e = await p;
+		if (e?.error) return { error: e.error };
+		return e?.dispatcher || null;
+	}
+
+	async function close() {
+		const all = await Promise.all(Array.from(entries.values()));
+		entries.clear();
+		await Promise.all(all.map((e) => (e?.agent?.close ? e.agent.close().catch(() => {}) : null)));
+	}
+
+	function clearDns() {
+		if (dnsCache) dnsCache.clear();
+	}
+
+	return { get, close, clearDns };
+}
+
+//<EOF dispatchers.mjs lines: 249>
@@ -0,0 +1,159 @@
+// Worker pool for HTML extraction (service.fetch.extract_pool).
+// JSDOM + Readability on a 2 MB page can take hundreds of milliseconds of
+// synchronous CPU; run inline it stalls every other request. Tasks are queued
+// FIFO and handed to idle workers. A task that exceeds task_timeout_ms gets its
+// worker terminated (JSDOM cannot be interrupted) and resolves to null, so the
+// caller falls back to the tag stripper. Workers run with V8 heap limits and
+// are replaced after recycle_after_tasks tasks to cap JSDOM heap growth.
+
+import os from "node:os";
+import { Worker } from "node:worker_threads";
+
+const WORKER_URL = new URL("./extract_worker.mjs", import.meta.url);
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+function _defaultWorkers() {
+	let cores = 2;
+	try { cores = os.availableParallelism ? os.availableParallelism() : os.cpus().length; } catch {/**/}
+	// Leave one core for the event loop.
+	return Math.max(1, Math.min(4, cores - 1));
+}
+
+export function createExtractPool(cfg) {
+	const enabled = _asBool(cfg?.enabled, true);
+	const size = Math.max(1, _asInt(cfg?.workers, 0) || _defaultWorkers());
+	const taskTimeoutMs = Math.max(100, _asInt(cfg?.task_timeout_ms, 10000));
+	const recycleAfter = Math.max(0, _asInt(cfg?.recycle_after_tasks, 200));
+	const maxQueue = Math.max(1, _asInt(cfg?.max_queue, 256));
+	const resourceLimits = {
+		maxOldGenerationSizeMb: Math.max(32, _asInt(cfg?.max_old_generation_mb, 256)),
+		maxYoungGenerationSizeMb: Math.max(4, _asInt(cfg?.max_young_generation_mb, 32))
+	};
+
+	const workers = new Set();
+	const queue = [];
+	let nextId = 1;
+	let closed = false;
+
+	const stats = { tasks: 0, ok: 0, empty: 0, timeouts: 0, crashes: 0, rejected: 0, recycled: 0, spawned: 0 };
+
+	function _spawn() {
+		const w = { worker: new Worker(WORKER_URL, { resourceLimits }), task: null, done: 0, timer: null };
+		stats.spawned += 1;
+		w.worker.on("message", (msg) => {
+			const t = w.task;
+			if (!t || msg?.id !== t.id) return;
+			_settle(w, typeof msg.text === "string" ? msg.text : null);
+			w.done += 1;
+			if (recycleAfter > 0 && w.done >= recycleAfter) {
+				stats.recycled += 1;
+				_retire(w);
+			}
+			_pump();
+		});
+		// Out-of-memory (resourceLimits) or any other crash: fail the running task, replace lazily.
+		w.worker.on("error", () => {
+			stats.crashes += 1;
+			_settle(w, null);
+			_retire(w);
+			_pump();
+		});
+		w.worker.on("exit", () => {
+			_settle(w, null);
+			workers.delete(w);
+			_pump();
+		});
+		// Idle workers must not keep the process alive.
+		w.worker.unref();
+		workers.add(w);
+		return w;
+	}
+
+	function _settle(w, text) {
+		const t = w.task;
+		if (!t) return;
+		w.task = null;
+		if (w.timer) clearTimeout(w.timer);
+		w.timer = null;
+		if (text) stats.ok += 1;
+		else stats.empty += 1;
+		t.resolve(text);
+	}
+
+	function _retire(w) {
+		workers.delete(w);
+		try { w.worker.terminate(); } catch {/**/}
+	}
+
+	function _idleWorker() {
+		for (const w of workers) {
+			if (!w.task) return w;
+		}
+		if (workers.size < size) return _spawn();
+		return null;
+	}
+
+	function _pump() {
+		while (!closed && queue.length > 0) {
+			const w = _idleWorker();
+			if (!w) return;
+			const t = queue.shift();
+			w.task = t;
+			w.timer = setTimeout(() => {
+				stats.timeouts += 1;
+				_settle(w, null);
+				_retire(w);
+				_pump();
+			}, taskTimeoutMs);
+			w.worker.postMessage({ id: t.id, html: t.html, baseUrl: t.baseUrl });
+		}
+	}
+
+	function extract(html, baseUrl) {
+		// Resolves to the extracted text, or null (failure, timeout, queue full); never rejects.
+		if (!enabled || closed) return Promise.resolve(null);
+		if (queue.length >= maxQueue) {
+			stats.rejected += 1;
+			return Promise.resolve(null);
+		}
+		stats.tasks += 1;
+		return new Promise((resolve) => {
+			queue.push({ id: nextId++, html: (html || "").toString(), baseUrl: baseUrl || "", resolve });
+			_pump();
+		});
+	}
+
+	async function close() {
+		closed = true;
+		for (const t of queue.splice(0)) t.resolve(null);
+		const all = Array.from(workers);
+		workers.clear();
+		await Promise.all(all.map((w) => {
+			_settle(w, null);
+			return w.worker.terminate().catch(() => {});
+		}));
+	}
+
+	return {
+		enabled,
+		extract,
+		close,
+		stats: () => ({ ...stats, workers: workers.size, busy: Array.from(workers).filter((w) => w.task).length, queued: queue.length })
+	};
+}
+
+//<EOF extract_pool.mjs lines: 160>
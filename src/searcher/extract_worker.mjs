@@ -0,0 +1,12 @@
+// Worker thread for extract_pool.mjs: runs Readability off the main event loop.
+// Message in: { id, html, baseUrl }; message out: { id, text } (text is null on failure).
+
+import { parentPort } from "node:worker_threads";
+import { extractReadable } from "./readable.mjs";
+
+parentPort.on("message", (msg) => {
+	const text = extractReadable(msg?.html, msg?.baseUrl);
+	parentPort.postMessage({ id: msg?.id, text });
+});
+
+//<EOF extract_worker.mjs lines: 12>
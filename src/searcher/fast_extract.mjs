@@ -0,0 +1,377 @@
+// Fast-path HTML text extractor (service.fetch.fast_extract).
+// A streaming SAX-style tokenizer: write() takes decoded chunks while the body
+// is still downloading, so most of the work is done by the time the last byte
+// arrives and no DOM is ever built. Script/style/nav/footer-like regions are
+// dropped, the remaining text is split into blocks, and blocks are kept by
+// length and link density (jusText-style boilerplate removal). end() returns
+// the text with a confidence in [0, 1]; fetch.mjs runs Readability only when
+// the confidence is below service.fetch.fast_extract.min_confidence.
+
+// Content of these elements is raw text: "<" inside does not start a tag.
+const RAW_TAGS = new Set(["script", "style", "textarea", "title", "noscript", "xmp"]);
+
+// Regions dropped entirely (with everything nested inside).
+const SKIP_TAGS = new Set([
+	"nav", "footer", "header", "aside", "form", "button", "select", "dialog", "menu",
+	"svg", "math", "iframe", "object", "canvas", "template"
+]);
+
+// Containers dropped when their class/id/role marks them as boilerplate.
+// Only elements whose end tag is never omitted, so the skip always terminates.
+const CONTAINER_TAGS = new Set(["div", "section", "ul", "ol", "dl", "table", "span"]);
+const BOILER_RE = /(?:^|[\s_-])(?:nav|navbar|navigation|menu|footer|sidebar|breadcrumbs?|cookies?|consent|banner|share|sharing|social|comments?|related|advert|ads|promo|subscribe|newsletter|popup|modal)(?:[\s_-]|$)/i;
+const BOILER_ROLE_RE = /^(?:navigation|banner|contentinfo|complementary|search|menu|menubar|dialog)$/i;
+
+const BLOCK_TAGS = new Set([
+	"p", "div", "li", "td", "th", "tr", "table", "section", "article", "main", "blockquote",
+	"pre", "ul", "ol", "dl", "dt", "dd", "figure", "figcaption", "hr", "address", "details",
+	"summary", "caption", "body", "html", "h1", "h2", "h3", "h4", "h5", "h6"
+]);
+const HEADING_TAGS = new Set(["h1", "h2", "h3", "h4", "h5", "h6"]);
+const VOID_TAGS = new Set(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"]);
+
+const ENTITIES = {
+	nbsp: " ", amp: "&", lt: "<", gt: ">", quot: "\"", apos: "'", mdash: "—", ndash: "–",
+	hellip: "…", laquo: "«", raquo: "»", lsquo: "‘", rsquo: "’",
+	ldquo: "“", rdquo: "”", bull: "•", middot: "·", copy: "©",
+	reg: "®", trade: "™", shy: "", zwnj: "", zwj: ""
+};
+
+// A block this long with a low link density is content.
+const GOOD_CHARS = 80;
+const MAX_LINK_DENSITY = 0.33;
+// Good text at which the fast path is fully trusted.
+const CONFIDENT_CHARS = 1000;
+// A "<" with no ">" within this many chars is literal text.
+const MAX_TAG_CHARS = 65536;
+
+function _decodeEntities(s) {
+	if (s.indexOf("&") < 0) return s;
+	return s.replace(/&(#x[0-9a-f]+|#\d+|[a-z]+);/gi, (m, e) => {
+		if (e[0] === "#") {
+			const cp = (e[1] === "x" || e[1] === "X") ? parseInt(e.slice(2), 16) : parseInt(e.slice(1), 10);
+			if (!Number.isFinite(cp) || cp <= 0 || cp > 0x10ffff) return m;
+			try { return String.fromCodePoint(cp); } catch { return m; }
+		}
+		const v = ENTITIES[e.toLowerCase()];
+		return v === undefined ? m : v;
+	});
+}
+
+function _tagEnd(s, from) {
+	// Index of the ">" closing the tag at s[from] === "<", skipping quoted attribute values; -1 if incomplete.
+	const n = s.length;
+	for (let i = from + 1; i < n; i++) {
+		const c = s.charCodeAt(i);
+		if (c === 62) return i; // >
+		if (c === 61) { // =
+			let j = i + 1;
+			while (j < n && (s[j] === " " || s[j] === "\t" || s[j] === "\n" || s[j] === "\r")) j++;
+			if (j >= n) return -1;
+			const q = s[j];
+			if (q === "\"" || q === "'") {
+				const k = s.indexOf(q, j + 1);
+				if (k < 0) return -1;
+				i = k;
+			}
+			else {
+				i = j - 1;
+			}
+		}
+	}
+	return -1;
+}
+
+function _attr(inner, name) {
+	const m = inner.match(new RegExp(`\\s${name}\\s*=\\s*(?:"([^"]*)"|'([^']*)'|([^\\s>]+))`, "i"));
+	return m ? (m[1] ?? m[2] ?? m[3] ?? "") : null;
+}
+
+function _isBoilerplate(inner) {
+	if (/\shidden(?:[\s/=]|$)/i.test(inner)) return true;
+	if ((_attr(inner, "aria-hidden") || "").toLowerCase() === "true") return true;
+	const role = _attr(inner, "role");
+	if (role && BOILER_ROLE_RE.test(role.trim())) return true;
+	const cls = _attr(inner, "class");
+	if (cls && BOILER_RE.test(cls)) return true;
+	const id = _attr(inner, "id");
+	return !!(id && BOILER_RE.test(id));
+}
+
+export function createFastExtractor() {
+	let buf = "";
+	let raw = null;
+	let rawText = "";
+	let skip = null;
+	let contentDepth = 0;
+	let linkDepth = 0;
+	let headingDepth = 0;
+	let preDepth = 0;
+	let sawContent = false;
+	let title = "";
+	let ms = 0;
+
+	const blocks = [];
+	let cur = { parts: [], linkChars: 0, heading: false, li: false, inContent: false };
+
+	function _flush(li = false) {
+		let text = cur.parts.join("");
+		text = preDepth > 0 ? text.replace(/^\n+|\s+$/g, "") : text.replace(/ {2,}/g, " ").replace(/ *\n */g, "\n").trim();
+		if (text) {
+			blocks.push({
+				text: cur.li ? "- " + text : text,
+				len: text.length,
+				linkDensity: Math.min(1, cur.linkChars / text.length),
+				heading: cur.heading,
+				inContent: cur.inContent
+			});
+		}
+		cur = { parts: [], linkChars: 0, heading: false, li, inContent: contentDepth > 0 };
+	}
+
+	function _text(s) {
+		if (!s || skip) return;
+		if (preDepth === 0 && !/\S/.test(s)) {
+			// Whitespace between tags: at most one separating space.
+			if (cur.parts.length > 0) cur.parts.push(" ");
+			return;
+		}
+		let t = _decodeEntities(s);
+		if (preDepth === 0) t = t.replace(/\s+/g, " ");
+		if (!t) return;
+		if (cur.parts.length === 0) {
+			if (preDepth === 0) t = t.replace(/^ /, "");
+			if (!t) return;
+			cur.heading = headingDepth > 0;
+			cur.inContent = contentDepth > 0;
+		}
+		cur.parts.push(t);
+		if (linkDepth > 0) cur.linkChars += t.trim().length;
+	}
+
+	function _tag(inner) {
+		const c0 = inner[0];
+		if (c0 === "!" || c0 === "?") return;
+		const m = inner.match(/^(\/?)\s*([a-zA-Z][a-zA-Z0-9:-]*)/);
+		if (!m) return;
+		const close = m[1] === "/";
+		const name = m[2].toLowerCase();
+		const selfClose = inner.endsWith("/") || VOID_TAGS.has(name);
+
+		if (!close && RAW_TAGS.has(name)) {
+			raw = name;
+			rawText = "";
+			return;
+		}
+
+		if (skip) {
+			if (name === skip.tag) {
+				if (close) skip.depth -= 1;
+				else if (!selfClose) skip.depth += 1;
+				if (skip.depth <= 0) skip = null;
+			}
+			return;
+		}
+
+		if (!close && !selfClose) {
+			const skipTag = SKIP_TAGS.has(name) && !(name === "header" && contentDepth > 0);
+			if (skipTag || (CONTAINER_TAGS.has(name) && _isBoilerplate(inner))) {
+				_flush();
+				skip = { tag: name, depth: 1 };
+				return;
+			}
+		}
+
+		if (name === "a") {
+			linkDepth = Math.max(0, linkDepth + (close ? -1 : 1));
+			return;
+		}
+		if (name === "br") {
+			if (cur.parts.length > 0) cur.parts.push("\n");
+			return;
+		}
+		if (!BLOCK_TAGS.has(name)) return;
+
+		_flush(!close && name === "li");
+		if (name === "article" || name === "main") {
+			contentDepth = Math.max(0, contentDepth + (close ? -1 : 1));
+			if (!close) sawContent = true;
+			cur.inContent = contentDepth > 0;
+		}
+		else if (HEADING_TAGS.has(name)) {
+			headingDepth = Math.max(0, headingDepth + (close ? -1 : 1));
+		}
+		else if (name === "pre") {
+			preDepth = Math.max(0, preDepth + (close ? -1 : 1));
+		}
+	}
+
+	function _closeRawAt(s, from) {
+		// Index of "</raw" (case-insensitive) at or after from; -1 if absent.
+		let j = s.indexOf("</", from);
+		while (j >= 0) {
+			if (s.slice(j + 2, j + 2 + raw.length).toLowerCase() === raw) return j;
+			j = s.indexOf("</", j + 2);
+		}
+		return -1;
+	}
+
+	function write(chunk) {
+		const t0 = performance.now();
+		buf += (chunk || "").toString();
+		const n = buf.length;
+		let pos = 0;
+
+		while (pos < n) {
+			if (raw) {
+				const j = _closeRawAt(buf, pos);
+				if (j < 0) {
+					// Keep a tail long enough to hold a split "</raw".
+					const keep = Math.max(pos, n - raw.length - 2);
+					if (raw === "title") rawText += buf.slice(pos, keep);
+					pos = keep;
+					break;
+				}
+				const gt = buf.indexOf(">", j);
+				if (gt < 0) {
+					if (raw === "title") rawText += buf.slice(pos, j);
+					pos = j;
+					break;
+				}
+				if (raw === "title") {
+					rawText += buf.slice(pos, j);
+					if (!title) title = _decodeEntities(rawText).replace(/\s+/g, " ").trim();
+				}
+				raw = null;
+				pos = gt + 1;
+				continue;
+			}
+
+			const lt = buf.indexOf("<", pos);
+			if (lt < 0) {
+				// Hold back a possibly split entity ("&am" + "p;").
+				const amp = buf.lastIndexOf("&");
+				const cut = (amp >= pos && n - amp < 12 && buf.indexOf(";", amp) < 0) ? amp : n;
+				_text(buf.slice(pos, cut));
+				pos = cut;
+				break;
+			}
+			if (lt > pos) _text(buf.slice(pos, lt));
+			pos = lt;
+
+			if (buf.startsWith("<!--", pos)) {
+				const e = buf.indexOf("-->", pos + 4);
+				if (e < 0) break;
+				pos = e + 3;
+				continue;
+			}
+			const next = buf[pos + 1];
+			if (next === undefined) break;
+			if (!/[a-zA-Z/!?]/.test(next)) {
+				_text("<");
+				pos += 1;
+				continue;
+			}
+			const gt = _tagEnd(buf, pos);
+			if (gt < 0) {
+				if (n - pos > MAX_TAG_CHARS) {
+					_text("<");
+					pos += 1;
+					continue;
+				}
+				break;
+			}
+			_tag(buf.slice(pos + 1, gt));
+			pos = gt + 1;
+		}
+
+		buf = buf.slice(pos);
+		ms += performance.now() - t0;
+	}
+
+	function end() {
+		const t0 = performance.now();
+		if (buf && !raw) _text(buf);
+		buf = "";
+		_flush();
+
+		// Classify: good (long, few links), bad (mostly links), heading, short.
+		const cls = blocks.map((b) => {
+			if (b.linkDensity > 0.5) return "bad";
+			if (b.heading) return "heading";
+			if (b.len >= GOOD_CHARS && b.linkDensity <= MAX_LINK_DENSITY) return "good";
+			return "short";
+		});
+
+		// Short blocks between good ones (list items, short paragraphs) are kept as context;
+		// headings are kept when good text follows before any boilerplate.
+		const keep = cls.map((c) => c === "good");
+		for (let i = 0; i < blocks.length; i++) {
+			if (cls[i] === "short" && blocks[i].linkDensity <= 0.2) {
+				let p = i - 1;
+				while (p >= 0 && (cls[p] === "short" || cls[p] === "heading")) p--;
+				let q = i + 1;
+				while (q < blocks.length && (cls[q] === "short" || cls[q] === "heading")) q++;
+				keep[i] = p >= 0 && q < blocks.length && cls[p] === "good" && cls[q] === "good";
+			}
+			else if (cls[i] === "heading") {
+				for (let q = i + 1; q < blocks.length && q <= i + 3; q++) {
+					if (cls[q] === "bad") break;
+					if (cls[q] === "good") {
+						keep[i] = true;
+						break;
+					}
+				}
+			}
+		}
+
+		// With <article>/<main> holding most good text, drop what is outside it.
+		let goodChars = 0;
+		let contentGood = 0;
+		for (let i = 0; i < blocks.length; i++) {
+			if (cls[i] !== "good") continue;
+			goodChars += blocks[i].len;
+			if (blocks[i].inContent) contentGood += blocks[i].len;
+		}
+		const contentOnly = sawContent && contentGood >= goodChars * 0.5 && contentGood > 0;
+
+		const out = [];
+		let goodBlocks = 0;
+		let keptGood = 0;
+		for (let i = 0; i < blocks.length; i++) {
+			if (!keep[i] || (contentOnly && !blocks[i].inContent)) continue;
+			out.push(blocks[i].text);
+			if (cls[i] === "good") {
+				goodBlocks += 1;
+				keptGood += blocks[i].len;
+			}
+		}
+
+		let confidence = Math.min(1, keptGood / CONFIDENT_CHARS);
+		if (goodBlocks < 2) confidence *= 0.5;
+		else if (goodBlocks < 3) confidence *= 0.8;
+		if (contentOnly) confidence = Math.min(1, confidence + 0.1);
+
+		ms += performance.now() - t0;
+		return {
+			text: out.join("\n\n"),
+			title,
+			confidence: Math.round(confidence * 100) / 100,
+			blocks: blocks.length,
+			goodBlocks,
+			ms: Math.round(ms * 100) / 100
+		};
+	}
+
+	return { write, end };
+}
+
+export function fastExtract(html, { chunkChars = 16384 } = {}) {
+	// Whole-document convenience wrapper (benchmarks, non-streaming callers).
+	const fx = createFastExtractor();
+	const s = (html || "").toString();
+	for (let i = 0; i < s.length; i += chunkChars) fx.write(s.slice(i, i + chunkChars));
+	return fx.end();
+}
+
+//<EOF fast_extract.mjs lines: 342>
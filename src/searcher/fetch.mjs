@@ -1,72 +1,36 @@
-import { JSDOM } from "jsdom";
-import { Readability } from "@mozilla/readability";
+import { extractReadable } from "./readable.mjs";
+import { createFastExtractor } from "./fast_extract.mjs";
+import { createDispatcherRegistry } from "./dispatchers.mjs";
 
-let _fetchSocks = null;
+// Callers without their own registry (app.mjs passes one) share this one.
+let _defaultDispatchers = null;
 
-async function _loadFetchSocks() {
-	if (_fetchSocks !== null) return _fetchSocks;
-	try {
-		// Lazy-load optional dependency.
-		// npm i fetch-socks
-		_fetchSocks = await import("fetch-socks");
-		return _fetchSocks;
-	}
-	catch {/**/}
-	_fetchSocks = false;
-	return _fetchSocks;
+function _dispatchersFor(opts) {
+	if (opts.dispatchers) return opts.dispatchers;
+	if (!_defaultDispatchers) _defaultDispatchers = createDispatcherRegistry({});
+	return _defaultDispatchers;
 }
 
-function _parseSocksProxyUrl(proxyUrl) {
-	try {
-		const u = new URL((proxyUrl || "").toString().trim());
-		const proto = (u.protocol || "").toLowerCase();
-		if (proto !== "socks5:" && proto !== "socks5h:" && proto !== "socks4:" && proto !== "socks4a:") return null;
-
-		let type = 5;
-		if (proto === "socks4:" || proto === "socks4a:") type = 4;
-
-		const host = (u.hostname || "").toString().trim();
-		const port = parseInt((u.port || "").toString(), 10);
-		if (!host || !Number.isFinite(port) || port <= 0) return null;
-
-		const userId = (u.username || "").toString();
-		const password = (u.password || "").toString();
-
-		const out = { type, host, port };
-		if (userId) out.userId = userId;
-		if (password) out.password = password;
-		return out;
+function _linkAbort(ac, signal) {
+	// Propagate an external cancellation (e.g. the fetch scheduler) into a local controller.
+	if (!signal) return;
+	if (signal.aborted) {
+		ac.abort();
+		return;
 	}
-	catch {/**/}
-	return null;
-}
-
-async function _buildDispatcher(proxySocksUrl) {
-	const psu = (proxySocksUrl || "").toString().trim();
-	if (!psu) return null;
-
-	const cfg = _parseSocksProxyUrl(psu);
-	if (!cfg) return null;
-
-	const mod = await _loadFetchSocks();
-	if (!mod || mod === false) return { error: "missing_fetch_socks" };
-
 	try {
-		const dispatcher = mod.socksDispatcher(cfg);
-		return dispatcher || null;
+		signal.addEventListener("abort", () => ac.abort(), { once: true });
 	}
 	catch {/**/}
-	return { error: "proxy_init_failed" };
 }
 
-
 function _buildJinaReaderUrl(baseUrl, targetUrl) {
 	const b = (baseUrl || "https://r.jina.ai/").toString().trim();
 	const bb = b.endsWith("/") ? b : (b + "/");
 	return bb + targetUrl;
 }
 
-async function _fetchViaJina(url, { timeoutMs, jinaBaseUrl, jinaApiKey, headers, dispatcher }) {
+async function _fetchViaJina(url, { timeoutMs, jinaBaseUrl, jinaApiKey, headers, dispatcher, signal }) {
 	const out = {
 		ok: false,
 		status: 0,
@@ -82,6 +46,7 @@ async function _fetchViaJina(url, { timeoutMs, jinaBaseUrl, jinaApiKey, headers,
 	}
 
 	const ac = new AbortController();
+	_linkAbort(ac, signal);
 	const t = setTimeout(() => ac.abort(), Math.max(1, timeoutMs || 8000));
 	try {
 		const resp = await fetch(u, { method: "GET", headers: h, signal: ac.signal, dispatcher: dispatcher || undefined });
@@ -115,18 +80,6 @@ function _isAllowedType(ct, allow) {
 	return false;
 }
 
-function _extractReadable(html, baseUrl) {
-	try {
-		const dom = new JSDOM((html || "").toString(), { url: baseUrl || "https://local/" });
-		const reader = new Readability(dom.window.document);
-		const out = reader.parse();
-		const text = (out?.textContent || "").toString().trim();
-		return text || null;
-	}
-	catch {/**/}
-	return null;
-}
-
 function _stripHtml(html) {
 	// Simple deterministic text extraction without external dependencies.
 	let s = (html || "").toString();
@@ -161,7 +114,44 @@ function _stripHtml(html) {
 	return s.trim();
 }
 
-async function _readLimitedBody(resp, maxBytes, timeoutMs) {
+// Bot-challenge / interstitial pages ("Just a moment...", "verify you are human").
+// Strong signatures are vendor markers that never occur in normal content; weak
+// ones are phrases an article could quote, so they only count on short pages.
+const _CHALLENGE_STRONG = [
+	/<title>\s*just a moment\.\.\.\s*<\/title>/i,
+	/<title>\s*attention required! \| cloudflare/i,
+	/cf_chl_opt|cf-browser-verification|\/cdn-cgi\/challenge-platform\//i,
+	/captcha-delivery\.com/i,
+	/px-captcha|_pxcaptcha/i,
+	/_incapsula_resource|incapsula incident id/i,
+	/<title>\s*ddos-guard\s*<\/title>/i,
+	/sucuri website firewall - access denied/i
+];
+const _CHALLENGE_WEAK = [
+	/verify(?:ing)? (?:that )?you are (?:a )?human/i,
+	/checking (?:if the site connection is secure|your browser before accessing)/i,
+	/enable javascript and cookies to continue/i,
+	/you need to enable javascript to run this app/i,
+	/please enable js and disable any ad blocker/i
+];
+
+function _isChallenge(head, complete) {
+	if (!head) return false;
+	for (const re of _CHALLENGE_STRONG) {
+		if (re.test(head)) return true;
+	}
+	if (!complete) return false;
+	for (const re of _CHALLENGE_WEAK) {
+		if (re.test(head)) return true;
+	}
+	return false;
+}
+
+// fetch_engine=auto: local failures that Jina Reader can usually get past.
+const _AUTO_FALLBACK_REASONS = new Set(["challenge", "http_401", "http_403", "http_429", "http_451", "http_503"]);
+
+async function _readLimitedBody(resp, maxBytes, timeoutMs, { onChunk, sniffBytes } = {}) {
+	// sniffBytes > 0: check the first bytes for bot-challenge signatures and stop the download on a match.
 	const deadline = (timeoutMs && timeoutMs > 0) ? (Date.now() + timeoutMs) : null;
 
 	function _mkTimeoutPromise() {
@@ -183,12 +173,20 @@ async function _readLimitedBody(resp, maxBytes, timeoutMs) {
 		const buf = Buffer.from(ab);
 		const truncated = maxBytes > 0 && buf.length > maxBytes;
 		const out = truncated ? buf.subarray(0, maxBytes) : buf;
+		if (sniffBytes > 0) {
+			const head = out.subarray(0, sniffBytes).toString("utf8");
+			if (_isChallenge(head, out.length <= sniffBytes)) return { buf: out, downloadedBytes: out.length, truncated, challenge: true };
+		}
+		if (onChunk) onChunk(out);
 		return { buf: out, downloadedBytes: out.length, truncated };
 	}
 
 	let downloaded = 0;
 	let chunks = [];
 	let truncated = false;
+	let challenge = false;
+	let head = "";
+	const headDec = sniffBytes > 0 ? new TextDecoder("utf-8") : null;
 
 	try {
 		// eslint-disable-next-line no-constant-condition
@@ -199,14 +197,28 @@ async function _readLimitedBody(resp, maxBytes, timeoutMs) {
 			if (done) break;
 			if (!value) continue;
 
+			if (headDec && downloaded < sniffBytes) {
+				head += headDec.decode(value.subarray(0, sniffBytes - downloaded), { stream: true });
+				if (_isChallenge(head, false)) {
+					challenge = true;
+					chunks.push(Buffer.from(value));
+					break;
+				}
+			}
+
 			downloaded += value.length;
 			if (maxBytes && maxBytes > 0 && downloaded > maxBytes) {
 				truncated = true;
 				const keep = value.subarray(0, value.length - (downloaded - maxBytes));
-				if (keep.length > 0) chunks.push(Buffer.from(keep));
+				if (keep.length > 0) {
+					chunks.push(Buffer.from(keep));
+					if (onChunk) onChunk(keep);
+				}
 				break;
 			}
 			chunks.push(Buffer.from(value));
+			// Streaming consumers (fast-path extractor) see each chunk as it arrives.
+			if (onChunk) onChunk(value);
 		}
 	}
 	finally {
@@ -214,8 +226,11 @@ async function _readLimitedBody(resp, maxBytes, timeoutMs) {
 		try { await resp.body?.cancel?.(); } catch {/**/}
 	}
 
+	// Weak signatures only count when the whole page fit in the sniff window (short interstitials).
+	if (headDec && !challenge && !truncated && downloaded <= sniffBytes) challenge = _isChallenge(head, true);
+
 	const buf = Buffer.concat(chunks);
-	return { buf, downloadedBytes: buf.length, truncated };
+	return { buf, downloadedBytes: buf.length, truncated, challenge };
 }
 
 async function _fetchWithRedirects(url, opts) {
@@ -226,6 +241,7 @@ async function _fetchWithRedirects(url, opts) {
 	// eslint-disable-next-line no-constant-condition
 	while (true) {
 		const ac = new AbortController();
+		_linkAbort(ac, opts.signal);
 		const to = opts.timeoutMs && opts.timeoutMs > 0
 			? setTimeout(() => ac.abort(), opts.timeoutMs)
 			: null;
@@ -270,8 +286,8 @@ async function _fetchWithRedirects(url, opts) {
 	}
 }
 
-export async function fetchAndExtract({ url, headers, allowedContentTypes, maxBytes, maxExtractChars, timeoutMs, maxRedirects }) {
-	const out = {
+function _newResult(url) {
+	return {
 		status: "failed",
 		skip_reason: "error",
 		content_type: "",
@@ -280,98 +296,200 @@ export async function fetchAndExtract({ url, headers, allowedContentTypes, maxBy
 		downloaded_bytes: 0,
 		truncated: false,
 		extracted_chars: 0,
+		// How the text was produced (fast | readability | strip_html | plain | jina) and how long it took.
+		extract_method: "",
+		extract_ms: 0,
+		// Engine that produced the result (local | jina); differs from the requested one for auto.
+		engine_used: "",
 		text: "",
 	};
+}
 
-	try {
-		const dispatcher = await _buildDispatcher(arguments?.[0]?.proxySocksUrl);
-		if (dispatcher && dispatcher?.error) {
-			out.status = "failed";
-			out.skip_reason = dispatcher.error;
-			return out;
-		}
+async function _extractViaJina(url, opts, dispatcher, out) {
+	// Optional alternate extractor engine: Jina Reader (https://r.jina.ai/<URL>).
+	const { headers, maxExtractChars, timeoutMs, signal } = opts;
+	out.engine_used = "jina";
+	const jr = await _fetchViaJina(url, {
+		timeoutMs,
+		jinaBaseUrl: opts.jinaBaseUrl,
+		jinaApiKey: opts.jinaApiKey,
+		headers,
+		dispatcher,
+		signal
+	});
+	if (!jr.ok) {
+		out.status = "failed";
+		out.skip_reason = jr.error || "http_" + (jr.status || 0);
+		return out;
+	}
+	let text = jr.text || "";
+	if (maxExtractChars && maxExtractChars > 0 && text.length > maxExtractChars) text = text.slice(0, maxExtractChars);
+	out.status = "fetched";
+	out.skip_reason = "";
+	out.content_type = "text/plain";
+	out.extract_method = "jina";
+	out.downloaded_bytes = (jr.text || "").length;
+	out.truncated = false;
+	out.text = text;
+	out.extracted_chars = text.length;
+	return out;
+}
 
-		// Optional alternate extractor engine: Jina Reader (https://r.jina.ai/<URL>).
-		// Backwards compatible: existing callers can ignore these optional fields.
-		const engine = (arguments?.[0]?.engine || "local").toString().toLowerCase();
-		if (engine === "jina") {
-			const jr = await _fetchViaJina(url, {
-				timeoutMs,
-				jinaBaseUrl: arguments?.[0]?.jinaBaseUrl,
-				jinaApiKey: arguments?.[0]?.jinaApiKey,
-				headers,
-				dispatcher
-			});
-			if (!jr.ok) {
-				out.status = "failed";
-				out.skip_reason = jr.error || "http_" + (jr.status || 0);
-				return out;
-			}
-			let text = jr.text || "";
-			if (maxExtractChars && maxExtractChars > 0 && text.length > maxExtractChars) text = text.slice(0, maxExtractChars);
-			out.status = "fetched";
-			out.skip_reason = "";
-			out.content_type = "text/plain";
-			out.downloaded_bytes = (jr.text || "").length;
-			out.truncated = false;
-			out.text = text;
-			out.extracted_chars = text.length;
-			return out;
-		}
+async function _extractLocal(url, opts, dispatcher, out) {
+	const { headers, allowedContentTypes, maxBytes, maxExtractChars, timeoutMs, maxRedirects, signal } = opts;
+	out.engine_used = "local";
 
-		const { resp, finalUrl, redirects, redirectError } = await _fetchWithRedirects(url, { timeoutMs, maxRedirects, headers, dispatcher });
-		out.final_url = finalUrl;
-		out.redirects = redirects;
+	const { resp, finalUrl, redirects, redirectError } = await _fetchWithRedirects(url, { timeoutMs, maxRedirects, headers, dispatcher, signal });
+	out.final_url = finalUrl;
+	out.redirects = redirects;
 
-		if (redirectError) {
-			out.status = "failed";
-			out.skip_reason = redirectError;
-			return out;
-		}
+	if (redirectError) {
+		out.status = "failed";
+		out.skip_reason = redirectError;
+		return out;
+	}
 
-		out.content_type = _normContentType(resp.headers.get("content-type") || "");
+	if (resp.status >= 400) {
+		// Error pages carry no useful text; Cloudflare marks its challenge responses explicitly.
+		const mitigated = (resp.headers.get("cf-mitigated") || "").toLowerCase() === "challenge";
+		try { await resp.body?.cancel?.(); } catch {/**/}
+		out.status = "failed";
+		out.skip_reason = mitigated ? "challenge" : "http_" + resp.status;
+		return out;
+	}
+
+	out.content_type = _normContentType(resp.headers.get("content-type") || "");
 
-		if (!_isAllowedType(out.content_type, allowedContentTypes)) {
+	if (!_isAllowedType(out.content_type, allowedContentTypes)) {
+		try { await resp.body?.cancel?.(); } catch {/**/}
+		out.status = "skipped";
+		out.skip_reason = "content_type";
+		return out;
+	}
+
+	const cl = resp.headers.get("content-length");
+	if (maxBytes && maxBytes > 0 && cl) {
+		const n = parseInt(cl, 10);
+		if (Number.isFinite(n) && n > maxBytes) {
+			try { await resp.body?.cancel?.(); } catch {/**/}
 			out.status = "skipped";
-			out.skip_reason = "content_type";
+			out.skip_reason = "too_large";
 			return out;
 		}
+	}
 
-		const cl = resp.headers.get("content-length");
-		if (maxBytes && maxBytes > 0 && cl) {
-			const n = parseInt(cl, 10);
-			if (Number.isFinite(n) && n > maxBytes) {
-				out.status = "skipped";
-				out.skip_reason = "too_large";
-				return out;
-			}
-		}
+	// Fast path: tokenize HTML while it downloads; Readability only when its confidence is low.
+	const fastCfg = opts.fastExtract;
+	const isHtml = out.content_type !== "text/plain";
+	let fx = null;
+	let dec = null;
+	if (isHtml && fastCfg?.enabled) {
+		fx = createFastExtractor();
+		dec = new TextDecoder("utf-8");
+	}
+	const onChunk = fx ? (u8) => fx.write(dec.decode(u8, { stream: true })) : null;
+	const sniffBytes = (isHtml && opts.challengeSniffBytes > 0) ? opts.challengeSniffBytes : 0;
 
-		const { buf, downloadedBytes, truncated } = await _readLimitedBody(resp, maxBytes, timeoutMs);
-		out.downloaded_bytes = downloadedBytes;
-		out.truncated = truncated;
+	const { buf, downloadedBytes, truncated, challenge } = await _readLimitedBody(resp, maxBytes, timeoutMs, { onChunk, sniffBytes });
+	out.downloaded_bytes = downloadedBytes;
+	out.truncated = truncated;
 
+	if (challenge) {
+		out.status = "failed";
+		out.skip_reason = "challenge";
+		return out;
+	}
+
+	let fast = null;
+	if (fx) {
+		fx.write(dec.decode());
+		fast = fx.end();
+	}
+
+	let text;
+	const te = Date.now();
+	if (!isHtml) {
+		text = buf.toString("utf8");
+		out.extract_method = "plain";
+	}
+	else if (fast && fast.text && fast.confidence >= (fastCfg.minConfidence ?? 0.6)) {
+		text = fast.text;
+		out.extract_method = "fast";
+	}
+	else {
 		const raw = buf.toString("utf8");
+		// Prefer Mozilla Readability to reduce navigation/menu noise.
+		// Falls back to a deterministic tag-stripper if readability returns nothing.
+		// With an extraction pool (createExtractPool) it runs in a worker thread.
+		const pool = opts.extractPool;
+		const rd = (pool && pool.enabled)
+			? await pool.extract(raw, out.final_url || url)
+			: extractReadable(raw, out.final_url || url);
+		text = rd ? rd : _stripHtml(raw);
+		out.extract_method = rd ? "readability" : "strip_html";
+	}
+	// Fast-path time is mostly spent during the download; count it as extraction.
+	out.extract_ms = (Date.now() - te) + (fast ? Math.round(fast.ms) : 0);
+	if (fast) out.fast_confidence = fast.confidence;
+
+	if (maxExtractChars && maxExtractChars > 0 && text.length > maxExtractChars) {
+		text = text.slice(0, maxExtractChars);
+	}
 
-		let text;
-		if (out.content_type === "text/plain") {
-			text = raw;
-		} else {
-			// Prefer Mozilla Readability to reduce navigation/menu noise.
-			// Falls back to a deterministic tag-stripper if readability returns nothing.
-			const rd = _extractReadable(raw, out.final_url || url);
-			text = rd ? rd : _stripHtml(raw);
+	out.text = text;
+	out.extracted_chars = text.length;
+	out.status = "fetched";
+	out.skip_reason = "";
+	return out;
+}
+
+export async function fetchAndExtract(opts) {
+	// opts: url, headers, allowedContentTypes, maxBytes, maxExtractChars, timeoutMs, maxRedirects, signal,
+	// and optional engine (local | jina | auto), proxySocksUrl, jinaBaseUrl, jinaApiKey, extractPool,
+	// fastExtract, challengeSniffBytes, engineFailures (negative cache for auto),
+	// dispatchers (createDispatcherRegistry).
+	const { url, signal } = opts;
+	const out = _newResult(url);
+
+	try {
+		// Long-lived per-proxy dispatcher: keep-alive connections are reused across pages.
+		const dispatcher = await _dispatchersFor(opts).get(opts.proxySocksUrl);
+		if (dispatcher && dispatcher?.error) {
+			out.status = "failed";
+			out.skip_reason = dispatcher.error;
+			return out;
 		}
 
-		if (maxExtractChars && maxExtractChars > 0 && text.length > maxExtractChars) {
-			text = text.slice(0, maxExtractChars);
+		const engine = (opts.engine || "local").toString().toLowerCase();
+		if (engine === "jina") return await _extractViaJina(url, opts, dispatcher, out);
+		if (engine !== "auto") return await _extractLocal(url, opts, dispatcher, out);
+
+		// auto: local first; hosts where local recently hit a challenge/block go straight to Jina.
+		const t0 = Date.now();
+		const neg = opts.engineFailures;
+		const negKey = neg ? neg.keyFor("local", url) : "";
+		const known = neg ? neg.get(negKey) : null;
+		if (known) {
+			const r = await _extractViaJina(url, opts, dispatcher, out);
+			r.fallback_from = known.reason;
+			return r;
 		}
 
-		out.text = text;
-		out.extracted_chars = text.length;
-		out.status = "fetched";
-		out.skip_reason = "";
-		return out;
+		const local = await _extractLocal(url, opts, dispatcher, out);
+		if (local.status === "fetched" || !_AUTO_FALLBACK_REASONS.has(local.skip_reason) || signal?.aborted) return local;
+		if (neg) neg.set(negKey, local.skip_reason);
+
+		// The retry shares the page's timeout (and so its deadline) with the local attempt.
+		let jinaOpts = opts;
+		if (opts.timeoutMs && opts.timeoutMs > 0) {
+			const leftMs = opts.timeoutMs - (Date.now() - t0);
+			if (leftMs <= 0) return local;
+			jinaOpts = { ...opts, timeoutMs: leftMs };
+		}
+		const r = await _extractViaJina(url, jinaOpts, dispatcher, _newResult(url));
+		r.fallback_from = local.skip_reason;
+		r.downloaded_bytes += local.downloaded_bytes;
+		return r;
 	}
 	catch (e) {
 		const msg = (e?.name === "AbortError") ? "timeout" : "error";
@@ -381,4 +499,4 @@ export async function fetchAndExtract({ url, headers, allowedContentTypes, maxBy
 	}
 }
 
-//<EOF fetch.mjs lines: 384>
+//<EOF fetch.mjs lines: 504>
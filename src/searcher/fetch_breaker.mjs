@@ -0,0 +1,144 @@
+// Fetch failure memory and per-domain circuit breaker (service.fetch.breaker).
+//
+// Every failed network fetch is remembered per engine + normalized URL for
+// failure_ttl_s, so the next search that surfaces the same page skips it
+// without paying timeouts_ms.fetch again. Failures that say something about
+// the host (timeouts, errors, challenges, 401/403/429/451, 5xx) also count
+// towards a per engine + host breaker: after failure_threshold consecutive
+// ones the host is open for open_s, then half-open (one probe fetch at a
+// time) until a fetch succeeds (closed) or fails (open again).
+
+import { normalizeUrl } from "./cache.mjs";
+import { createNegativeCache } from "./negative_cache.mjs";
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+// Configuration problems on our side are not the site's fault.
+const _IGNORED_REASONS = new Set(["", "budget", "deadline", "missing_fetch_socks", "proxy_init_failed"]);
+const _HOST_HTTP = new Set([401, 403, 429, 451]);
+
+function _isHostFailure(reason) {
+	if (reason === "timeout" || reason === "error" || reason === "challenge") return true;
+	const m = /^http_(\d+)$/.exec(reason);
+	if (!m) return false;
+	const code = parseInt(m[1], 10);
+	return code >= 500 || _HOST_HTTP.has(code);
+}
+
+export function createFetchBreaker(cfg) {
+	const enabled = _asBool(cfg?.enabled, true);
+	const threshold = Math.max(1, _asInt(cfg?.failure_threshold, 3));
+	const openS = Math.max(1, _asInt(cfg?.open_s, 300));
+	const maxEntries = Math.max(1, _asInt(cfg?.max_entries, 10000));
+
+	const failures = createNegativeCache({ enabled, ttl_s: _asInt(cfg?.failure_ttl_s, 600), max_entries: maxEntries });
+	// engine:host -> { fails, openUntil, probing }; insertion order is age order.
+	const hosts = new Map();
+
+	const stats = { opened: 0, skipped_open: 0, skipped_failed: 0 };
+
+	function _urlKey(engine, url) {
+		return engine + ":" + (normalizeUrl(url) || url);
+	}
+
+	function _hostKey(engine, url) {
+		try {
+			return engine + ":" + (new URL(url)).hostname.toLowerCase();
+		}
+		catch {/**/}
+		return "";
+	}
+
+	function check(engine, url) {
+		// null = go ahead; otherwise { status, skip_reason } to report without fetching
+		// (remembered pages: "recent_failure", with the failure itself as previous_skip_reason).
+		if (!enabled) return null;
+
+		const known = failures.get(_urlKey(engine, url));
+		if (known) {
+			stats.skipped_failed += 1;
+			return { status: "skipped", skip_reason: "recent_failure", previous_skip_reason: known.reason, remembered: true };
+		}
+
+		const hk = _hostKey(engine, url);
+		const h = hk ? hosts.get(hk) : null;
+		if (!h || !h.openUntil) return null;
+		if (Date.now() < h.openUntil || h.probing) {
+			stats.skipped_open += 1;
+			return { status: "skipped", skip_reason: "circuit_open" };
+		}
+		// Half-open: let one probe through.
+		h.probing = true;
+		return null;
+	}
+
+	function record(engine, url, result) {
+		if (!enabled) return;
+		const hk = _hostKey(engine, url);
+
+		if (result?.status === "fetched") {
+			if (hk) hosts.delete(hk);
+			return;
+		}
+
+		const reason = (result?.skip_reason || "").toString();
+		if (_IGNORED_REASONS.has(reason)) {
+			const h = hk ? hosts.get(hk) : null;
+			if (h) h.probing = false;
+			return;
+		}
+		failures.set(_urlKey(engine, url), reason);
+
+		if (!hk || !_isHostFailure(reason)) return;
+		let h = hosts.get(hk);
+		if (!h) {
+			h = { fails: 0, openUntil: 0, probing: false };
+			hosts.set(hk, h);
+			for (const k of hosts.keys()) {
+				if (hosts.size <= maxEntries) break;
+				hosts.delete(k);
+			}
+		}
+		h.fails += 1;
+		h.probing = false;
+		if (h.fails >= threshold) {
+			if (!h.openUntil || Date.now() >= h.openUntil) stats.opened += 1;
+			h.openUntil = Date.now() + openS * 1000;
+		}
+	}
+
+	function clear() {
+		failures.clear();
+		hosts.clear();
+	}
+
+	return {
+		enabled,
+		check,
+		record,
+		clear,
+		stats: () => {
+			const now = Date.now();
+			let open = 0;
+			for (const h of hosts.values()) {
+				if (h.openUntil && now < h.openUntil) open += 1;
+			}
+			return { ...stats, open, remembered: failures.stats().entries };
+		}
+	};
+}
+
+//<EOF fetch_breaker.mjs lines: 147>
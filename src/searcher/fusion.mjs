@@ -0,0 +1,38 @@
+// Reciprocal-rank fusion of result lists from several backends (backends.strategy=fanout).
+// score(url) = sum over lists of 1 / (k + rank); URLs are deduplicated with
+// normalizeUrl and the best-ranked copy of an item is kept.
+
+import { normalizeUrl } from "./cache.mjs";
+
+export function rrfMerge(lists, { k = 60, limit = 0 } = {}) {
+	const byKey = new Map();
+	let seq = 0;
+	for (const list of lists) {
+		if (!Array.isArray(list)) continue;
+		for (let r = 0; r < list.length; r++) {
+			const it = list[r];
+			const url = (it?.url || "").toString();
+			// Items without a URL (instant answers) cannot collide; keep each one.
+			const key = url ? (normalizeUrl(url) || url) : `#${seq}`;
+			const s = 1 / (k + r + 1);
+			const e = byKey.get(key);
+			if (e) {
+				e.score += s;
+				if (r < e.bestRank) {
+					e.bestRank = r;
+					e.item = it;
+				}
+			}
+			else {
+				byKey.set(key, { item: it, score: s, bestRank: r, seq: seq++ });
+			}
+		}
+	}
+
+	// Ties keep first-seen order (lists are passed in backend priority order).
+	const merged = Array.from(byKey.values()).sort((a, b) => (b.score - a.score) || (a.seq - b.seq));
+	const out = (limit > 0 ? merged.slice(0, limit) : merged).map((e, i) => ({ ...e.item, rank: i + 1 }));
+	return out;
+}
+
+//<EOF fusion.mjs lines: 39>
@@ -0,0 +1,116 @@
+// Minimal Prometheus metrics (text exposition format 0.0.4) for GET /metrics.
+// Histograms and counters with labels; no external client library.
+// Label values with unbounded cardinality (hosts) go through boundedLabel().
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+export const LATENCY_BUCKETS_S = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+export const BYTES_BUCKETS = [1024, 10240, 102400, 524288, 1048576, 2097152, 5242880];
+
+function _escape(v) {
+	return String(v).replace(/\\/g, "\\\\").replace(/\n/g, "\\n").replace(/"/g, "\\\"");
+}
+
+function _labelKey(labelNames, labels) {
+	return JSON.stringify(labelNames.map((n) => String(labels?.[n] ?? "")));
+}
+
+function _labelText(labelNames, values, extra) {
+	const parts = labelNames.map((n, i) => `${n}="${_escape(values[i])}"`);
+	if (extra) parts.push(extra);
+	return parts.length ? `{${parts.join(",")}}` : "";
+}
+
+export function createMetrics(cfg) {
+	const enabled = _asBool(cfg?.enabled, true);
+	const maxHostLabels = Math.max(1, _asInt(cfg?.max_host_labels, 100));
+
+	const families = [];
+	const hosts = new Set();
+
+	function histogram(name, help, labelNames, buckets = LATENCY_BUCKETS_S) {
+		const series = new Map();
+		families.push({ name, help, type: "histogram", labelNames, buckets, series });
+		return {
+			observe(labels, value) {
+				if (!enabled || !Number.isFinite(value)) return;
+				const k = _labelKey(labelNames, labels);
+				let s = series.get(k);
+				if (!s) {
+					s = { values: JSON.parse(k), counts: new Array(buckets.length).fill(0), sum: 0, count: 0 };
+					series.set(k, s);
+				}
+				for (let i = 0; i < buckets.length; i++) {
+					if (value <= buckets[i]) s.counts[i] += 1;
+				}
+				s.sum += value;
+				s.count += 1;
+			}
+		};
+	}
+
+	function counter(name, help, labelNames) {
+		const series = new Map();
+		families.push({ name, help, type: "counter", labelNames, series });
+		return {
+			inc(labels, n = 1) {
+				if (!enabled) return;
+				const k = _labelKey(labelNames, labels);
+				let s = series.get(k);
+				if (!s) {
+					s = { values: JSON.parse(k), value: 0 };
+					series.set(k, s);
+				}
+				s.value += n;
+			}
+		};
+	}
+
+	function boundedLabel(host) {
+		// The first max_host_labels distinct hosts keep their name; the rest share "other".
+		const h = (host || "").toString().toLowerCase();
+		if (!h) return "";
+		if (hosts.has(h)) return h;
+		if (hosts.size >= maxHostLabels) return "other";
+		hosts.add(h);
+		return h;
+	}
+
+	function render() {
+		const out = [];
+		for (const f of families) {
+			out.push(`# HELP ${f.name} ${f.help}`);
+			out.push(`# TYPE ${f.name} ${f.type}`);
+			for (const s of f.series.values()) {
+				if (f.type === "counter") {
+					out.push(`${f.name}${_labelText(f.labelNames, s.values)} ${s.value}`);
+					continue;
+				}
+				for (let i = 0; i < f.buckets.length; i++) {
+					out.push(`${f.name}_bucket${_labelText(f.labelNames, s.values, `le="${f.buckets[i]}"`)} ${s.counts[i]}`);
+				}
+				out.push(`${f.name}_bucket${_labelText(f.labelNames, s.values, "le=\"+Inf\"")} ${s.count}`);
+				out.push(`${f.name}_sum${_labelText(f.labelNames, s.values)} ${s.sum}`);
+				out.push(`${f.name}_count${_labelText(f.labelNames, s.values)} ${s.count}`);
+			}
+		}
+		return out.join("\n") + "\n";
+	}
+
+	return { enabled, histogram, counter, boundedLabel, render };
+}
+
+//<EOF metrics.mjs lines: 119>
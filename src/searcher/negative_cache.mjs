@@ -0,0 +1,79 @@
+// In-memory negative cache of hosts an engine failed on (fetch_engine=auto).
+// Key: engine + ":" + host. A hit means "this engine recently failed here";
+// callers skip straight to the alternative engine until the entry expires.
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+export function createNegativeCache(cfg) {
+	const enabled = _asBool(cfg?.enabled, true);
+	const ttlS = Math.max(1, _asInt(cfg?.ttl_s, 3600));
+	const maxEntries = Math.max(1, _asInt(cfg?.max_entries, 10000));
+
+	// Map iteration order is insertion order (oldest first).
+	const entries = new Map();
+	const stats = { hits: 0, sets: 0 };
+
+	function keyFor(engine, url) {
+		try {
+			return engine + ":" + (new URL(url)).hostname.toLowerCase();
+		}
+		catch {/**/}
+		return "";
+	}
+
+	function get(key) {
+		if (!enabled || !key) return null;
+		const e = entries.get(key);
+		if (!e) return null;
+		if (Date.now() >= e.expiresMs) {
+			entries.delete(key);
+			return null;
+		}
+		stats.hits += 1;
+		return { reason: e.reason, expiresMs: e.expiresMs };
+	}
+
+	function set(key, reason) {
+		if (!enabled || !key) return;
+		entries.delete(key);
+		entries.set(key, { reason: (reason || "").toString(), expiresMs: Date.now() + ttlS * 1000 });
+		stats.sets += 1;
+		for (const k of entries.keys()) {
+			if (entries.size <= maxEntries) break;
+			entries.delete(k);
+		}
+	}
+
+	function remove(key) {
+		return entries.delete(key);
+	}
+
+	function clear() {
+		entries.clear();
+	}
+
+	return {
+		enabled,
+		keyFor,
+		get,
+		set,
+		remove,
+		clear,
+		stats: () => ({ ...stats, entries: entries.size })
+	};
+}
+
+//<EOF negative_cache.mjs lines: 81>
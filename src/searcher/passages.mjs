@@ -0,0 +1,130 @@
+// Passage selection for rendered CONTENT.
+// Long extracted pages are split into paragraph-sized chunks, chunks are scored
+// against the query with BM25, and the best ones are kept (in document order)
+// until the per-item character budget is filled. Text that already fits, or
+// that shares no terms with the query, keeps the old head-of-page behavior.
+
+const K1 = 1.2;
+const B = 0.75;
+const GAP = "\n[...]\n";
+
+const _CJK_RE = /[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]/u;
+
+export function tokenize(text) {
+	const out = [];
+	const words = (text || "").toString().toLowerCase().match(/[\p{L}\p{N}]+/gu) || [];
+	for (const w of words) {
+		if (_CJK_RE.test(w)) {
+			// No word boundaries in CJK: index single characters.
+			for (const ch of w) out.push(ch);
+		}
+		else if (w.length > 1 || /\d/.test(w)) {
+			out.push(w);
+		}
+	}
+	return out;
+}
+
+function _splitLong(p, chunkChars) {
+	if (p.length <= chunkChars) return [p];
+	const out = [];
+	let cur = "";
+	for (const s of p.split(/(?<=[.!?。！？])\s+/u)) {
+		if (cur && (cur.length + 1 + s.length) > chunkChars) {
+			out.push(cur);
+			cur = "";
+		}
+		cur = cur ? `${cur} ${s}` : s;
+		while (cur.length > chunkChars) {
+			out.push(cur.slice(0, chunkChars));
+			cur = cur.slice(chunkChars);
+		}
+	}
+	if (cur) out.push(cur);
+	return out;
+}
+
+export function chunkText(text, chunkChars) {
+	// Paragraphs (blank-line separated) merged up to chunkChars; long ones split by sentence.
+	const chunks = [];
+	let cur = "";
+	for (const raw of (text || "").toString().split(/\n\s*\n/)) {
+		const p = raw.trim();
+		if (!p) continue;
+		for (const part of _splitLong(p, chunkChars)) {
+			if (cur && (cur.length + 2 + part.length) > chunkChars) {
+				chunks.push(cur);
+				cur = "";
+			}
+			cur = cur ? `${cur}\n\n${part}` : part;
+		}
+	}
+	if (cur) chunks.push(cur);
+	return chunks;
+}
+
+function _bm25Scores(chunks, query) {
+	const qTerms = [...new Set(tokenize(query))];
+	const docs = chunks.map((c) => tokenize(c));
+	const n = docs.length;
+	const avgLen = (docs.reduce((a, d) => a + d.length, 0) / n) || 1;
+
+	const df = new Map();
+	for (const d of docs) {
+		for (const t of new Set(d)) df.set(t, (df.get(t) || 0) + 1);
+	}
+
+	return docs.map((d) => {
+		const tf = new Map();
+		for (const t of d) tf.set(t, (tf.get(t) || 0) + 1);
+		const norm = K1 * (1 - B + B * (d.length / avgLen));
+		let s = 0;
+		for (const t of qTerms) {
+			const f = tf.get(t) || 0;
+			if (!f) continue;
+			const dft = df.get(t) || 0;
+			const idf = Math.log(1 + (n - dft + 0.5) / (dft + 0.5));
+			s += idf * (f * (K1 + 1)) / (f + norm);
+		}
+		return s;
+	});
+}
+
+export function selectPassages({ text, query, maxChars, chunkChars }) {
+	const t = (text || "").toString();
+	const lim = parseInt(maxChars, 10) || 0;
+	if (!lim || lim <= 0 || t.length <= lim) return t;
+
+	const size = Math.max(100, Math.min(parseInt(chunkChars, 10) || 600, lim));
+	const chunks = chunkText(t, size);
+	if (chunks.length < 2) return t.slice(0, lim);
+
+	const scores = _bm25Scores(chunks, query);
+	if (!scores.some((s) => s > 0)) return t.slice(0, lim);
+
+	// Best first; ties go to the earlier chunk (page lead usually carries context).
+	const order = chunks.map((_, i) => i).sort((a, b) => (scores[b] - scores[a]) || (a - b));
+
+	const chosen = new Set();
+	let used = 0;
+	for (const i of order) {
+		if (scores[i] <= 0 && chosen.size > 0) break;
+		const cost = chunks[i].length + (chosen.size > 0 ? GAP.length : 0);
+		if (used + cost > lim) continue;
+		chosen.add(i);
+		used += cost;
+	}
+	if (chosen.size === 0) return chunks[order[0]].slice(0, lim);
+
+	const out = [];
+	let prev = -1;
+	for (let i = 0; i < chunks.length; i++) {
+		if (!chosen.has(i)) continue;
+		if (out.length > 0) out.push(i === prev + 1 ? "\n\n" : GAP);
+		out.push(chunks[i]);
+		prev = i;
+	}
+	return out.join("");
+}
+
+//<EOF passages.mjs lines: 131>
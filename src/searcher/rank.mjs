@@ -0,0 +1,188 @@
+// Server-side LLM snippet ranking (OpenAI-compatible /chat/completions).
+// Mirrors _call_openai_snippet_rank() in the WebUI plugin so that full mode
+// can rank, fetch and render in a single /v1/search exchange.
+
+function _todayIsoDate() {
+	try {
+		return new Date().toISOString().slice(0, 10);
+	}
+	catch {/**/}
+	return "";
+}
+
+function _buildSystemPrompt(wantN) {
+	const today = _todayIsoDate();
+	return (
+		(today ? `Current date: ${today}.\n` : "") +
+		"Ranking policy for time relevance:\n" +
+		"- If the question requires present-time relevance, prioritize candidates whose title or snippet contains explicit dates or years closest to the Current date.\n" +
+		"- Prefer candidates explicitly mentioning the Current year.\n" +
+		"- Deprioritize candidates that clearly refer to an earlier period (e.g. year ranges ending before the Current date, or terms like former, previous, ex-).\n" +
+		"- If a source explicitly states it is archived, frozen in time, not updated, or deprecated, deprioritize it for present-time or \"current/latest\" questions.\n" +
+		"- If candidates contradict each other about a present-time fact, prefer those consistent with the most recent, explicitly time-anchored information closest to the Current date.\n" +
+		"Ranking policy for source authority:\n" +
+		"- Prefer original, official, or primary sources (e.g. government websites, official vendor or project pages) over secondary summaries, biography pages, SEO articles, or mirrors.\n" +
+		"Ranking policy for language:\n" +
+		"- Prefer sources in the same language as the question and English.\n" +
+		"- If the question is not in Chinese, deprioritize Chinese-language sources unless there are no reasonable alternatives.\n" +
+		"You are ranking web search results by relevance to a user question. " +
+		"Return ONLY valid JSON prefixed with 'JSON: ' like: JSON: {\"pick\":[...]}. " +
+		"Indices must be distinct. " +
+		`Pick exactly ${wantN} indices (or fewer if fewer candidates are available). ` +
+		"No extra text."
+	);
+}
+
+function _buildUserPrompt(question, candidates) {
+	const lines = [];
+	lines.push(`Question: ${question}`);
+	lines.push("");
+	lines.push("Candidates:");
+	for (const c of candidates) {
+		const title = (c.title || "").toString().trim();
+		const snippet = (c.snippet || "").toString().trim();
+		const url = (c.url || "").toString().trim();
+		lines.push(`${c.i}) ${title} — ${snippet} (URL: ${url})`);
+	}
+	lines.push("");
+	lines.push("Return JSON only.");
+	return lines.join("\n");
+}
+
+function _stripReasoningTag(content) {
+	const s = (content || "").toString().trim();
+	const m = s.match(/^\s*<([a-zA-Z0-9_:-]+)>/);
+	if (!m) return s;
+	const closeTag = `</${m[1]}>`.toLowerCase();
+	const pos = s.toLowerCase().indexOf(closeTag);
+	if (pos === -1) return s;
+	return s.slice(pos + closeTag.length).trim();
+}
+
+export function extractJsonValue(text) {
+	// Best-effort extraction of a JSON value (object or array) from arbitrary text.
+	const s = (text || "").toString().trim();
+	if (!s) return "";
+	if ((s.startsWith("{") && s.endsWith("}")) || (s.startsWith("[") && s.endsWith("]"))) return s;
+	let a = s.indexOf("{");
+	let b = s.lastIndexOf("}");
+	if (a !== -1 && b !== -1 && b > a) return s.slice(a, b + 1).trim();
+	a = s.indexOf("[");
+	b = s.lastIndexOf("]");
+	if (a !== -1 && b !== -1 && b > a) return s.slice(a, b + 1).trim();
+	return "";
+}
+
+function _extractJsonAfterAnchor(raw, anchor) {
+	const low = (anchor || "").toLowerCase();
+	if (!low) return "";
+	for (const ln of (raw || "").toString().replace(/\r/g, "\n").split("\n")) {
+		const t = (ln || "").trim();
+		if (!t) continue;
+		if (t.toLowerCase().startsWith(low)) {
+			return extractJsonValue(t.slice(anchor.length).trim());
+		}
+	}
+	return "";
+}
+
+export function parsePickList(obj, n, wantN) {
+	// Accept both {"pick":[...]} and a bare array; keep distinct in-range ints, capped to wantN.
+	let pick = null;
+	if (Array.isArray(obj)) pick = obj;
+	else if (obj && typeof obj === "object" && Array.isArray(obj.pick)) pick = obj.pick;
+	if (!pick) return [];
+
+	const seen = new Set();
+	const out = [];
+	for (const v of pick) {
+		const iv = parseInt(v, 10);
+		if (!Number.isFinite(iv)) continue;
+		if (iv < 0 || iv >= n) continue;
+		if (seen.has(iv)) continue;
+		seen.add(iv);
+		out.push(iv);
+		if (wantN && out.length >= wantN) break;
+	}
+	return out;
+}
+
+export function parseRankContent(content, n, wantN) {
+	const s = _stripReasoningTag(content);
+	// Prefer anchored JSON to avoid grabbing braces from stray reasoning text.
+	let jtxt = _extractJsonAfterAnchor(s, "JSON:");
+	if (!jtxt) jtxt = extractJsonValue(s);
+	if (!jtxt) return [];
+
+	let obj;
+	try {
+		obj = JSON.parse(jtxt);
+	}
+	catch {/**/}
+	return parsePickList(obj, n, wantN);
+}
+
+export function buildRankCandidates(items, topK) {
+	const out = [];
+	const k = Math.max(0, topK || 0);
+	for (let i = 0; i < items.length && i < k; i++) {
+		const it = items[i] || {};
+		out.push({
+			i,
+			title: (it.title || "").toString(),
+			snippet: (it.snippet || "").toString(),
+			url: (it.url || "").toString()
+		});
+	}
+	return out;
+}
+
+export async function llmSnippetRank({ apiBase, model, question, candidates, wantN, timeoutMs, maxTokens }) {
+	const base = (apiBase || "").toString().trim().replace(/\/+$/, "");
+	if (!base) throw new Error("Ranker api_base is empty");
+
+	const payload = {
+		messages: [
+			{ role: "system", content: _buildSystemPrompt(wantN) },
+			{ role: "user", content: _buildUserPrompt(question, candidates) },
+			{ role: "assistant", content: "JSON: " }
+		],
+		temperature: 0.1,
+		max_tokens: maxTokens || 512
+	};
+	if (model) payload.model = model;
+
+	const ac = new AbortController();
+	const t = setTimeout(() => ac.abort(), Math.max(1, timeoutMs || 30000));
+
+	let json;
+	try {
+		const res = await fetch(base + "/chat/completions", {
+			method: "POST",
+			signal: ac.signal,
+			headers: {
+				"content-type": "application/json",
+				"accept": "application/json"
+			},
+			body: JSON.stringify(payload)
+		});
+
+		if (!res.ok) {
+			throw new Error(`Ranker HTTP ${res.status}`);
+		}
+
+		json = await res.json();
+	}
+	catch (e) {
+		throw new Error(`Ranker request failed: ${e?.message || String(e)}`);
+	}
+	finally {
+		clearTimeout(t);
+	}
+
+	const content = json?.choices?.[0]?.message?.content;
+	if (typeof content !== "string") return [];
+	return parseRankContent(content, candidates.length, wantN);
+}
+
+//<EOF rank.mjs lines: 188>
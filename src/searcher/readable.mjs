@@ -0,0 +1,25 @@
+// Readability extraction (JSDOM + @mozilla/readability).
+// Shared by fetch.mjs (inline, when the extraction pool is disabled) and
+// extract_worker.mjs (inside worker threads).
+
+import { JSDOM } from "jsdom";
+import { Readability } from "@mozilla/readability";
+
+export function extractReadable(html, baseUrl) {
+	let dom = null;
+	try {
+		dom = new JSDOM((html || "").toString(), { url: baseUrl || "https://local/" });
+		const reader = new Readability(dom.window.document);
+		const out = reader.parse();
+		const text = (out?.textContent || "").toString().trim();
+		return text || null;
+	}
+	catch {/**/}
+	finally {
+		// Release the window (timers, listeners) right away instead of waiting for GC.
+		try { dom?.window?.close(); } catch {/**/}
+	}
+	return null;
+}
+
+//<EOF readable.mjs lines: 25>
@@ -1,3 +1,49 @@
+import { chunkText, selectPassages } from "./passages.mjs";
+import { estimateTokens } from "./tokens.mjs";
+
+function _packTokens(head, blocks, tail, maxTokens) {
+	// Greedy, in rank order: keep whole item blocks that fit; an item whose
+	// CONTENT does not fit keeps its leading content chunks that still fit.
+	let used = estimateTokens(head.join("\n")) + estimateTokens(tail.join("\n"));
+	const out = [...head];
+	for (const b of blocks) {
+		const full = b.lines.join("\n");
+		const cost = estimateTokens(full);
+		if (used + cost <= maxTokens) {
+			out.push(...b.lines);
+			used += cost;
+			continue;
+		}
+		if (!b.content) continue;
+
+		const meta = b.lines.slice(0, b.contentAt);
+		let partCost = estimateTokens(meta.join("\n"));
+		if (used + partCost > maxTokens) continue;
+		const kept = [];
+		for (const ch of chunkText(b.content, 400)) {
+			const c = estimateTokens(ch);
+			if (used + partCost + c > maxTokens) break;
+			kept.push(ch);
+			partCost += c;
+		}
+		if (kept.length === 0) continue;
+		out.push(...meta, kept.join("\n\n"));
+		used += partCost;
+	}
+	out.push(...tail);
+	return out;
+}
+
+export function renderItemContent({ text, maxChars, query, passages }) {
+	// CONTENT text of one fetched item: within maxChars, best passages when enabled.
+	const c = (text || "").toString();
+	const lim = maxChars ? parseInt(maxChars, 10) : 0;
+	if (!lim || lim <= 0 || c.length <= lim) return c;
+	return passages?.enabled
+		? selectPassages({ text: c, query, maxChars: lim, chunkChars: passages.chunkChars })
+		: c.slice(0, lim);
+}
+
 function trimSnippet(s, maxChars) {
 	const t = (s || "").toString();
 	if (!maxChars || maxChars <= 0) return t;
@@ -5,7 +51,7 @@ function trimSnippet(s, maxChars) {
 	return t.slice(0, maxChars);
 }
 
-export function renderContextPack({ items, maxContextChars, maxSnippetChars, maxContentCharsPerItem }) {
+export function renderContextPack({ items, maxContextChars, maxSnippetChars, maxContentCharsPerItem, query, passages, maxContextTokens }) {
 	const out = [];
 	out.push("[CONTEXT_PACK ucp-1]");
 	out.push("type: web_search_results");
@@ -19,10 +65,13 @@ export function renderContextPack({ items, maxContextChars, maxSnippetChars, max
 		return out.join("\n");
 	}
 
+	const blocks = [];
 	for (let i = 0; i < items.length; i++) {
 		const it = items[i];
-		out.push("");
-		out.push(`#${it.rank} ${it.title}`);
+		const block = [];
+		blocks.push({ lines: block, content: "", contentAt: -1 });
+		block.push("");
+		block.push(`#${it.rank} ${it.title}`);
 		const eng = Array.isArray(it.engines) && it.engines.length > 0
 			? it.engines.join(",")
 			: "";
@@ -30,29 +79,32 @@ export function renderContextPack({ items, maxContextChars, maxSnippetChars, max
 		const dom = (it.domain || "").toString();
 
 		if (eng || dom) {
-			out.push(`[${eng || "-"} | ${dom || "-"}]`);
+			block.push(`[${eng || "-"} | ${dom || "-"}]`);
 		}
 
-		out.push(it.url);
+		block.push(it.url);
 
 		const sn = trimSnippet(it.snippet, maxSnippetChars);
-		if (sn) out.push(sn);
+		if (sn) block.push(sn);
 
 		const ft = (it?.fetch?.text || "").toString();
 		if (ft && (it?.fetch?.status === "fetched")) {
-			let c = ft;
-			const lim = maxContentCharsPerItem ? parseInt(maxContentCharsPerItem, 10) : 0;
-			if (lim && lim > 0 && c.length > lim) c = c.slice(0, lim);
-			out.push("");
-			out.push("CONTENT:");
-			out.push(c);
+			const c = renderItemContent({ text: ft, maxChars: maxContentCharsPerItem, query, passages });
+			block.push("");
+			block.push("CONTENT:");
+			blocks[i].contentAt = block.length;
+			blocks[i].content = c;
+			block.push(c);
 		}
 	}
 
-	out.push("");
-	out.push("[/CONTEXT_PACK]");
+	const tail = ["", "[/CONTEXT_PACK]"];
+	const tokenLimit = parseInt(maxContextTokens, 10) || 0;
+	const packed = (tokenLimit > 0)
+		? _packTokens(out, blocks, tail, tokenLimit)
+		: [...out, ...blocks.flatMap((b) => b.lines), ...tail];
 
-	let txt = out.join("\n");
+	let txt = packed.join("\n");
 
 	if (maxContextChars && maxContextChars > 0 && txt.length > maxContextChars) {
 		// Детерминированная обрезка: сначала удаляем хвостовые элементы целиком.
@@ -91,4 +143,4 @@ export function renderContextPack({ items, maxContextChars, maxSnippetChars, max
 	return txt;
 }
 
-//<EOF render.mjs lines: 94>
+//<EOF render.mjs lines: 143>
@@ -0,0 +1,220 @@
+// Local retrieval index over the extracted-text cache (/v1/retrieve).
+// Every cached page is split into chunks (passages.mjs) and kept in an
+// in-memory inverted index: term -> chunk id -> term frequency. The cache
+// calls add() on put and remove() when an entry expires or is evicted, so
+// the index follows the cache without rescans. Queries are scored with BM25.
+
+import { chunkText, tokenize } from "./passages.mjs";
+import { renderContextPack } from "./render.mjs";
+import { buildUcpResponse } from "./ucp.mjs";
+
+const K1 = 1.2;
+const B = 0.75;
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+export function createRetrievalIndex(cfg, { ttlS = 0 } = {}) {
+	const enabled = _asBool(cfg?.enabled, true);
+	const chunkChars = Math.max(100, _asInt(cfg?.chunk_chars, 600));
+	const maxChunks = Math.max(1, _asInt(cfg?.max_chunks, 50000));
+
+	// docs: cache key -> { url, title, createdMs, chunkIds }, oldest first.
+	const docs = new Map();
+	// chunks: id -> { key, pos, text, len, terms }
+	const chunks = new Map();
+	const postings = new Map();
+	let totalLen = 0;
+	let nextId = 1;
+
+	const stats = { queries: 0, added: 0, removed: 0 };
+
+	function _isExpired(createdMs) {
+		if (!ttlS || ttlS <= 0) return false;
+		return (Date.now() - createdMs) > ttlS * 1000;
+	}
+
+	function remove(key) {
+		const d = docs.get(key);
+		if (!d) return false;
+		docs.delete(key);
+		for (const id of d.chunkIds) {
+			const c = chunks.get(id);
+			if (!c) continue;
+			chunks.delete(id);
+			totalLen -= c.len;
+			for (const t of c.terms) {
+				const p = postings.get(t);
+				if (!p) continue;
+				p.delete(id);
+				if (p.size === 0) postings.delete(t);
+			}
+		}
+		stats.removed += 1;
+		return true;
+	}
+
+	function add(key, { url, title, text, createdMs }) {
+		if (!enabled) return 0;
+		remove(key);
+
+		const body = (text || "").toString();
+		if (!body) return 0;
+
+		const d = { url: (url || "").toString(), title: (title || "").toString(), createdMs: createdMs || Date.now(), chunkIds: [] };
+		const parts = chunkText(body, chunkChars);
+		for (let pos = 0; pos < parts.length; pos++) {
+			// The title is indexed with every chunk: it often carries the topic words.
+			const toks = tokenize(d.title + " " + parts[pos]);
+			const tf = new Map();
+			for (const t of toks) tf.set(t, (tf.get(t) || 0) + 1);
+
+			const id = nextId++;
+			chunks.set(id, { key, pos, text: parts[pos], len: toks.length, terms: Array.from(tf.keys()) });
+			totalLen += toks.length;
+			for (const [t, f] of tf) {
+				let p = postings.get(t);
+				if (!p) {
+					p = new Map();
+					postings.set(t, p);
+				}
+				p.set(id, f);
+			}
+			d.chunkIds.push(id);
+		}
+		docs.set(key, d);
+		stats.added += 1;
+
+		// Bound memory: drop the oldest pages first.
+		for (const k of docs.keys()) {
+			if (chunks.size <= maxChunks) break;
+			remove(k);
+		}
+		return d.chunkIds.length;
+	}
+
+	function search(query, { topK = 5, maxPerDoc = 3 } = {}) {
+		// Returns pages ordered by their best chunk; each page keeps its best chunks in page order.
+		if (!enabled) return [];
+		stats.queries += 1;
+
+		const qTerms = [...new Set(tokenize(query))];
+		const n = chunks.size;
+		if (n === 0 || qTerms.length === 0) return [];
+		const avgLen = (totalLen / n) || 1;
+
+		const scores = new Map();
+		for (const t of qTerms) {
+			const p = postings.get(t);
+			if (!p) continue;
+			const idf = Math.log(1 + (n - p.size + 0.5) / (p.size + 0.5));
+			for (const [id, f] of p) {
+				const c = chunks.get(id);
+				const norm = K1 * (1 - B + B * (c.len / avgLen));
+				scores.set(id, (scores.get(id) || 0) + idf * (f * (K1 + 1)) / (f + norm));
+			}
+		}
+
+		const ranked = Array.from(scores.entries()).sort((a, b) => (b[1] - a[1]) || (a[0] - b[0]));
+
+		const byDoc = new Map();
+		const expired = [];
+		for (const [id, score] of ranked) {
+			const c = chunks.get(id);
+			const d = docs.get(c.key);
+			if (!d) continue;
+			if (_isExpired(d.createdMs)) {
+				expired.push(c.key);
+				continue;
+			}
+			let hit = byDoc.get(c.key);
+			if (!hit) {
+				if (byDoc.size >= topK) continue;
+				hit = { key: c.key, url: d.url, title: d.title, createdMs: d.createdMs, score, chunks: [] };
+				byDoc.set(c.key, hit);
+			}
+			if (hit.chunks.length < maxPerDoc) hit.chunks.push({ pos: c.pos, text: c.text, score });
+		}
+		// TTL is normally enforced by cache sweeps; drop anything they have not reached yet.
+		for (const k of expired) remove(k);
+
+		const out = Array.from(byDoc.values());
+		for (const h of out) h.chunks.sort((a, b) => a.pos - b.pos);
+		return out;
+	}
+
+	function clear() {
+		docs.clear();
+		chunks.clear();
+		postings.clear();
+		totalLen = 0;
+	}
+
+	return {
+		enabled,
+		add,
+		remove,
+		search,
+		clear,
+		stats: () => ({ ...stats, pages: docs.size, chunks: chunks.size, terms: postings.size })
+	};
+}
+
+export function buildRetrieveResponse(index, body, { query, topK, maxPerDoc, wantItems, wantRendered, maxContextChars, maxContentCharsPerItem, maxContextTokens, note = null }) {
+	// /v1/retrieve response; shared by app.mjs and anything that serves the index directly.
+	const t0 = Date.now();
+	const hits = query ? index.search(query, { topK, maxPerDoc }) : [];
+	const items = hits.map((h, i) => {
+		let host = "";
+		try { host = new URL(h.url).hostname; } catch {/**/}
+		// Adjacent chunks join as paragraphs; gaps are marked like passage selection does.
+		let text = "";
+		let prev = -2;
+		for (const c of h.chunks) {
+			text += text ? (c.pos === prev + 1 ? "\n\n" : "\n[...]\n") : "";
+			text += c.text;
+			prev = c.pos;
+		}
+		return {
+			rank: i + 1,
+			title: h.title || h.url,
+			url: h.url,
+			snippet: "",
+			domain: host,
+			engines: ["cache"],
+			score: Math.round(h.score * 1000) / 1000,
+			fetch: { status: "fetched", source: "cache", text, created_utc: new Date(h.createdMs).toISOString() }
+		};
+	});
+	const retrieveMs = Date.now() - t0;
+
+	const response = buildUcpResponse({
+		request: body,
+		items: wantItems ? items : [],
+		backendUsed: "cache",
+		modeUsed: "cache",
+		renderedText: wantRendered
+			? renderContextPack({ items, maxContextChars, maxSnippetChars: 0, maxContentCharsPerItem, maxContextTokens })
+			: null,
+		timingMs: { search: retrieveMs, fetch: 0, total: Date.now() - t0 },
+		note
+	});
+	// Hits found, not items echoed back: rendered_text-only callers need to tell hits from an empty pack.
+	response.usage.results_returned = items.length;
+	response.usage.retrieval = index.stats();
+	return response;
+}
+
+//<EOF retrieval.mjs lines: 221>
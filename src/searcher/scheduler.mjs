@@ -0,0 +1,121 @@
+// Bounded-concurrency fetch scheduler for full mode.
+//
+// Items are started in list order (skipping ahead only when a host is at its
+// per-host limit) and never more than budget + speculativeExtra are in flight
+// or done. With speculativeExtra = 0 the set of attempted items is the same
+// as in the old sequential loop: a new item starts only to replace a failure.
+// Once the budget is met, outstanding tasks are aborted via their signal and
+// reported as cancelled even if they finish anyway, so at most budget results
+// are ok however large speculativeExtra is. onResult(i, value) (optional) is
+// called only for results that count (not cancelled), in completion order.
+// A run() that rejects is a failed item: { ok: false, error }.
+// deadlineAt (epoch ms, optional) does the same when the request runs out of time,
+// and signal (optional) when the caller gives up (client disconnected).
+
+function _asPositiveInt(v, dflt) {
+	const n = parseInt(v, 10);
+	return (Number.isFinite(n) && n > 0) ? n : dflt;
+}
+
+export async function scheduleFetches({ hostKeys, budget, concurrency, perHostConcurrency, speculativeExtra, run, onResult, deadlineAt, signal }) {
+	const n = Array.isArray(hostKeys) ? hostKeys.length : 0;
+	const results = new Array(n).fill(null);
+	if (n === 0 || !budget || budget <= 0) return results;
+
+	const maxActive = _asPositiveInt(concurrency, 4);
+	const maxPerHost = _asPositiveInt(perHostConcurrency, 2);
+	const extra = Math.max(0, parseInt(speculativeExtra, 10) || 0);
+
+	const pending = [];
+	for (let i = 0; i < n; i++) pending.push(i);
+
+	const controllers = new Map();
+	const hostActive = new Map();
+	let inflight = 0;
+	let succeeded = 0;
+
+	return await new Promise((resolve) => {
+		let timer = null;
+		let done = false;
+
+		function _finish() {
+			if (done) return;
+			done = true;
+			if (timer) clearTimeout(timer);
+			if (signal) signal.removeEventListener("abort", _pump);
+			resolve(results);
+		}
+
+		function _abortAll() {
+			for (const ac of controllers.values()) {
+				try { ac.abort(); } catch {/**/}
+			}
+		}
+
+		function _pickNext() {
+			for (let k = 0; k < pending.length; k++) {
+				const h = hostKeys[pending[k]] || "";
+				if ((hostActive.get(h) || 0) < maxPerHost) {
+					return pending.splice(k, 1)[0];
+				}
+			}
+			return -1;
+		}
+
+		function _start(i) {
+			const h = hostKeys[i] || "";
+			const ac = new AbortController();
+			controllers.set(i, ac);
+			hostActive.set(h, (hostActive.get(h) || 0) + 1);
+			inflight += 1;
+
+			const t0 = Date.now();
+			Promise.resolve()
+				.then(() => run(i, ac.signal))
+				.then((value) => ({ ok: !!value?.ok, value }), (error) => ({ ok: false, value: null, error }))
+				.then((r) => {
+					inflight -= 1;
+					hostActive.set(h, (hostActive.get(h) || 1) - 1);
+					controllers.delete(i);
+
+					const ms = Date.now() - t0;
+					if (ac.signal.aborted) {
+						results[i] = { cancelled: true, ok: false, value: null, ms };
+					}
+					else {
+						results[i] = { cancelled: false, ok: r.ok, value: r.value, ms };
+						if (r.error) results[i].error = r.error;
+						if (r.ok) succeeded += 1;
+						if (onResult) {
+							try { onResult(i, r.value); } catch {/**/}
+						}
+					}
+					_pump();
+				});
+		}
+
+		function _pump() {
+			if (succeeded >= budget || (deadlineAt && Date.now() >= deadlineAt) || signal?.aborted) {
+				_abortAll();
+				if (inflight === 0) _finish();
+				return;
+			}
+
+			while (inflight < maxActive && (succeeded + inflight) < (budget + extra)) {
+				const i = _pickNext();
+				if (i < 0) break;
+				_start(i);
+			}
+
+			if (inflight === 0) _finish();
+		}
+
+		if (deadlineAt) {
+			timer = setTimeout(_pump, Math.max(0, deadlineAt - Date.now()));
+		}
+		if (signal) signal.addEventListener("abort", _pump);
+		_pump();
+	});
+}
+
+//<EOF scheduler.mjs lines: 122>
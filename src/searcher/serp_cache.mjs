@@ -0,0 +1,109 @@
+// In-memory search-results (SERP) cache.
+// Key: normalized query text + effective backend order + max_results.
+// Entries are fresh for ttl_s, then served stale for up to stale_s more while
+// the caller revalidates them in the background (stale-while-revalidate).
+
+function _asBool(v, dflt) {
+	if (v === true) return true;
+	if (v === false) return false;
+	return dflt;
+}
+
+function _asInt(v, dflt) {
+	try {
+		const n = parseInt(v, 10);
+		return Number.isFinite(n) ? n : dflt;
+	}
+	catch {/**/}
+	return dflt;
+}
+
+export function normalizeQuery(q) {
+	return (q || "").toString().normalize("NFKC").replace(/\s+/g, " ").trim().toLowerCase();
+}
+
+export function createSerpCache(cfg) {
+	const enabled = _asBool(cfg?.enabled, true);
+	const ttlS = Math.max(0, _asInt(cfg?.ttl_s, 300));
+	const staleS = Math.max(0, _asInt(cfg?.stale_s, 600));
+	const maxEntries = Math.max(1, _asInt(cfg?.max_entries, 1000));
+
+	// Map iteration order is the LRU order (oldest first).
+	const entries = new Map();
+	const revalidating = new Set();
+
+	const stats = { hits: 0, stale: 0, misses: 0 };
+
+	function keyFor({ query, order, maxResults }) {
+		const o = Array.isArray(order) ? order.join(",") : "";
+		return JSON.stringify([normalizeQuery(query), o, maxResults || 0]);
+	}
+
+	function get(key) {
+		if (!enabled) return null;
+		const e = entries.get(key);
+		if (!e) {
+			stats.misses += 1;
+			return null;
+		}
+
+		const ageMs = Date.now() - e.storedMs;
+		if (ageMs > (ttlS + staleS) * 1000) {
+			entries.delete(key);
+			stats.misses += 1;
+			return null;
+		}
+
+		entries.delete(key);
+		entries.set(key, e);
+
+		const state = ageMs > ttlS * 1000 ? "stale" : "fresh";
+		if (state === "stale") stats.stale += 1;
+		else stats.hits += 1;
+
+		// Callers mutate items (snippet trim, fetch results): hand out a copy.
+		return { state, value: structuredClone(e.value) };
+	}
+
+	function put(key, value) {
+		if (!enabled) return;
+		entries.delete(key);
+		entries.set(key, { value: structuredClone(value), storedMs: Date.now() });
+		for (const k of entries.keys()) {
+			if (entries.size <= maxEntries) break;
+			entries.delete(k);
+		}
+	}
+
+	function revalidate(key, run) {
+		// At most one background refresh per key; failures keep the stale entry.
+		if (!enabled || revalidating.has(key)) return;
+		revalidating.add(key);
+		Promise.resolve()
+			.then(run)
+			.then((value) => {
+				if (value) put(key, value);
+			}, () => {})
+			.finally(() => {
+				revalidating.delete(key);
+			});
+	}
+
+	function clear() {
+		entries.clear();
+	}
+
+	return {
+		enabled,
+		ttl_s: ttlS,
+		stale_s: staleS,
+		keyFor,
+		get,
+		put,
+		revalidate,
+		clear,
+		stats: () => ({ ...stats, entries: entries.size })
+	};
+}
+
+//<EOF serp_cache.mjs lines: 113>
@@ -0,0 +1,90 @@
+// Single-flight request coalescing.
+// Concurrent callers with the same key share one in-flight call of fn.
+// fn receives a shared AbortSignal that fires only when every caller has
+// given up (its own signal aborted), so one cancelled request never cancels
+// the work another request is still waiting for. A flight aborted that way
+// is never joined again: the next caller starts a fresh one.
+
+function _abortError() {
+	const e = new Error("aborted");
+	e.name = "AbortError";
+	return e;
+}
+
+export function createSingleFlight() {
+	const flights = new Map();
+	const stats = { leaders: 0, joined: 0 };
+
+	function _waitFor(flight, signal) {
+		if (!signal) return flight.promise;
+		if (signal.aborted) {
+			_leave(flight);
+			return Promise.reject(_abortError());
+		}
+		return new Promise((resolve, reject) => {
+			const onAbort = () => {
+				_leave(flight);
+				reject(_abortError());
+			};
+			signal.addEventListener("abort", onAbort, { once: true });
+			flight.promise.then(
+				(v) => {
+					signal.removeEventListener("abort", onAbort);
+					resolve(v);
+				},
+				(e) => {
+					signal.removeEventListener("abort", onAbort);
+					reject(e);
+				}
+			);
+		});
+	}
+
+	function _leave(flight) {
+		flight.waiters -= 1;
+		if (flight.waiters <= 0) {
+			try { flight.ac.abort(); } catch {/**/}
+		}
+	}
+
+	async function run(key, fn, signal) {
+		let flight = flights.get(key);
+		let joined = true;
+
+		// Every waiter left and fn is only winding down: its result would be a cancellation.
+		if (flight && flight.ac.signal.aborted) {
+			flights.delete(key);
+			flight = null;
+		}
+
+		if (!flight) {
+			joined = false;
+			const ac = new AbortController();
+			flight = { ac, waiters: 0, promise: null };
+			flight.promise = Promise.resolve()
+				.then(() => fn(ac.signal))
+				.finally(() => {
+					if (flights.get(key) === flight) flights.delete(key);
+				});
+			// Avoid unhandled rejections when every waiter has already left.
+			flight.promise.catch(() => {});
+			flights.set(key, flight);
+			stats.leaders += 1;
+		}
+		else {
+			stats.joined += 1;
+		}
+
+		flight.waiters += 1;
+		const value = await _waitFor(flight, signal);
+		return { value, joined };
+	}
+
+	return {
+		run,
+		inflight: () => flights.size,
+		stats: () => ({ ...stats, inflight: flights.size })
+	};
+}
+
+//<EOF singleflight.mjs lines: 91>
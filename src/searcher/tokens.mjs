@@ -0,0 +1,33 @@
+// Token estimate for budget packing (budget.max_context_tokens).
+// The searcher has no model tokenizer, so counts are a per-script estimate:
+// CJK ~1 token/char, Cyrillic/Greek/Arabic ~1 token per 2.5 chars, the rest
+// ~1 token per 4 chars. The WebUI plugin re-fits the pack with the real
+// tokenizer; this only has to be close enough not to over-fetch/over-render.
+
+const _CJK_RE = /[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]/gu;
+const _WIDE_RE = /[\u0370-\u03ff\u0400-\u04ff\u0590-\u06ff]/gu;
+
+const MEMO_MAX = 2048;
+const memo = new Map();
+
+function _count(text) {
+	const cjk = (text.match(_CJK_RE) || []).length;
+	const wide = (text.match(_WIDE_RE) || []).length;
+	const rest = Math.max(0, text.length - cjk - wide);
+	return cjk + Math.ceil(wide / 2.5) + Math.ceil(rest / 4);
+}
+
+export function estimateTokens(s) {
+	const text = (s || "").toString();
+	if (text.length < 64) return _count(text);
+
+	// Item blocks are re-counted while packing: memoize by text.
+	const hit = memo.get(text);
+	if (hit !== undefined) return hit;
+	const n = _count(text);
+	memo.set(text, n);
+	if (memo.size > MEMO_MAX) memo.delete(memo.keys().next().value);
+	return n;
+}
+
+//<EOF tokens.mjs lines: 34>
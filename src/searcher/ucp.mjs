@@ -8,6 +8,7 @@ export function buildUcpResponse({
 	pickIds = [],
 	renderedText = null,
 	timingMs = { search: 0, fetch: 0, total: 0 },
+	rank = null,
 	note = null
 }) {
 	const now = new Date().toISOString();
@@ -36,6 +37,10 @@ export function buildUcpResponse({
 		items
 	};
 
+	if (rank) {
+		response.meta.rank = rank;
+	}
+
 	if (note) {
 		response.meta.note = note;
 	}
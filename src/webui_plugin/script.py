@@ -1,36 +1,82 @@
+import atexit
 import json
 import os
 import sys
 import datetime
+import math
 import re
-import urllib.request
+import time
+import threading
+import hashlib
+import collections
+import http.client
+import socket
+import concurrent.futures
+import contextvars
+import urllib.parse
 import urllib.error
 import gradio as gr
 
+try:
+	import numpy as np
+except Exception:
+	np = None
+
 DEFAULT_CFG = {
 	"enable": False,
 	"trigger_prefix": "???",
 	"trigger_anywhere": True,
 	"query_mode": "user_text",  # user_text | llm_query
 	"full_handling": "inject",  # inject | llm_pack (only when search_mode=full)
-	"fetch_engine": "local",  # local | jina (only used when search_mode=full)
+	"fetch_engine": "local",  # local | jina | auto (only used when search_mode=full; auto = local, Jina on bot challenges)
 	"llm_query_until_newline": False,
+	# Run a search on the raw user text while llm_query rewrite is in flight (advanced).
+	"llm_query_speculative": False,
+	"speculative_max_workers": 4,
 	"llm_query_max_words": 12,
 	"llm_query_max_chars": 200,
 	"snippet_rank_enabled": True,
 	"snippet_rank_top_k": 10,
 	"snippet_rank_pick_n_simple": 6,
 	"snippet_rank_pick_n_full": 3,
+	# Full mode: let the searcher call the ranker itself (single /v1/search round trip).
+	"snippet_rank_server_side": False,
+	# Ranking engine: llm | bm25 (local lexical score, no LLM call) | hybrid (bm25 prefilter, then llm)
+	# | embed (cosine similarity from a /v1/embeddings endpoint).
+	"snippet_rank_engine": "llm",
+	# hybrid: how many bm25-best candidates the LLM gets to see (never fewer than pick_n).
+	"snippet_rank_hybrid_keep": 6,
+	# bm25/hybrid: weight of the date/year boost for present-time questions.
+	"snippet_rank_recency_weight": 0.3,
+	# embed: OpenAI-compatible embeddings endpoint (empty = openai_api_base) and model.
+	"embed_api_base": "",
+	"embed_model": "",
+	# embed: memoized float32 vectors (query + candidate texts), LRU-bounded.
+	"embed_memo_max_entries": 4096,
+	# Memoize rank picks for identical question + candidates + want_n + model (advanced).
+	"rank_memo_enabled": True,
+	"rank_memo_ttl_s": 3600,
+	"rank_memo_max_entries": 256,
+	"rank_memo_disk": False,
 	"verbose": False,
+	# Stage latency histograms (rewrite/rank/search/pack/trigger) in Prometheus text format,
+	# rewritten after every trigger; e.g. a node_exporter textfile-collector path (advanced).
+	"metrics_file": "",
 	"max_query_chars": 512,
 	"llm_query_max_user_chars": 1024,
 
 	"search_api_url": "http://127.0.0.1:7070/v1/search",
 	"backend": "searxng",
-	"search_mode": "simple",
+	"search_mode": "simple",  # simple | full | cache (answer from searcher's cached pages, /v1/retrieve)
+	# search_mode=cache: pages to retrieve, and whether to search the web when the cache has nothing.
+	"cache_top_k": 5,
+	"cache_mode_fallback": True,
 
 	"timeout_search_s": 8,
 	"timeout_search_full_s": 40,
+	# Full mode: stream /v1/search (NDJSON) and, at timeout_search_full_s, use the pages that
+	# arrived so far instead of failing the whole call (advanced).
+	"search_stream": True,
 	# Legacy single timeout (kept for backward compatibility)
 	"timeout_llm_s": 10,
 	# More granular timeouts (advanced; edit llm_web_search.json manually)
@@ -38,9 +84,29 @@ DEFAULT_CFG = {
 	"timeout_rank_s": 30,
 	"timeout_pack_s": 60,
 	"rewrite_max_tokens": 1024,
+	# One deadline for the whole trigger (0 = off: the timeouts above apply independently).
+	# Every stage gets at most the time left; rewrite/rank/pack are skipped when too little remains
+	# and the searcher receives the rest as budget.max_total_time_ms (advanced).
+	"trigger_deadline_s": 0,
+	"deadline_reserve_search_s": 4,
+	"deadline_reserve_fetch_s": 10,
+	"deadline_min_pack_s": 8,
 
 	"openai_api_base": "http://127.0.0.1:5000/v1",
 	"openai_model": "",
+
+	# Stream rewrite/rank completions and stop reading once the answer is complete (advanced).
+	"llm_stream": True,
+
+	# Budget the context pack in model tokens instead of characters (0 = off; advanced).
+	# Counts use the WebUI's loaded tokenizer, else tokenizer_path (HF tokenizer.json, needs
+	# the `tokenizers` package), else a per-script estimate.
+	"max_context_tokens": 0,
+	"tokenizer_path": "",
+
+	# Keep-alive connection pool for searcher/LLM calls (advanced; edit llm_web_search.json manually)
+	"http_pool_size": 4,
+	"http_pool_idle_s": 30,
 }
 
 cfg = dict(DEFAULT_CFG)
@@ -48,6 +114,9 @@ cfg = dict(DEFAULT_CFG)
 # Persisted UI settings live near this script to keep it portable.
 CFG_PATH = os.path.join(os.path.dirname(__file__), "llm_web_search.json")
 
+# Optional disk copy of the rank memo (rank_memo_disk), survives WebUI restarts.
+RANK_MEMO_PATH = os.path.join(os.path.dirname(__file__), "rank_memo.json")
+
 # Only save user-facing knobs. Tech fields stay in DEFAULT_CFG / manual edits.
 PERSIST_KEYS = [
 	"enable",
@@ -167,7 +236,7 @@ def ui():
 		query_mode = gr.Dropdown(choices=["user_text", "llm_query"], value=cfg["query_mode"], label="Query mode")
 
 		backend = gr.Dropdown(choices=["searxng", "duckduckgo"], value=cfg["backend"], label="Backend")
-		search_mode = gr.Dropdown(choices=["simple", "full"], value=cfg["search_mode"], label="Search mode")
+		search_mode = gr.Dropdown(choices=["simple", "full", "cache"], value=cfg["search_mode"], label="Search mode")
 		full_handling = gr.Dropdown(
 			choices=["inject", "llm_pack"],
 			value=cfg["full_handling"],
@@ -175,7 +244,7 @@ def ui():
 			interactive=(cfg["search_mode"] == "full"),
 		)
 		fetch_engine = gr.Dropdown(
-			choices=["local", "jina"],
+			choices=["local", "jina", "auto"],
 			value=cfg.get("fetch_engine") or "local",
 			label="Fetch engine (full mode)",
 			interactive=(cfg["search_mode"] == "full"),
@@ -214,20 +283,450 @@ def ui():
 			outputs=[cache_clear_status],
 		)
 
+# Keep-alive connection pools, one per (scheme, host, port).
+# Shared by all WebUI sessions; guarded by a single lock.
+_HTTP_POOL_LOCK = threading.Lock()
+_HTTP_POOLS = {}
+_HTTP_POOL_STATS = {"connects": 0, "reuses": 0, "evictions": 0, "retries": 0}
+
+# Errors that mean a pooled connection was closed by the peer while idle.
+_HTTP_STALE_ERRORS = (
+	http.client.RemoteDisconnected,
+	http.client.BadStatusLine,
+	ConnectionResetError,
+	BrokenPipeError,
+)
+
+def _http_pool_limits() -> tuple:
+	try:
+		size = int(cfg.get("http_pool_size") or 0)
+	except Exception:
+		size = 4
+	try:
+		idle_s = float(cfg.get("http_pool_idle_s") or 0)
+	except Exception:
+		idle_s = 30.0
+	return max(0, size), max(0.0, idle_s)
+
+def _http_pool_key(url: str) -> tuple:
+	u = urllib.parse.urlsplit(url)
+	scheme = (u.scheme or "http").lower()
+	host = u.hostname or ""
+	port = u.port or (443 if scheme == "https" else 80)
+	path = u.path or "/"
+	if u.query:
+		path += "?" + u.query
+	return (scheme, host, port), path
+
+def _http_new_conn(key: tuple, timeout_s: float):
+	scheme, host, port = key
+	if scheme == "https":
+		return http.client.HTTPSConnection(host, port, timeout=timeout_s)
+	return http.client.HTTPConnection(host, port, timeout=timeout_s)
+
+def _http_pool_acquire(key: tuple, timeout_s: float) -> tuple:
+	# Returns (conn, reused). Idle connections past http_pool_idle_s are closed here.
+	_, idle_s = _http_pool_limits()
+	now = time.monotonic()
+	conn = None
+	stale = []
+	with _HTTP_POOL_LOCK:
+		idle = _HTTP_POOLS.get(key) or []
+		while idle:
+			c, last_used = idle.pop()
+			if idle_s > 0 and (now - last_used) > idle_s:
+				stale.append(c)
+				continue
+			conn = c
+			break
+		# Whatever is left below the popped entry is older still.
+		if idle_s > 0:
+			keep = []
+			for c, last_used in idle:
+				if (now - last_used) > idle_s:
+					stale.append(c)
+				else:
+					keep.append((c, last_used))
+			idle[:] = keep
+		_HTTP_POOL_STATS["evictions"] += len(stale)
+		if conn is not None:
+			_HTTP_POOL_STATS["reuses"] += 1
+		else:
+			_HTTP_POOL_STATS["connects"] += 1
+
+	for c in stale:
+		try:
+			c.close()
+		except Exception:
+			pass
+
+	if conn is None:
+		return _http_new_conn(key, timeout_s), False
+
+	conn.timeout = timeout_s
+	try:
+		if conn.sock is not None:
+			conn.sock.settimeout(timeout_s)
+	except Exception:
+		pass
+	return conn, True
+
+def _http_pool_release(key: tuple, conn) -> None:
+	size, _ = _http_pool_limits()
+	with _HTTP_POOL_LOCK:
+		idle = _HTTP_POOLS.setdefault(key, [])
+		if size > 0 and len(idle) < size:
+			idle.append((conn, time.monotonic()))
+			return
+	try:
+		conn.close()
+	except Exception:
+		pass
+
+def _http_pool_stats() -> dict:
+	with _HTTP_POOL_LOCK:
+		out = dict(_HTTP_POOL_STATS)
+		out["idle"] = sum(len(v) for v in _HTTP_POOLS.values())
+	return out
+
+# Cancellation for calls running on a worker thread (speculative search). The task's context
+# holds a token; cancelling it shuts down the socket the call is blocked on.
+_HTTP_CANCEL = contextvars.ContextVar("llm_web_search_http_cancel", default=None)
+
+def _http_cancel_token() -> dict:
+	return {"lock": threading.Lock(), "conn": None, "cancelled": False}
+
+def _http_cancel(token: dict|None) -> None:
+	if not token:
+		return
+	with token["lock"]:
+		token["cancelled"] = True
+		conn, token["conn"] = token["conn"], None
+	try:
+		if conn is not None and conn.sock is not None:
+			conn.sock.shutdown(socket.SHUT_RDWR)
+	except Exception:
+		pass
+
+def _http_cancel_attach(conn) -> None:
+	token = _HTTP_CANCEL.get()
+	if not token:
+		return
+	with token["lock"]:
+		if token["cancelled"]:
+			raise ConnectionAbortedError("request cancelled")
+		token["conn"] = conn
+
+def _http_cancel_detach(conn) -> None:
+	# Before a connection goes back to the pool, where a late cancel must not reach it.
+	token = _HTTP_CANCEL.get()
+	if not token:
+		return
+	with token["lock"]:
+		if token["conn"] is conn:
+			token["conn"] = None
+
+def _http_cancelled() -> bool:
+	token = _HTTP_CANCEL.get()
+	return bool(token and token["cancelled"])
+
+def _http_close(conn) -> None:
+	_http_cancel_detach(conn)
+	try:
+		conn.close()
+	except Exception:
+		pass
+
+def _http_open(method: str, url: str, body: bytes|None, headers: dict, timeout_s: float) -> tuple:
+	# Send a request on a pooled connection and return (key, conn, resp) once headers arrive.
+	key, path = _http_pool_key(url)
+	attempt = 0
+	while True:
+		conn, reused = _http_pool_acquire(key, timeout_s)
+		try:
+			_http_cancel_attach(conn)
+			conn.request(method, path, body=body, headers=headers)
+			if _http_cancelled():
+				# Cancelled while connecting, before the socket could be shut down.
+				raise ConnectionAbortedError("request cancelled")
+			resp = conn.getresponse()
+			return key, conn, resp
+		except _HTTP_STALE_ERRORS:
+			_http_close(conn)
+			# The peer dropped an idle keep-alive socket: retry once on a fresh connection.
+			if reused and attempt == 0 and not _http_cancelled():
+				attempt += 1
+				with _HTTP_POOL_LOCK:
+					_HTTP_POOL_STATS["retries"] += 1
+				continue
+			raise
+		except Exception:
+			_http_close(conn)
+			raise
+
+def _http_done(key: tuple, conn, resp) -> None:
+	# Response body fully consumed: hand the connection back unless the server closes it.
+	_http_cancel_detach(conn)
+	if resp.will_close:
+		_http_close(conn)
+	else:
+		_http_pool_release(key, conn)
+
+def _http_request(method: str, url: str, body: bytes|None, headers: dict, timeout_s: float) -> bytes:
+	# Pooled keep-alive replacement for urllib.request.urlopen(...).read().
+	# Raises urllib.error.HTTPError on non-2xx status, same as urlopen.
+	key, conn, resp = _http_open(method, url, body, headers, timeout_s)
+	try:
+		raw = resp.read()
+	except Exception:
+		_http_close(conn)
+		raise
+	_http_done(key, conn, resp)
+
+	if resp.status < 200 or resp.status >= 300:
+		raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+	return raw
+
+def _http_post_chat_stream(url: str, payload: dict, timeout_s: int, stop_fn) -> tuple:
+	# Streamed /chat/completions (SSE). Returns (content, stopped_early).
+	# stop_fn(content_so_far) returns the final content once enough has been parsed, else None;
+	# the connection is then closed instead of waiting for max_tokens.
+	# Servers that ignore "stream" and answer with plain JSON are handled too.
+	data = json.dumps(dict(payload, stream=True)).encode("utf-8")
+	key, conn, resp = _http_open(
+		"POST",
+		url,
+		data,
+		{
+			"Content-Type": "application/json",
+			"Accept": "text/event-stream, application/json",
+		},
+		timeout_s,
+	)
+
+	try:
+		if resp.status < 200 or resp.status >= 300:
+			resp.read()
+			_http_done(key, conn, resp)
+			raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+
+		ctype = (resp.getheader("Content-Type") or "").lower()
+		if "text/event-stream" not in ctype:
+			raw = resp.read()
+			_http_done(key, conn, resp)
+			obj = json.loads(raw.decode("utf-8", errors="replace"))
+			return obj["choices"][0]["message"]["content"], False
+
+		deadline = time.monotonic() + float(timeout_s)
+		parts = []
+		while True:
+			if time.monotonic() > deadline:
+				raise TimeoutError("stream timeout")
+			line = resp.readline()
+			if not line:
+				break
+			line = line.strip()
+			if not line.startswith(b"data:"):
+				continue
+			d = line[len(b"data:"):].strip()
+			if d == b"[DONE]":
+				break
+			try:
+				ch = json.loads(d.decode("utf-8", errors="replace"))["choices"][0]
+				piece = (ch.get("delta") or {}).get("content") or ch.get("text") or ""
+			except Exception:
+				continue
+			if not piece:
+				continue
+			parts.append(piece)
+			if stop_fn is not None:
+				final = stop_fn("".join(parts))
+				if final is not None:
+					_http_close(conn)
+					return final, True
+
+		# Drain anything after [DONE] so the keep-alive connection stays usable.
+		resp.read()
+		_http_done(key, conn, resp)
+		return "".join(parts), False
+	except urllib.error.HTTPError:
+		raise
+	except Exception:
+		_http_close(conn)
+		raise
+
+def _http_post_search_stream(url: str, payload: dict, timeout_s: int) -> dict:
+	# Streamed /v1/search (NDJSON: items, fetch per page, done). Returns the final record
+	# (meta/usage/rendered_text) or, when the deadline hits first, a partial response rendered
+	# from what arrived ({"partial": True}). Servers answering plain JSON are handled too.
+	data = json.dumps(payload).encode("utf-8")
+	deadline = time.monotonic() + float(timeout_s)
+	key, conn, resp = _http_open(
+		"POST",
+		url,
+		data,
+		{
+			"Content-Type": "application/json",
+			"Accept": "application/x-ndjson, application/json",
+		},
+		timeout_s,
+	)
+
+	try:
+		if resp.status < 200 or resp.status >= 300:
+			resp.read()
+			_http_done(key, conn, resp)
+			raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+
+		ctype = (resp.getheader("Content-Type") or "").lower()
+		if "ndjson" not in ctype:
+			raw = resp.read()
+			_http_done(key, conn, resp)
+			return json.loads(raw.decode("utf-8", errors="replace"))
+	except urllib.error.HTTPError:
+		raise
+	except Exception:
+		_http_close(conn)
+		raise
+
+	items = []
+	fetched = {}
+	done = None
+	try:
+		while done is None:
+			left = deadline - time.monotonic()
+			if left <= 0:
+				break
+			try:
+				conn.sock.settimeout(left)
+			except Exception:
+				pass
+			line = resp.readline()
+			if not line:
+				break
+			try:
+				rec = json.loads(line.decode("utf-8", errors="replace"))
+			except Exception:
+				continue
+			t = rec.get("type") if isinstance(rec, dict) else None
+			if t == "items":
+				items = rec.get("items") or []
+			elif t == "fetch":
+				try:
+					fetched[int(rec.get("index"))] = rec.get("fetch") or {}
+				except Exception:
+					pass
+			elif t == "done":
+				done = rec
+			elif t == "error":
+				raise RuntimeError(rec.get("error") or "search stream error")
+	except (TimeoutError, OSError):
+		pass
+	except Exception:
+		_http_close(conn)
+		raise
+
+	if done is not None:
+		try:
+			resp.read()
+			_http_done(key, conn, resp)
+		except Exception:
+			_http_close(conn)
+		return done
+
+	# Deadline (or dropped stream): the server is still working on this request.
+	_http_close(conn)
+	if not items:
+		raise TimeoutError("search stream: no results before deadline")
+
+	partial = []
+	for i, it in enumerate(items):
+		if not isinstance(it, dict):
+			continue
+		it = dict(it)
+		f = fetched.get(i) or {}
+		if f.get("status") == "fetched" and f.get("text"):
+			it["content"] = f.get("text")
+		partial.append(it)
+	# Pages that made it first, then the rest as snippets (same order as the server pack).
+	partial.sort(key=lambda it: 0 if it.get("content") else 1)
+	n_fetched = sum(1 for it in partial if it.get("content"))
+	if bool(cfg.get("verbose")) or _is_webui_verbose():
+		print(f"[llm_web_search] search_stream: deadline, using partial results items={len(partial)} fetched={n_fetched}")
+	return {
+		"partial": True,
+		"rendered_text": _render_searcher_pack(partial, 600),
+		"meta": {"partial": True},
+		"usage": {"results_returned": len(partial), "fetch_pages_used": n_fetched},
+	}
+
 def _http_post_json(url: str, payload: dict, timeout_s: int) -> dict:
 	data = json.dumps(payload).encode("utf-8")
-	req = urllib.request.Request(
+	raw = _http_request(
+		"POST",
 		url,
-		data=data,
-		method="POST",
-		headers={
+		data,
+		{
 			"Content-Type": "application/json",
 			"Accept": "application/json",
 		},
+		timeout_s,
 	)
-	with urllib.request.urlopen(req, timeout=timeout_s) as resp:
-		raw = resp.read().decode("utf-8", errors="replace")
-		return json.loads(raw)
+	return json.loads(raw.decode("utf-8", errors="replace"))
+
+# Stage latency histograms: (stage, outcome) -> [bucket counts..., sum, count].
+_METRIC_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_METRICS_LOCK = threading.Lock()
+_METRICS = {}
+
+def _metric_observe(stage: str, seconds: float, outcome: str="ok") -> None:
+	with _METRICS_LOCK:
+		row = _METRICS.get((stage, outcome))
+		if row is None:
+			row = [0] * len(_METRIC_BUCKETS_S) + [0.0, 0]
+			_METRICS[(stage, outcome)] = row
+		for i, b in enumerate(_METRIC_BUCKETS_S):
+			if seconds <= b:
+				row[i] += 1
+		row[-2] += seconds
+		row[-1] += 1
+
+def _timed(stage: str, fn, *args):
+	# Run fn(*args) and record its latency; outcome is ok, empty (falsy result) or error.
+	t0 = time.perf_counter()
+	try:
+		out = fn(*args)
+	except Exception:
+		_metric_observe(stage, time.perf_counter() - t0, "error")
+		raise
+	_metric_observe(stage, time.perf_counter() - t0, "ok" if out else "empty")
+	return out
+
+def _metrics_render() -> str:
+	name = "llm_web_search_stage_seconds"
+	out = [f"# HELP {name} WebUI plugin stage latency.", f"# TYPE {name} histogram"]
+	with _METRICS_LOCK:
+		rows = sorted(_METRICS.items())
+		for (stage, outcome), row in rows:
+			lbl = f'stage="{stage}",outcome="{outcome}"'
+			for i, b in enumerate(_METRIC_BUCKETS_S):
+				out.append(f'{name}_bucket{{{lbl},le="{b}"}} {row[i]}')
+			out.append(f'{name}_bucket{{{lbl},le="+Inf"}} {row[-1]}')
+			out.append(f"{name}_sum{{{lbl}}} {row[-2]:.6f}")
+			out.append(f"{name}_count{{{lbl}}} {row[-1]}")
+	return "\n".join(out) + "\n"
+
+def _metrics_flush() -> None:
+	path = (cfg.get("metrics_file") or "").strip()
+	if not path:
+		return
+	tmp = path + ".tmp"
+	try:
+		with open(tmp, "w", encoding="utf-8") as f:
+			f.write(_metrics_render())
+		os.replace(tmp, path)
+	except Exception:
+		pass
 
 def _derive_cache_clear_url() -> str:
 	base = (cfg.get("search_api_url") or "").strip()
@@ -241,6 +740,33 @@ def _derive_cache_clear_url() -> str:
 		base = base[:-1]
 	return base + "/v1/cache/clear"
 
+def _derive_retrieve_url() -> str:
+	base = (cfg.get("search_api_url") or "").strip()
+	if not base:
+		return ""
+	# Common case: .../v1/search -> .../v1/retrieve
+	if base.endswith("/v1/search"):
+		return base[:-len("/v1/search")] + "/v1/retrieve"
+	# Fallback: append path (best-effort)
+	if base.endswith("/"):
+		base = base[:-1]
+	return base + "/v1/retrieve"
+
+def _call_retrieve_api(query_text: str) -> dict:
+	# Local retrieval over the searcher's extracted-text cache; no web search or fetch.
+	url = _derive_retrieve_url()
+	if not url:
+		return {}
+	budget = {"max_results": int(cfg.get("cache_top_k") or 5)}
+	if _max_context_tokens():
+		budget["max_context_tokens"] = _max_context_tokens()
+	payload = {
+		"query": {"text": query_text},
+		"want": {"rendered_text": True, "items": False},
+		"budget": budget,
+	}
+	return _timed("retrieve", _http_post_json, url, payload, _search_timeout_s("simple"))
+
 def _call_cache_clear() -> str:
 	url = _derive_cache_clear_url()
 	if not url:
@@ -249,20 +775,166 @@ def _call_cache_clear() -> str:
 	# Small timeout; this is a local service call.
 	to = 5
 	try:
-		req = urllib.request.Request(
-			url,
-			data=b"{}",
-			method="POST",
-			headers={
-				"Content-Type": "application/json",
-				"Accept": "application/json",
-			},
-		)
-		urllib.request.urlopen(req, timeout=to).read()
+		_http_post_json(url, {}, to)
 		return "Cache cleared."
 	except Exception as e:
 		return f"Cache clear failed: {str(e)}"
 
+# Token counts: key -> count, oldest first.
+_TOKEN_COUNT_LOCK = threading.Lock()
+_TOKEN_COUNTS = collections.OrderedDict()
+_TOKEN_COUNTS_MAX = 4096
+_FILE_TOKENIZER = {"path": None, "tok": None}
+
+_CJK_CHARS_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_WIDE_CHARS_RE = re.compile(r"[\u0370-\u03ff\u0400-\u04ff\u0590-\u06ff]")
+
+def _max_context_tokens() -> int:
+	try:
+		return max(0, int(cfg.get("max_context_tokens") or 0))
+	except Exception:
+		return 0
+
+def _estimate_tokens(text: str) -> int:
+	# Same estimate as the searcher (tokens.mjs): CJK ~1/char, Cyrillic/Greek/Arabic ~1/2.5 chars, rest ~1/4.
+	cjk = len(_CJK_CHARS_RE.findall(text))
+	wide = len(_WIDE_CHARS_RE.findall(text))
+	rest = max(0, len(text) - cjk - wide)
+	return cjk + math.ceil(wide / 2.5) + math.ceil(rest / 4)
+
+def _get_token_encoder() -> tuple:
+	# Returns (source_id, encode_fn) or (None, None) when only the estimate is available.
+	try:
+		from modules import shared
+		tok = getattr(shared, "tokenizer", None)
+		if tok is not None and hasattr(tok, "encode"):
+			return (f"webui:{getattr(shared, 'model_name', '')}", tok.encode)
+	except Exception:
+		pass
+
+	path = (cfg.get("tokenizer_path") or "").strip()
+	if not path:
+		return (None, None)
+	if _FILE_TOKENIZER["path"] != path:
+		_FILE_TOKENIZER["path"] = path
+		_FILE_TOKENIZER["tok"] = None
+		try:
+			from tokenizers import Tokenizer
+			_FILE_TOKENIZER["tok"] = Tokenizer.from_file(path)
+		except Exception:
+			if bool(cfg.get("verbose")) or _is_webui_verbose():
+				print(f"[llm_web_search] tokenizer_path: cannot load {path}")
+	tok = _FILE_TOKENIZER["tok"]
+	if tok is None:
+		return (None, None)
+	return (f"file:{path}", lambda t: tok.encode(t, add_special_tokens=False).ids)
+
+def _count_tokens(text: str) -> int:
+	text = text or ""
+	if not text:
+		return 0
+	source, encode = _get_token_encoder()
+	key = hashlib.sha1(((source or "estimate") + "\0" + text).encode("utf-8")).hexdigest()
+	with _TOKEN_COUNT_LOCK:
+		n = _TOKEN_COUNTS.get(key)
+		if n is not None:
+			_TOKEN_COUNTS.move_to_end(key)
+			return n
+
+	n = None
+	if encode is not None:
+		try:
+			ids = encode(text)
+			shape = getattr(ids, "shape", None)
+			n = int(shape[-1]) if shape is not None else len(ids)
+		except Exception:
+			n = None
+	if n is None:
+		n = _estimate_tokens(text)
+
+	with _TOKEN_COUNT_LOCK:
+		_TOKEN_COUNTS[key] = n
+		while len(_TOKEN_COUNTS) > _TOKEN_COUNTS_MAX:
+			_TOKEN_COUNTS.popitem(last=False)
+	return n
+
+def _pack_lines_by_tokens(head: list, blocks: list, tail: list, max_tokens: int) -> list:
+	# Greedy, in rank order. blocks: [(lines, content_at)], lines[content_at:] being the CONTENT
+	# text (content_at < 0: no content). A block that does not fit whole keeps its leading
+	# content paragraphs that still fit; blocks that cannot fit at all are skipped.
+	used = _count_tokens("\n".join(head)) + _count_tokens("\n".join(tail))
+	out = list(head)
+	for lines, content_at in blocks:
+		cost = _count_tokens("\n".join(lines))
+		if used + cost <= max_tokens:
+			out.extend(lines)
+			used += cost
+			continue
+		if content_at < 0:
+			continue
+
+		meta = lines[:content_at]
+		part = _count_tokens("\n".join(meta))
+		if used + part > max_tokens:
+			continue
+		kept = []
+		for para in "\n".join(lines[content_at:]).split("\n\n"):
+			c = _count_tokens(para)
+			if used + part + c > max_tokens:
+				break
+			kept.append(para)
+			part += c
+		if not kept:
+			continue
+		out.extend(meta)
+		out.append("\n\n".join(kept))
+		used += part
+	out.extend(tail)
+	return out
+
+# Searcher item header (render.mjs): blank line, "#<rank> <title>", optional "[engines | domain]", URL.
+_PACK_ITEM_HEADER_RE = re.compile(r"^#\d+ ")
+_PACK_ITEM_META_RE = re.compile(r"^\[[^\]|]* \| [^\]|]*\]$")
+_PACK_ITEM_URL_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://\S+$")
+
+def _is_pack_item_start(lines: list, i: int) -> bool:
+	# Only the exact header sequence counts: markdown headings inside CONTENT are not item boundaries.
+	if i < 1 or lines[i - 1] != "" or not _PACK_ITEM_HEADER_RE.match(lines[i]):
+		return False
+	j = i + 1
+	if j < len(lines) and _PACK_ITEM_META_RE.match(lines[j]):
+		j += 1
+	return j < len(lines) and bool(_PACK_ITEM_URL_RE.match(lines[j]))
+
+def _fit_pack_tokens(rendered: str) -> str:
+	# Re-fit a rendered CONTEXT_PACK (searcher format, see _is_pack_item_start)
+	# to max_context_tokens using the real tokenizer.
+	max_tokens = _max_context_tokens()
+	if not max_tokens or not rendered:
+		return rendered
+	if _count_tokens(rendered) <= max_tokens:
+		return rendered
+
+	lines = rendered.split("\n")
+	tail = []
+	if lines and lines[-1] == "[/CONTEXT_PACK]":
+		tail = ["", "[/CONTEXT_PACK]"] if len(lines) > 1 and lines[-2] == "" else ["[/CONTEXT_PACK]"]
+		lines = lines[:len(lines) - len(tail)]
+
+	starts = [i for i in range(1, len(lines)) if _is_pack_item_start(lines, i)]
+	if not starts:
+		return rendered
+	head = lines[:starts[0] - 1]
+	blocks = []
+	for n, st in enumerate(starts):
+		end = (starts[n + 1] - 1) if n + 1 < len(starts) else len(lines)
+		blk = lines[st - 1:end]
+		content_at = -1
+		if "CONTENT:" in blk:
+			content_at = blk.index("CONTENT:") + 1
+		blocks.append((blk, content_at))
+	return "\n".join(_pack_lines_by_tokens(head, blocks, tail, max_tokens))
+
 def _render_context_pack(items: list, max_context_chars: int|None, max_snippet_chars: int) -> str:
 	# Deterministic wrapper compatible with searcher renderContextPack().
 	out = []
@@ -288,6 +960,10 @@ def _render_context_pack(items: list, max_context_chars: int|None, max_snippet_c
 			return t
 		return t[:max_chars]
 
+	max_tokens = _max_context_tokens()
+	head = out
+	blocks = []
+
 	for it in items:
 		title = (it.get("title") or "").strip()
 		url = (it.get("url") or "").strip()
@@ -302,16 +978,32 @@ def _render_context_pack(items: list, max_context_chars: int|None, max_snippet_c
 		except Exception:
 			rank = 0
 
-		out.append(f"{rank}. {title}" if title else f"{rank}.")
+		block = []
+		block.append(f"{rank}. {title}" if title else f"{rank}.")
 		if url:
-			out.append(url)
+			block.append(url)
 
 		sn = _trim_snippet(snippet, int(max_snippet_chars or 0))
 		if sn:
-			out.append(sn)
+			block.append(sn)
+
+		# Page text, when the item was fetched (partial full-mode stream).
+		content = (it.get("content") or "").strip()
+		if content:
+			block.append("")
+			block.append("CONTENT:")
+			blocks.append((block + [content], len(block) + 1))
+			continue
+		blocks.append((block, -1))
 
-	out.append("")
-	out.append("[/CONTEXT_PACK]")
+	tail = ["", "[/CONTEXT_PACK]"]
+	if max_tokens:
+		# Token mode replaces the character head/tail cut.
+		return "\n".join(_pack_lines_by_tokens(head, blocks, tail, max_tokens))
+
+	for block, _ in blocks:
+		out.extend(block)
+	out.extend(tail)
 
 	txt = "\n".join(out)
 
@@ -325,6 +1017,46 @@ def _render_context_pack(items: list, max_context_chars: int|None, max_snippet_c
 
 	return txt
 
+def _render_searcher_pack(items: list, max_snippet_chars: int) -> str:
+	# Same layout as the searcher's renderContextPack() (render.mjs), for packs the plugin
+	# assembles from searcher records (partial stream at the deadline). Items may carry
+	# "content": the page text, already cut to the render budget by the searcher.
+	if not items:
+		return _render_context_pack([], None, max_snippet_chars)
+
+	head = ["[CONTEXT_PACK ucp-1]", "type: web_search_results"]
+	blocks = []
+	for it in items:
+		block = ["", f"#{it.get('rank')} {(it.get('title') or '')}"]
+		engines = it.get("engines")
+		eng = ",".join(str(e) for e in engines) if isinstance(engines, list) else ""
+		dom = (it.get("domain") or "")
+		if eng or dom:
+			block.append(f"[{eng or '-'} | {dom or '-'}]")
+		block.append(it.get("url") or "")
+		sn = (it.get("snippet") or "")
+		if max_snippet_chars and max_snippet_chars > 0:
+			sn = sn[:max_snippet_chars]
+		if sn:
+			block.append(sn)
+		content = (it.get("content") or "")
+		if content:
+			block.append("")
+			block.append("CONTENT:")
+			blocks.append((block + [content], len(block)))
+			continue
+		blocks.append((block, -1))
+
+	tail = ["", "[/CONTEXT_PACK]"]
+	max_tokens = _max_context_tokens()
+	if max_tokens:
+		return "\n".join(_pack_lines_by_tokens(head, blocks, tail, max_tokens))
+	out = list(head)
+	for block, _ in blocks:
+		out.extend(block)
+	out.extend(tail)
+	return "\n".join(out)
+
 def _render_pack_summary(summary_text: str) -> str:
 	# Deterministic wrapper for packed/summarized content (full_handling=llm_pack).
 	out = []
@@ -454,6 +1186,65 @@ def _extract_single_line_query(raw: str, max_words: int, max_chars: int) -> str:
 
 	return q
 
+def _after_reasoning_prefix(text: str) -> str|None:
+	# Text after a leading <tag>...</tag> reasoning block; None while that block is still open.
+	s = (text or "").lstrip()
+	m = re.match(r"^<([a-zA-Z0-9_:-]+)>", s)
+	if not m:
+		return s
+	close_tag = f"</{m.group(1)}>"
+	pos = s.lower().find(close_tag.lower())
+	if pos == -1:
+		return None
+	return s[pos + len(close_tag):]
+
+def _rank_stream_stop(text: str, valid_ids: set|None=None) -> str|None:
+	# Complete once the answer opens with a closed "pick" array ({"pick":[...]) or a bare index array,
+	# optionally after "JSON:" and a reasoning block, holding at least one valid candidate index.
+	# Anything else (preamble prose, an empty pick) keeps reading until the stream ends.
+	s = _after_reasoning_prefix(text)
+	if s is None:
+		return None
+	m = re.match(r'^\s*(?:JSON:\s*)?\{\s*("pick"\s*:\s*\[([^\]]*)\])', s, re.IGNORECASE)
+	if m:
+		out, body = "{" + m.group(1) + "}", m.group(2)
+	else:
+		m = re.match(r"^\s*(?:JSON:\s*)?(\[([\d\s,]*)\])", s, re.IGNORECASE)
+		if not m:
+			return None
+		out, body = m.group(1), m.group(2)
+	for v in re.findall(r"-?\d+", body):
+		if valid_ids is None or int(v) in valid_ids:
+			return out
+	return None
+
+def _rewrite_stream_stop(text: str) -> str|None:
+	# Stop only where _extract_single_line_query's answer is already fixed: a terminated "QUERY:"
+	# line (the anchor wins wherever it appears), or the first terminated line after a closed
+	# leading <tag> reasoning block. Untagged output is read to the end: its first line may be
+	# reasoning followed by a later QUERY: line.
+	s = (text or "").replace("\r", "\n")
+	nl = s.rfind("\n")
+	if nl < 0:
+		return None
+	done = s[:nl]
+	for ln in done.split("\n"):
+		if ln.strip().lower().startswith("query:"):
+			return done
+
+	if not re.match(r"^\s*<([a-zA-Z0-9_:-]+)>", done):
+		return None
+	rest = _after_reasoning_prefix(done)
+	if rest is None:
+		return None
+	for ln in rest.split("\n"):
+		t = ln.strip()
+		if not t:
+			continue
+		# A fenced block is dropped by the parser; wait for what follows it.
+		return None if t.startswith("```") else done
+	return None
+
 def _today_utc_iso_date() -> str:
 	# Provide the current date to the model to avoid "future/past" confusion.
 	try:
@@ -461,7 +1252,144 @@ def _today_utc_iso_date() -> str:
 	except Exception:
 		return ""
 
+# Rank memo: key -> (stored_ts, picks), oldest first.
+_RANK_MEMO_LOCK = threading.Lock()
+_RANK_MEMO = collections.OrderedDict()
+_RANK_MEMO_LOADED = False
+# rank_memo_disk: puts schedule one delayed background write instead of writing on the trigger path.
+_RANK_MEMO_SAVE_DELAY_S = 5.0
+_RANK_MEMO_SAVE = {"timer": None}
+_RANK_MEMO_WRITE_LOCK = threading.Lock()
+
+def _rank_memo_key(query_text: str, candidates: list, want_n: int) -> str:
+	h = hashlib.sha1()
+	h.update((cfg.get("openai_model") or "").strip().encode("utf-8"))
+	h.update(b"\0")
+	# The rank prompt carries the current date (time-relevance policy): picks do not outlive it.
+	h.update(_today_utc_iso_date().encode("utf-8"))
+	h.update(b"\0")
+	h.update(str(int(want_n)).encode("utf-8"))
+	h.update(b"\0")
+	h.update((query_text or "").strip().encode("utf-8"))
+	for c in candidates:
+		h.update(b"\0")
+		h.update((c.get("url") or "").strip().encode("utf-8"))
+		h.update(b"\1")
+		h.update(hashlib.sha1(((c.get("title") or "") + "\n" + (c.get("snippet") or "")).encode("utf-8")).digest())
+	return h.hexdigest()
+
+def _rank_memo_limits() -> tuple:
+	try:
+		ttl_s = float(cfg.get("rank_memo_ttl_s") or 0)
+	except Exception:
+		ttl_s = 3600.0
+	try:
+		max_n = int(cfg.get("rank_memo_max_entries") or 0)
+	except Exception:
+		max_n = 256
+	return ttl_s, max(1, max_n)
+
+def _rank_memo_load_locked() -> None:
+	global _RANK_MEMO_LOADED
+	if _RANK_MEMO_LOADED:
+		return
+	_RANK_MEMO_LOADED = True
+	if not cfg.get("rank_memo_disk"):
+		return
+	try:
+		with open(RANK_MEMO_PATH, "r", encoding="utf-8") as f:
+			data = json.load(f)
+	except Exception:
+		return
+	if not isinstance(data, list):
+		return
+	for row in data:
+		try:
+			k, ts, picks = row
+			_RANK_MEMO[str(k)] = (float(ts), [int(v) for v in picks])
+		except Exception:
+			continue
+
+def _rank_memo_schedule_save_locked() -> None:
+	if not cfg.get("rank_memo_disk") or _RANK_MEMO_SAVE["timer"] is not None:
+		return
+	t = threading.Timer(_RANK_MEMO_SAVE_DELAY_S, _rank_memo_save)
+	t.daemon = True
+	_RANK_MEMO_SAVE["timer"] = t
+	t.start()
+
+def _rank_memo_save() -> None:
+	# Snapshot under the memo lock, write outside it (timer thread, or at exit).
+	with _RANK_MEMO_LOCK:
+		_RANK_MEMO_SAVE["timer"] = None
+		data = [[k, ts, picks] for k, (ts, picks) in _RANK_MEMO.items()]
+	tmp = RANK_MEMO_PATH + ".tmp"
+	with _RANK_MEMO_WRITE_LOCK:
+		try:
+			with open(tmp, "w", encoding="utf-8") as f:
+				json.dump(data, f)
+			os.replace(tmp, RANK_MEMO_PATH)
+		except Exception:
+			pass
+
+def _rank_memo_flush() -> None:
+	# Write a pending save now (WebUI shutdown); the timer thread is a daemon.
+	with _RANK_MEMO_LOCK:
+		t = _RANK_MEMO_SAVE["timer"]
+	if t is None:
+		return
+	t.cancel()
+	_rank_memo_save()
+
+atexit.register(_rank_memo_flush)
+
+def _rank_memo_get(key: str) -> list|None:
+	if not cfg.get("rank_memo_enabled"):
+		return None
+	ttl_s, _ = _rank_memo_limits()
+	now = time.time()
+	with _RANK_MEMO_LOCK:
+		_rank_memo_load_locked()
+		ent = _RANK_MEMO.get(key)
+		if ent is None:
+			return None
+		ts, picks = ent
+		if ttl_s > 0 and (now - ts) > ttl_s:
+			del _RANK_MEMO[key]
+			return None
+		_RANK_MEMO.move_to_end(key)
+		return list(picks)
+
+def _rank_memo_put(key: str, picks: list) -> None:
+	if not cfg.get("rank_memo_enabled") or not picks:
+		return
+	ttl_s, max_n = _rank_memo_limits()
+	now = time.time()
+	with _RANK_MEMO_LOCK:
+		_rank_memo_load_locked()
+		_RANK_MEMO[key] = (now, list(picks))
+		_RANK_MEMO.move_to_end(key)
+		if ttl_s > 0:
+			for k in [k for k, (ts, _) in _RANK_MEMO.items() if (now - ts) > ttl_s]:
+				del _RANK_MEMO[k]
+		while len(_RANK_MEMO) > max_n:
+			_RANK_MEMO.popitem(last=False)
+		_rank_memo_schedule_save_locked()
+
 def _call_openai_snippet_rank(query_text: str, candidates: list, want_n: int, timeout_s: int) -> list:
+	# Returns list of picked indices (ints) referring to candidates[i].
+	memo_key = _rank_memo_key(query_text, candidates, want_n)
+	memo = _rank_memo_get(memo_key)
+	if memo is not None:
+		if bool(cfg.get("verbose")) or _is_webui_verbose():
+			print(f"[llm_web_search] snippet_rank_memo: hit pick={memo}")
+		return memo
+
+	out = _call_openai_snippet_rank_uncached(query_text, candidates, want_n, timeout_s)
+	_rank_memo_put(memo_key, out)
+	return out
+
+def _call_openai_snippet_rank_uncached(query_text: str, candidates: list, want_n: int, timeout_s: int) -> list:
 	# Returns list of picked indices (ints) referring to candidates[i].
 	today = _today_utc_iso_date()
 	system = (
@@ -518,13 +1446,27 @@ def _call_openai_snippet_rank(query_text: str, candidates: list, want_n: int, ti
 	base = (cfg.get("openai_api_base") or "").rstrip("/")
 	url = base + "/chat/completions"
 
-	data = _http_post_json(url, payload, int(timeout_s))
+	if cfg.get("llm_stream"):
+		valid_ids = set()
+		for c in candidates:
+			try:
+				valid_ids.add(int(c.get("i")))
+			except Exception:
+				pass
+		content, early = _http_post_chat_stream(url, payload, int(timeout_s), lambda t: _rank_stream_stop(t, valid_ids))
+		if early and (bool(cfg.get("verbose")) or _is_webui_verbose()):
+			print("[llm_web_search] snippet_rank_stream: early_stop")
+	else:
+		data = _http_post_json(url, payload, int(timeout_s))
+		try:
+			content = data["choices"][0]["message"]["content"]
+		except Exception:
+			return []
 
-	try:
-		content = data["choices"][0]["message"]["content"]
-	except Exception:
-		return []
+	return _parse_rank_picks(content, candidates, want_n)
 
+def _parse_rank_picks(content: str, candidates: list, want_n: int) -> list:
+	# Picked candidate ids from a rank completion (streamed or not), in answer order.
 	# Best-effort: strip leading reasoning tags (think/reasoning/analysis) but keep the rest.
 	try:
 		if isinstance(content, str):
@@ -580,7 +1522,13 @@ def _call_openai_snippet_rank(query_text: str, candidates: list, want_n: int, ti
 		if not isinstance(pick, list):
 			return []
 
-	n = len(candidates)
+	# Candidate ids are not always 0..n-1 (hybrid passes a bm25-filtered subset).
+	valid = set()
+	for c in candidates:
+		try:
+			valid.add(int(c.get("i")))
+		except Exception:
+			pass
 	seen = set()
 	out = []
 	for v in pick:
@@ -588,7 +1536,7 @@ def _call_openai_snippet_rank(query_text: str, candidates: list, want_n: int, ti
 			iv = int(v)
 		except Exception:
 			continue
-		if iv < 0 or iv >= n:
+		if iv not in valid:
 			continue
 		if iv in seen:
 			continue
@@ -599,10 +1547,220 @@ def _call_openai_snippet_rank(query_text: str, candidates: list, want_n: int, ti
 
 	return out
 
-def _call_search_api_ucp(query_text: str, want_rendered: bool, want_items: bool, pick_ids: list|None=None, search_mode: str|None=None, seed_items: list|None=None) -> dict:
-	# Full mode can take significantly longer because the Search Service fetches and extracts pages.
-	# Use a separate timeout for the client-side HTTP request to avoid returning an empty context pack.
-	mode = (search_mode or cfg.get("search_mode") or "simple")
+def _snippet_rank_engine() -> str:
+	v = (cfg.get("snippet_rank_engine") or "llm").strip().lower()
+	return v if v in ("llm", "bm25", "hybrid", "embed") else "llm"
+
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_YEAR_RE = re.compile(r"(?<!\d)(19\d{2}|20\d{2})(?!\d)")
+
+# Words that make a question about the present (en/ru; ru as stems).
+_PRESENT_WORDS = ("current", "currently", "latest", "now", "today", "newest", "recent", "recently", "present")
+_PRESENT_STEMS = ("текущ", "сейчас", "сегодня", "последн", "нынешн", "актуальн", "свеж")
+# Words that mark a candidate as describing an earlier period.
+_PAST_WORDS = ("ex", "former", "previous", "formerly", "archived", "deprecated", "outdated", "obsolete")
+_PAST_STEMS = ("бывш", "прежн", "предыдущ", "устаревш", "архив")
+
+def _bm25_tokens(text: str) -> list:
+	out = []
+	for t in _TOKEN_RE.findall((text or "").lower()):
+		if _CJK_RE.search(t):
+			# No word boundaries in CJK: index single characters.
+			out.extend(t)
+		elif len(t) > 1 or t.isdigit():
+			out.append(t)
+	return out
+
+def _has_word(tokens: list, words: tuple, stems: tuple) -> bool:
+	for t in tokens:
+		if t in words:
+			return True
+		for s in stems:
+			if t.startswith(s):
+				return True
+	return False
+
+def _recency_score(text: str, tokens: list, year_now: int) -> float:
+	# Mirrors the rank prompt time policy: current year > last year > older;
+	# "former/previous/archived" wording counts against the candidate.
+	best = 0.0
+	for m in _YEAR_RE.finditer(text or ""):
+		y = int(m.group(1))
+		if y == year_now:
+			best = 1.0
+			break
+		if y == year_now - 1:
+			best = max(best, 0.5)
+	if _has_word(tokens, _PAST_WORDS, _PAST_STEMS):
+		best -= 0.5
+	return best
+
+def _bm25_rank(query_text: str, candidates: list, want_n: int|None=None) -> list:
+	# Returns candidate ids ("i") ordered best-first; same contract as the LLM ranker.
+	docs = []
+	for c in candidates:
+		text = ((c.get("title") or "") + " " + (c.get("title") or "") + " " + (c.get("snippet") or "")).strip()
+		docs.append((c, text, _bm25_tokens(text)))
+	if not docs:
+		return []
+
+	q_terms = list(dict.fromkeys(_bm25_tokens(query_text)))
+	n = len(docs)
+	avg_len = (sum(len(d[2]) for d in docs) / n) or 1.0
+	df = collections.Counter()
+	for _, _, toks in docs:
+		df.update(set(toks))
+
+	raw = []
+	for _, _, toks in docs:
+		tf = collections.Counter(toks)
+		norm = _BM25_K1 * (1.0 - _BM25_B + _BM25_B * (len(toks) / avg_len))
+		s = 0.0
+		for t in q_terms:
+			f = tf.get(t, 0)
+			if not f:
+				continue
+			idf = math.log(1.0 + (n - df[t] + 0.5) / (df[t] + 0.5))
+			s += idf * (f * (_BM25_K1 + 1.0)) / (f + norm)
+		raw.append(s)
+	top = max(raw) or 1.0
+
+	w = 0.0
+	year_now = datetime.datetime.utcnow().year
+	q_tokens = _bm25_tokens(query_text)
+	if str(year_now) in (query_text or "") or _has_word(q_tokens, _PRESENT_WORDS, _PRESENT_STEMS):
+		try:
+			w = float(cfg.get("snippet_rank_recency_weight") or 0.0)
+		except Exception:
+			w = 0.0
+
+	scored = []
+	for pos, (c, text, toks) in enumerate(docs):
+		s = raw[pos] / top
+		if w:
+			s += w * _recency_score(text, toks, year_now)
+		try:
+			cid = int(c.get("i"))
+		except Exception:
+			cid = pos
+		# Ties keep the search engine order.
+		scored.append((-s, pos, cid))
+	scored.sort()
+
+	out = [cid for _, _, cid in scored]
+	if want_n:
+		out = out[:max(0, int(want_n))]
+	return out
+
+# Embedding memo: key -> float32 vector bytes, oldest first.
+_EMBED_MEMO_LOCK = threading.Lock()
+_EMBED_MEMO = collections.OrderedDict()
+
+def _embed_memo_key(model: str, text: str) -> str:
+	return hashlib.sha1((model + "\0" + text).encode("utf-8")).hexdigest()
+
+def _embed_texts(texts: list, timeout_s: int) -> list:
+	# Returns one float32 vector per text; only memo misses go to the endpoint, in one batch.
+	model = (cfg.get("embed_model") or cfg.get("openai_model") or "").strip()
+	keys = [_embed_memo_key(model, t) for t in texts]
+	out = [None] * len(texts)
+	with _EMBED_MEMO_LOCK:
+		for pos, k in enumerate(keys):
+			b = _EMBED_MEMO.get(k)
+			if b is not None:
+				_EMBED_MEMO.move_to_end(k)
+				out[pos] = np.frombuffer(b, dtype=np.float32)
+
+	miss = [pos for pos, v in enumerate(out) if v is None]
+	if miss:
+		base = (cfg.get("embed_api_base") or cfg.get("openai_api_base") or "").rstrip("/")
+		payload = {"input": [texts[pos] for pos in miss]}
+		if model:
+			payload["model"] = model
+		resp = _http_post_json(base + "/embeddings", payload, timeout_s)
+		rows = resp.get("data") if isinstance(resp, dict) else None
+		if not isinstance(rows, list) or len(rows) != len(miss):
+			raise ValueError("embeddings: unexpected response")
+		rows = sorted(rows, key=lambda r: int(r.get("index", 0)))
+
+		try:
+			max_n = max(1, int(cfg.get("embed_memo_max_entries") or 4096))
+		except Exception:
+			max_n = 4096
+		with _EMBED_MEMO_LOCK:
+			for pos, row in zip(miss, rows):
+				v = np.asarray(row.get("embedding") or [], dtype=np.float32)
+				out[pos] = v
+				_EMBED_MEMO[keys[pos]] = v.tobytes()
+				_EMBED_MEMO.move_to_end(keys[pos])
+			while len(_EMBED_MEMO) > max_n:
+				_EMBED_MEMO.popitem(last=False)
+	return out
+
+def _embed_rank(query_text: str, candidates: list, want_n: int, timeout_s: int) -> list:
+	# Returns candidate ids ("i") ordered by cosine similarity; same contract as the LLM ranker.
+	if np is None or not candidates:
+		return []
+	texts = [query_text or ""]
+	for c in candidates:
+		texts.append(f"{(c.get('title') or '').strip()}\n{(c.get('snippet') or '').strip()}\n{(c.get('url') or '').strip()}")
+	vecs = _embed_texts(texts, timeout_s)
+	dim = len(vecs[0])
+	if dim == 0 or any(len(v) != dim for v in vecs):
+		return []
+
+	m = np.vstack(vecs[1:])
+	q = vecs[0]
+	norms = np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0)
+	scores = (m @ q) / np.where(norms > 0, norms, 1.0)
+	# Stable sort keeps the search engine order on ties.
+	order = np.argsort(-scores, kind="stable")
+
+	out = [int(candidates[int(pos)].get("i", pos)) for pos in order]
+	if want_n:
+		out = out[:max(0, int(want_n))]
+	return out
+
+# Per-trigger deadline (time.monotonic()), set by input_modifier; copied into executor tasks.
+_TRIGGER_DEADLINE = contextvars.ContextVar("llm_web_search_deadline", default=None)
+
+def _cfg_float(key: str, dflt: float) -> float:
+	try:
+		return float(cfg.get(key) if cfg.get(key) is not None else dflt)
+	except Exception:
+		return dflt
+
+def _time_left_s() -> float|None:
+	dl = _TRIGGER_DEADLINE.get()
+	if dl is None:
+		return None
+	return max(0.0, dl - time.monotonic())
+
+def _has_time(need_s: float) -> bool:
+	left = _time_left_s()
+	return left is None or left >= need_s
+
+def _within_deadline(timeout_s: int, reserve_s: float=0.0) -> int:
+	# Clamp a stage timeout to the time left, keeping reserve_s for later stages (never below 1s).
+	left = _time_left_s()
+	if left is None:
+		return int(timeout_s)
+	return max(1, min(int(timeout_s), int(left - reserve_s)))
+
+def _reserve_after_rank_s() -> float:
+	# Rank runs before the full-mode fetch call; in simple mode nothing slow follows it.
+	if (cfg.get("search_mode") or "simple") == "full":
+		return _cfg_float("deadline_reserve_fetch_s", 10)
+	return 0.0
+
+def _reserve_after_rewrite_s() -> float:
+	return _cfg_float("deadline_reserve_search_s", 4) + _reserve_after_rank_s()
+
+def _search_timeout_s(mode: str) -> int:
 	to = cfg.get("timeout_search_s")
 	try:
 		to = int(to) if to is not None else 8
@@ -616,6 +1774,40 @@ def _call_search_api_ucp(query_text: str, want_rendered: bool, want_items: bool,
 			to2 = None
 		if to2 and to2 > 0:
 			to = to2
+	return _within_deadline(to)
+
+def _rank_timeout_s() -> int:
+	# Prefer granular timeout if configured, otherwise fall back to legacy timeout_llm_s.
+	to = cfg.get("timeout_rank_s")
+	try:
+		to = int(to) if to is not None else None
+	except Exception:
+		to = None
+	if not to or to <= 0:
+		try:
+			to = int(cfg.get("timeout_llm_s") or 10)
+		except Exception:
+			to = 10
+	return _within_deadline(to, _reserve_after_rank_s())
+
+def _server_rank_constraints(question: str, want_n: int) -> dict:
+	# constraints.rank for /v1/search: the searcher ranks with the same
+	# OpenAI-compatible endpoint and model the plugin would use.
+	return {
+		"question": question,
+		"want_n": int(want_n),
+		"top_k": int(cfg.get("snippet_rank_top_k") or 10),
+		"api_base": (cfg.get("openai_api_base") or "").rstrip("/"),
+		"model": (cfg.get("openai_model") or "").strip(),
+		"timeout_ms": _rank_timeout_s() * 1000,
+		"max_tokens": int(cfg.get("rewrite_max_tokens") or 512),
+	}
+
+def _call_search_api_ucp(query_text: str, want_rendered: bool, want_items: bool, pick_ids: list|None=None, search_mode: str|None=None, seed_items: list|None=None, rank: dict|None=None, stream: bool=False) -> dict:
+	# Full mode can take significantly longer because the Search Service fetches and extracts pages.
+	# Use a separate timeout for the client-side HTTP request to avoid returning an empty context pack.
+	mode = (search_mode or cfg.get("search_mode") or "simple")
+	to = _search_timeout_s(mode)
 	fetch_engine = (cfg.get("fetch_engine") or "local")
 	try:
 		fetch_engine = fetch_engine.strip()
@@ -632,14 +1824,51 @@ def _call_search_api_ucp(query_text: str, want_rendered: bool, want_items: bool,
 		payload["constraints"]["pick_ids"] = pick_ids
 	if seed_items is not None:
 		payload["constraints"]["seed_items"] = seed_items
+	if _max_context_tokens():
+		# The searcher packs with an estimate; input_modifier re-fits with the real tokenizer.
+		payload["budget"] = {"max_context_tokens": _max_context_tokens()}
+	if rank is not None:
+		payload["constraints"]["rank"] = rank
+		# The searcher waits for the ranker before fetching.
+		try:
+			to += int(rank.get("timeout_ms") or 0) // 1000
+		except Exception:
+			pass
 
-	return _http_post_json(cfg["search_api_url"], payload, int(to))
+	to = _within_deadline(to)
+	left = _time_left_s()
+	if left is not None:
+		# Hand the rest of the trigger deadline to the searcher (minus time to send the answer back).
+		total_ms = max(1000, int(left * 1000) - 500)
+		budget = payload.setdefault("budget", {})
+		budget["max_total_time_ms"] = total_ms
+		budget["per_request_timeout_ms"] = {"search": min(total_ms, _search_timeout_s("simple") * 1000)}
+
+	stage = "search_full" if mode == "full" else "search"
+	if stream:
+		payload["want"]["stream"] = True
+		return _timed(stage, _http_post_search_stream, cfg["search_api_url"], payload, int(to))
+	return _timed(stage, _http_post_json, cfg["search_api_url"], payload, int(to))
 
 def _call_search_api(query_text: str) -> str:
 	data = _call_search_api_ucp(query_text, True, False, None)
 	rt = data.get("rendered_text", "")
 	return rt if isinstance(rt, str) else ""
 
+def _rewrite_timeout_s() -> int:
+	# Prefer granular timeout if configured, otherwise fall back to legacy timeout_llm_s.
+	to = cfg.get("timeout_rewrite_s")
+	try:
+		to = int(to) if to is not None else None
+	except Exception:
+		to = None
+	if not to or to <= 0:
+		try:
+			to = int(cfg.get("timeout_llm_s") or 10)
+		except Exception:
+			to = 10
+	return _within_deadline(to, _reserve_after_rewrite_s())
+
 def _call_openai_rewrite(user_text: str) -> str:
 	max_words = cfg.get("llm_query_max_words") or 12
 	try:
@@ -693,24 +1922,16 @@ def _call_openai_rewrite(user_text: str) -> str:
 	base = (cfg.get("openai_api_base") or "").rstrip("/")
 	url = base + "/chat/completions"
 
-	# Prefer granular timeout if configured, otherwise fall back to legacy timeout_llm_s.
-	to = cfg.get("timeout_rewrite_s")
-	try:
-		to = int(to) if to is not None else None
-	except Exception:
-		to = None
-	if not to or to <= 0:
+	if cfg.get("llm_stream"):
+		content, early = _http_post_chat_stream(url, payload, _rewrite_timeout_s(), _rewrite_stream_stop)
+		if early and (bool(cfg.get("verbose")) or _is_webui_verbose()):
+			print("[llm_web_search] llm_query_stream: early_stop")
+	else:
+		data = _http_post_json(url, payload, _rewrite_timeout_s())
 		try:
-			to = int(cfg.get("timeout_llm_s") or 10)
+			content = data["choices"][0]["message"]["content"]
 		except Exception:
-			to = 10
-	data = _http_post_json(url, payload, int(to))
-
-
-	try:
-		content = data["choices"][0]["message"]["content"]
-	except Exception:
-		return ""
+			return ""
 
 	if not isinstance(content, str):
 		return ""
@@ -798,7 +2019,7 @@ def _call_openai_pack(user_text: str, context_pack: str) -> str:
 		except Exception:
 			to = 60
 
-	data = _http_post_json(url, payload, int(to))
+	data = _http_post_json(url, payload, _within_deadline(to))
 	try:
 		content = data["choices"][0]["message"]["content"]
 	except Exception:
@@ -825,10 +2046,68 @@ def _call_openai_pack(user_text: str, context_pack: str) -> str:
 		content = content.strip()
 	return content
 
+# Bounded worker pool for overlapping plugin stages (speculative search).
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+def _get_executor():
+	global _EXECUTOR
+	with _EXECUTOR_LOCK:
+		if _EXECUTOR is None:
+			try:
+				n = int(cfg.get("speculative_max_workers") or 4)
+			except Exception:
+				n = 4
+			_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+				max_workers=max(2, n),
+				thread_name_prefix="llm_web_search",
+			)
+		return _EXECUTOR
+
+def _normalize_query(q: str) -> str:
+	# Comparison key only: whitespace/case-insensitive, surrounding quotes ignored.
+	t = " ".join((q or "").split())
+	t = t.strip().strip('"').strip("'").strip()
+	return t.casefold()
+
+def _search_items(query_text: str, strict: bool=False) -> list|None:
+	# strict: a failed search returns None instead of no items (speculative search falls back).
+	try:
+		ucp = _call_search_api_ucp(query_text, False, True, None, search_mode="simple")
+		items = ucp.get("items") if isinstance(ucp, dict) else None
+		if not isinstance(items, list):
+			items = None if strict else []
+	except Exception:
+		items = None if strict else []
+	return items
+
+def _cancel_speculative(future, token: dict|None) -> None:
+	# future.cancel() only helps while the task is queued; the token aborts a running HTTP call.
+	if future is None:
+		return
+	future.cancel()
+	_http_cancel(token)
+
 def input_modifier(string, state, is_chat=False):
 	if not cfg.get("enable"):
 		return string
 
+	t0 = time.perf_counter()
+	deadline_s = _cfg_float("trigger_deadline_s", 0)
+	token = _TRIGGER_DEADLINE.set(time.monotonic() + deadline_s) if deadline_s > 0 else None
+	try:
+		out = _input_modifier_impl(string, state, is_chat)
+	finally:
+		if token is not None:
+			_TRIGGER_DEADLINE.reset(token)
+
+	if out != (string or ""):
+		# A trigger fired (the prompt changed): record end-to-end latency and export.
+		_metric_observe("trigger", time.perf_counter() - t0)
+		_metrics_flush()
+	return out
+
+def _input_modifier_impl(string, state, is_chat=False):
 	s = string or ""
 	prefix = cfg.get("trigger_prefix") or "???"
 	if not isinstance(prefix, str):
@@ -862,7 +2141,15 @@ def input_modifier(string, state, is_chat=False):
 	effective_verbose = bool(cfg.get("verbose")) or _is_webui_verbose()
 	query = query_src
 	qgen = ""
-	if (cfg.get("query_mode") or "user_text") == "llm_query":
+	spec_query = ""
+	spec_future = None
+	spec_cancel = None
+	run_rewrite = (cfg.get("query_mode") or "user_text") == "llm_query"
+	if run_rewrite and not _has_time(_reserve_after_rewrite_s() + 2):
+		run_rewrite = False
+		if effective_verbose:
+			print(f"[llm_web_search] deadline: rewrite skipped left={_time_left_s():.1f}s")
+	if run_rewrite:
 		try:
 			max_u = cfg.get("llm_query_max_user_chars") or 1024
 			try:
@@ -871,7 +2158,25 @@ def input_modifier(string, state, is_chat=False):
 				max_u = 1024
 
 			u2 = query_src[:max_u]
-			q2 = _call_openai_rewrite(u2)
+			# Cache mode answers from the searcher's cache first: a web search may not happen at all.
+			if cfg.get("llm_query_speculative") and (cfg.get("search_mode") or "simple") != "cache":
+				# Search the raw text while the rewrite runs; used if the rewrite
+				# agrees with it, fails, or times out.
+				ex = _get_executor()
+				spec_query = query_src[:max_q].strip()
+				# Tasks run in a copy of this context so they see the trigger deadline.
+				spec_cancel = _http_cancel_token()
+				spec_ctx = contextvars.copy_context()
+				spec_ctx.run(_HTTP_CANCEL.set, spec_cancel)
+				spec_future = ex.submit(spec_ctx.run, _search_items, spec_query, True)
+				rw_future = ex.submit(contextvars.copy_context().run, _timed, "rewrite", _call_openai_rewrite, u2)
+				try:
+					q2 = rw_future.result(timeout=_rewrite_timeout_s() + 1)
+				except Exception:
+					rw_future.cancel()
+					q2 = ""
+			else:
+				q2 = _timed("rewrite", _call_openai_rewrite, u2)
 			if q2:
 				query = q2
 				qgen = q2
@@ -893,29 +2198,73 @@ def input_modifier(string, state, is_chat=False):
 	if len(query) > max_q:
 		query = query[:max_q].strip()
 
-	# Fetch items once (single search call) and render locally to avoid output/candidate mismatch.
-	items = []
-	try:
-		ucp = _call_search_api_ucp(query, False, True, None, search_mode="simple")
-		items = ucp.get("items") if isinstance(ucp, dict) else None
-		if not isinstance(items, list):
-			items = []
-	except Exception:
-		items = []
-
 	rendered = ""
 	picked = []
 	used_fallback = False
 
 	want_n = 3
 	try:
-		if (cfg.get("search_mode") or "simple") == "simple":
+		if (cfg.get("search_mode") or "simple") != "full":
 			want_n = int(cfg.get("snippet_rank_pick_n_simple") or 6)
 		else:
 			want_n = int(cfg.get("snippet_rank_pick_n_full") or 3)
 	except Exception:
 		want_n = 3
 
+	# Cache mode: answer from pages the searcher already extracted (milliseconds, no network search).
+	cache_only = False
+	if (cfg.get("search_mode") or "simple") == "cache":
+		try:
+			ucp = _call_retrieve_api(query)
+			usage = (ucp.get("usage") or {}) if isinstance(ucp, dict) else {}
+			rt = ucp.get("rendered_text", "") if isinstance(ucp, dict) else ""
+			if int(usage.get("results_returned") or 0) > 0 and isinstance(rt, str) and rt:
+				rendered = rt
+			if effective_verbose:
+				print(f"[llm_web_search] cache_retrieve: results={usage.get('results_returned')} ms={((ucp.get('meta') or {}).get('timing_ms') or {}).get('total')}")
+		except Exception:
+			rendered = ""
+		if not rendered and not cfg.get("cache_mode_fallback", True):
+			cache_only = True
+
+	# Full mode with server-side rank: one /v1/search call searches, ranks, fetches and renders.
+	if (cfg.get("search_mode") or "simple") == "full" and cfg.get("snippet_rank_enabled") and cfg.get("snippet_rank_server_side") and _snippet_rank_engine() == "llm" and _has_time(_reserve_after_rank_s() + 2):
+		try:
+			n = int(cfg.get("snippet_rank_pick_n") or want_n) if "snippet_rank_pick_n" in cfg else want_n
+			ucp = _call_search_api_ucp(query, True, False, None, search_mode="full", rank=_server_rank_constraints(query_src, n), stream=bool(cfg.get("search_stream", True)))
+			rt = ucp.get("rendered_text", "") if isinstance(ucp, dict) else ""
+			if isinstance(rt, str) and rt:
+				rendered = rt
+			if effective_verbose and isinstance(ucp, dict):
+				meta = ucp.get("meta") or {}
+				print(f"[llm_web_search] snippet_rank server_side pick={meta.get('pick_ids')} rank={meta.get('rank')}")
+		except Exception:
+			rendered = ""
+
+	# Fetch items once (single search call) and render locally to avoid output/candidate mismatch.
+	items = None
+	if rendered:
+		items = []
+		_cancel_speculative(spec_future, spec_cancel)
+	elif spec_future is not None and cache_only:
+		_cancel_speculative(spec_future, spec_cancel)
+	elif spec_future is not None:
+		if _normalize_query(query) == _normalize_query(spec_query):
+			try:
+				items = spec_future.result(timeout=_search_timeout_s("simple") + 1)
+			except Exception:
+				items = None
+			if items is None:
+				# Failed or timed out: search again below rather than answer with no results.
+				_cancel_speculative(spec_future, spec_cancel)
+		else:
+			_cancel_speculative(spec_future, spec_cancel)
+		if effective_verbose:
+			print(f"[llm_web_search] speculative_search: {'hit' if items is not None else 'miss'}")
+	if items is None:
+		# Cache mode without fallback: a cache miss means no context, never a web search.
+		items = [] if cache_only else _search_items(query)
+
 	if cfg.get("snippet_rank_enabled") and items:
 		k = int(cfg.get("snippet_rank_top_k") or 10)
 
@@ -931,28 +2280,50 @@ def input_modifier(string, state, is_chat=False):
 				"url": (it.get("url") or ""),
 			})
 
-		# Prefer granular timeout if configured, otherwise fall back to legacy timeout_llm_s.
-		to = cfg.get("timeout_rank_s")
-		try:
-			to = int(to) if to is not None else None
-		except Exception:
-			to = None
-		if not to or to <= 0:
+		engine = _snippet_rank_engine()
+		bm25_order = []
+		if engine != "bm25" and not _has_time(_reserve_after_rank_s() + 2):
+			# Not enough time for a model call: the local lexical order is the best cheap answer.
+			if effective_verbose:
+				print(f"[llm_web_search] deadline: {engine} rank replaced by bm25 left={_time_left_s():.1f}s")
+			engine = "bm25"
+		if engine in ("bm25", "hybrid"):
+			bm25_q = query_src if _normalize_query(query) == _normalize_query(query_src) else f"{query_src} {query}"
+			t0 = time.perf_counter()
+			bm25_order = _timed("rank_bm25", _bm25_rank, bm25_q, candidates)
+			if effective_verbose:
+				print(f"[llm_web_search] snippet_rank bm25 order={bm25_order} ms={(time.perf_counter() - t0) * 1000:.2f}")
+
+		if engine == "bm25":
+			picked = bm25_order[:max(0, int(want_n))]
+		elif engine == "embed":
+			t0 = time.perf_counter()
 			try:
-				to = int(cfg.get("timeout_llm_s") or 10)
+				picked = _timed("rank_embed", _embed_rank, query_src, candidates, want_n, _rank_timeout_s())
 			except Exception:
-				to = 10
-		try:
-			picked = _call_openai_snippet_rank(query_src, candidates, want_n, int(to))
-		except Exception:
-			picked = []
+				picked = []
+			if effective_verbose:
+				print(f"[llm_web_search] snippet_rank embed pick={picked} ms={(time.perf_counter() - t0) * 1000:.1f}")
+		else:
+			if engine == "hybrid":
+				try:
+					keep = max(int(want_n), int(cfg.get("snippet_rank_hybrid_keep") or 6))
+				except Exception:
+					keep = int(want_n)
+				kept = set(bm25_order[:keep])
+				# Keep engine order inside the prefiltered set.
+				candidates = [c for c in candidates if c["i"] in kept]
+			try:
+				picked = _timed("rank", _call_openai_snippet_rank, query_src, candidates, want_n, _rank_timeout_s())
+			except Exception:
+				picked = []
 
 		if picked:
 			if (cfg.get("search_mode") or "simple") == "full":
 				# Full mode: re-call Search API with pick_ids so the server can fetch/extract pages.
 				try:
 					# Keep extraction aligned with the SAME candidate list we just ranked.
-					ucp2 = _call_search_api_ucp(query, True, True, picked, search_mode="full", seed_items=items)
+					ucp2 = _call_search_api_ucp(query, True, True, picked, search_mode="full", seed_items=items, stream=bool(cfg.get("search_stream", True)))
 					rendered = (ucp2.get("rendered_text") or "") if isinstance(ucp2, dict) else ""
 				except Exception:
 					rendered = ""
@@ -963,7 +2334,10 @@ def input_modifier(string, state, is_chat=False):
 			used_fallback = True
 			# If ranker returned empty, fall back to engine order (first N) so full-mode still fetches something.
 			try:
-				if items and want_n and int(want_n) > 0:
+				if bm25_order and want_n and int(want_n) > 0:
+					# hybrid: the lexical order is a better fallback than engine order.
+					picked = bm25_order[:int(want_n)]
+				elif items and want_n and int(want_n) > 0:
 					picked = list(range(min(int(want_n), len(items))))
 				else:
 					picked = []
@@ -974,7 +2348,7 @@ def input_modifier(string, state, is_chat=False):
 			if (cfg.get("search_mode") or "simple") == "full" and picked:
 				try:
 					# Keep extraction aligned with the SAME candidate list we just ranked.
-					u2 = _call_search_api_ucp(query, True, False, picked, search_mode="full", seed_items=items)
+					u2 = _call_search_api_ucp(query, True, False, picked, search_mode="full", seed_items=items, stream=bool(cfg.get("search_stream", True)))
 					rt = u2.get("rendered_text", "") if isinstance(u2, dict) else ""
 					if isinstance(rt, str) and rt:
 						rendered = rt
@@ -998,22 +2372,36 @@ def input_modifier(string, state, is_chat=False):
 			ids = list(range(0, len(unranked)))
 			try:
 				# Keep extraction aligned with the SAME candidate list we just ranked.
-				ucp2 = _call_search_api_ucp(query, True, True, ids, search_mode="full", seed_items=unranked)
+				ucp2 = _call_search_api_ucp(query, True, True, ids, search_mode="full", seed_items=unranked, stream=bool(cfg.get("search_stream", True)))
 				rendered = (ucp2.get("rendered_text") or "") if isinstance(ucp2, dict) else ""
 			except Exception:
 				rendered = ""
 		else:
 			rendered = _render_context_pack(unranked, None, 600)
 
+	if rendered and _max_context_tokens():
+		rendered = _fit_pack_tokens(rendered)
+
 	# Optional LLM pack in full mode: summarize fetched/extracted text before injecting into the model prompt.
-	if rendered and (cfg.get("search_mode") or "simple") == "full" and (cfg.get("full_handling") or "inject") == "llm_pack":
+	if rendered and (cfg.get("search_mode") or "simple") == "full" and (cfg.get("full_handling") or "inject") == "llm_pack" and not _has_time(_cfg_float("deadline_min_pack_s", 8)):
+		# Inject the pack as-is rather than starting a summary that cannot finish in time.
+		if effective_verbose:
+			print(f"[llm_web_search] deadline: pack skipped left={_time_left_s():.1f}s")
+	elif rendered and (cfg.get("search_mode") or "simple") == "full" and (cfg.get("full_handling") or "inject") == "llm_pack":
 		try:
-			packed = _call_openai_pack(llm_user_text_stripped or query_src, rendered)
+			packed = _timed("pack", _call_openai_pack, llm_user_text_stripped or query_src, rendered)
 			if isinstance(packed, str) and packed.strip():
 				rendered = _render_pack_summary(packed)
 		except Exception:
 			pass
 
+	if effective_verbose:
+		try:
+			st = _http_pool_stats()
+			print(f"[llm_web_search] http_pool connects={st['connects']} reuses={st['reuses']} evictions={st['evictions']} retries={st['retries']} idle={st['idle']}")
+		except Exception:
+			pass
+
 	if not rendered:
 		return llm_user_text  # remove trigger even if empty, to avoid polluting the prompt
 
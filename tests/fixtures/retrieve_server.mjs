@@ -0,0 +1,69 @@
+// Serves POST /v1/retrieve over a small populated retrieval index (no fastify, no cache directory).
+// POST /v1/search stands in for a web search (one fixed result); GET /calls reports how often
+// each route was hit. Prints "PORT <n>" once listening; every other route answers 404.
+
+import http from "node:http";
+import { buildRetrieveResponse, createRetrievalIndex } from "../../src/searcher/retrieval.mjs";
+
+const PAGES = [
+	{
+		url: "https://example.org/tides",
+		title: "How tides work",
+		text: "Tides are the rise and fall of sea levels caused by the gravitational pull of the Moon and the Sun.\n\nSpring tides happen when the Sun and Moon line up; neap tides when they are at right angles."
+	},
+	{
+		url: "https://example.org/bread",
+		title: "Sourdough basics",
+		text: "A sourdough starter is a culture of wild yeast and lactic acid bacteria kept alive with flour and water."
+	}
+];
+
+const index = createRetrievalIndex({ enabled: true });
+for (const p of PAGES) index.add("fixture:" + p.url, { ...p, createdMs: Date.now() });
+
+const WEB_ITEM = { rank: 1, title: "Web result", url: "https://web.example/result", snippet: "from the web", engines: ["fixture"] };
+const calls = { retrieve: 0, search: 0 };
+
+const server = http.createServer((req, res) => {
+	if (req.method === "GET" && req.url === "/calls") {
+		res.writeHead(200, { "content-type": "application/json" }).end(JSON.stringify(calls));
+		return;
+	}
+	if (req.method === "POST" && req.url === "/v1/search") {
+		calls.search += 1;
+		req.resume();
+		req.on("end", () => {
+			res.writeHead(200, { "content-type": "application/json" }).end(JSON.stringify({ items: [WEB_ITEM], usage: { results_returned: 1 } }));
+		});
+		return;
+	}
+	if (req.method !== "POST" || req.url !== "/v1/retrieve") {
+		res.writeHead(404).end();
+		return;
+	}
+	calls.retrieve += 1;
+	let raw = "";
+	req.on("data", (c) => { raw += c; });
+	req.on("end", () => {
+		let body = {};
+		try { body = JSON.parse(raw || "{}"); } catch {/**/}
+		const q = typeof body?.query === "string" ? body.query : (body?.query?.text || "");
+		const response = buildRetrieveResponse(index, body, {
+			query: q.trim(),
+			topK: body?.budget?.max_results || 5,
+			maxPerDoc: 3,
+			wantItems: body?.want?.items !== false,
+			wantRendered: body?.want?.rendered_text !== false,
+			maxContextChars: null,
+			maxContentCharsPerItem: 2000,
+			maxContextTokens: body?.budget?.max_context_tokens || 0
+		});
+		res.writeHead(200, { "content-type": "application/json" }).end(JSON.stringify(response));
+	});
+});
+
+server.listen(0, "127.0.0.1", () => {
+	console.log(`PORT ${server.address().port}`);
+});
+
+//<EOF retrieve_server.mjs lines: 70>
@@ -0,0 +1,19 @@
+# Loads src/webui_plugin/script.py outside text-generation-webui.
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_plugin():
+	try:
+		import gradio  # noqa: F401
+	except ImportError:
+		# Only ui() uses gradio; the code under test never touches it.
+		sys.modules["gradio"] = types.ModuleType("gradio")
+	spec = importlib.util.spec_from_file_location("llm_web_search_script", os.path.join(ROOT, "src", "webui_plugin", "script.py"))
+	mod = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(mod)
+	return mod
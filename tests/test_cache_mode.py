@@ -0,0 +1,97 @@
+# Plugin search_mode=cache against a searcher retrieval index populated with two pages.
+# Run from the repo root: python -m unittest discover -s tests
+import json
+import os
+import shutil
+import subprocess
+import time
+import unittest
+import urllib.request
+
+from plugin_loader import ROOT, load_plugin
+
+
+@unittest.skipUnless(shutil.which("node"), "node is required for the retrieval fixture server")
+class CacheModeTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.server = subprocess.Popen(
+			["node", os.path.join(ROOT, "tests", "fixtures", "retrieve_server.mjs")],
+			stdout=subprocess.PIPE,
+			text=True,
+		)
+		line = cls.server.stdout.readline().split()
+		if len(line) != 2 or line[0] != "PORT":
+			cls.server.kill()
+			raise RuntimeError("retrieve fixture server did not start")
+		cls.base_url = f"http://127.0.0.1:{line[1]}"
+		cls.plugin = load_plugin()
+		cls.base_cfg = dict(cls.plugin.cfg)
+		cls.base_cfg.update({
+			"enable": True,
+			"trigger_prefix": "???",
+			"query_mode": "user_text",
+			"search_mode": "cache",
+			"search_api_url": cls.base_url + "/v1/search",
+			# The fixture has no /chat/completions: llm_query rewrites fail and keep the raw text.
+			"openai_api_base": cls.base_url,
+			"snippet_rank_enabled": False,
+			"max_context_tokens": 0,
+			"metrics_file": "",
+			"verbose": False,
+		})
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.server.kill()
+		cls.server.wait()
+		cls.server.stdout.close()
+
+	def setUp(self):
+		self.plugin.cfg.clear()
+		self.plugin.cfg.update(self.base_cfg)
+		self.searches_before = self._calls()["search"]
+
+	def _calls(self):
+		with urllib.request.urlopen(self.base_url + "/calls", timeout=5) as r:
+			return json.loads(r.read())
+
+	def _web_searches(self):
+		# Speculative searches run on worker threads: give a stray one time to arrive.
+		time.sleep(0.2)
+		return self._calls()["search"] - self.searches_before
+
+	def test_cache_hit_injects_cached_page(self):
+		self.plugin.cfg["cache_mode_fallback"] = False
+		out = self.plugin.input_modifier("??? why do spring tides happen", {})
+		self.assertIn("[CONTEXT_PACK ucp-1]", out)
+		self.assertIn("https://example.org/tides", out)
+		self.assertIn("gravitational pull of the Moon", out)
+		self.assertNotIn("https://example.org/bread", out)
+		self.assertTrue(out.endswith(" why do spring tides happen"))
+		self.assertEqual(self._web_searches(), 0)
+
+	def test_cache_miss_without_fallback_injects_nothing(self):
+		self.plugin.cfg["cache_mode_fallback"] = False
+		out = self.plugin.input_modifier("??? quantum chromodynamics lattice", {})
+		self.assertIn("status: empty", out)
+		self.assertNotIn("example.org", out)
+		self.assertNotIn("web.example", out)
+		self.assertEqual(self._web_searches(), 0)
+
+	def test_cache_miss_with_speculative_rewrite_never_searches_the_web(self):
+		# The rewrite fails, which would normally make the speculative raw-text search the answer.
+		self.plugin.cfg.update({"cache_mode_fallback": False, "query_mode": "llm_query", "llm_query_speculative": True})
+		out = self.plugin.input_modifier("??? quantum chromodynamics lattice", {})
+		self.assertNotIn("web.example", out)
+		self.assertEqual(self._web_searches(), 0)
+
+	def test_cache_miss_with_fallback_searches_the_web(self):
+		self.plugin.cfg.update({"cache_mode_fallback": True, "query_mode": "llm_query", "llm_query_speculative": True})
+		out = self.plugin.input_modifier("??? quantum chromodynamics lattice", {})
+		self.assertIn("https://web.example/result", out)
+		self.assertEqual(self._web_searches(), 1)
+
+
+if __name__ == "__main__":
+	unittest.main()
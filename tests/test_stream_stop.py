@@ -0,0 +1,91 @@
+# Streamed rewrite/rank completions that stop early must parse to the same answer as the full output.
+# Run from the repo root: python -m unittest discover -s tests
+import re
+import unittest
+
+from plugin_loader import load_plugin
+
+REWRITE_OUTPUTS = [
+	"python asyncio tutorial\nThis query covers the basics.\n",
+	"python asyncio tutorial",
+	"Okay let me think about this\nQUERY: python asyncio tutorial\n",
+	"The user asks about tides\nQUERY: spring tides cause",
+	"QUERY: weather berlin 2026\nQUERY: something else\n",
+	"<think>\nThe user wants the weather.\nQUERY: draft\n</think>\nweather berlin 2026\n",
+	"<think>\nshort\n</think>\n\nweather berlin 2026\nextra words after the answer\n",
+	"<think>\nnever closed\nweather berlin\n",
+	"<reasoning>x</reasoning>\n```\ncode\n```\nrust borrow checker\n",
+	"Let me think about this:\nweather\nQUERY: real one\n",
+	"",
+]
+
+RANK_OUTPUTS = [
+	'{"pick":[2,0,1]}',
+	'{"pick":[]}',
+	'{"pick":[]} {"pick":[1]}',
+	'{"pick":[9, 1]}',
+	'[2, 0]',
+	'[]',
+	'I will "pick": [0] then\nJSON: {"pick":[3,1]}',
+	'<think>"pick":[9]</think>{"pick": [1, 2]}',
+	'<think>unfinished {"pick":[1]}',
+]
+
+
+def _tokens(text):
+	# Roughly what a tokenizer streams: words, whitespace runs and punctuation, one at a time.
+	return re.findall(r"\w+|\s+|[^\w\s]", text)
+
+
+def _stream(text, stop_fn):
+	# What _http_post_chat_stream returns: the stop value at the first piece that completes, else everything.
+	buf = ""
+	for piece in _tokens(text):
+		buf += piece
+		final = stop_fn(buf)
+		if final is not None:
+			return final
+	return buf
+
+
+class StreamStopTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.plugin = load_plugin()
+
+	def test_rewrite_stream_matches_full_parse(self):
+		p = self.plugin
+		for raw in REWRITE_OUTPUTS:
+			with self.subTest(raw=raw):
+				streamed = _stream(raw, p._rewrite_stream_stop)
+				self.assertEqual(
+					p._extract_single_line_query(streamed, 12, 200),
+					p._extract_single_line_query(raw, 12, 200),
+				)
+
+	def test_rewrite_stops_early_on_query_line(self):
+		raw = "Okay let me think about this\nQUERY: python asyncio tutorial\nand then a long tail " * 3
+		streamed = _stream(raw, self.plugin._rewrite_stream_stop)
+		self.assertLess(len(streamed), len(raw))
+
+	def test_rank_stream_matches_full_parse(self):
+		p = self.plugin
+		candidates = [{"i": i} for i in range(4)]
+		valid = {c["i"] for c in candidates}
+		for raw in RANK_OUTPUTS:
+			with self.subTest(raw=raw):
+				streamed = _stream(raw, lambda t: p._rank_stream_stop(t, valid))
+				self.assertEqual(
+					p._parse_rank_picks(streamed, candidates, 3),
+					p._parse_rank_picks(raw, candidates, 3),
+				)
+
+	def test_rank_never_stops_on_empty_pick(self):
+		p = self.plugin
+		for raw in ('{"pick":[]}', "[]", '{"pick":[7]}'):
+			with self.subTest(raw=raw):
+				self.assertIsNone(p._rank_stream_stop(raw, {0, 1, 2}))
+
+
+if __name__ == "__main__":
+	unittest.main()